@@ -0,0 +1,338 @@
+"""Offline benchmarks of the dvartk entry points on synthetic data
+
+Each benchmark has an untimed setup (data generation, file writing, index
+building) and a timed run. Wall time is measured with time.perf_counter and
+peak memory with tracemalloc in a second run, so tracing does not slow down
+the timed one; tracemalloc sees Python and numpy allocations but not Arrow
+buffers. Results are printed as TSV and optionally saved as
+JSON for comparing runs across upgrades:
+
+    python -m benchmarks.run --sizes 1k,100k --output results.json
+    python -m benchmarks.run --sizes 10m --only snv_comparison,count_snvs
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_dataset
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+SNV_MAF_COLUMNS = (
+    "Chromosome",
+    "Start_Position",
+    "Reference_Allele",
+    "Tumor_Seq_Allele2",
+)
+SV_COLUMNS = (
+    "chromosome_1",
+    "position_1",
+    "strand_1",
+    "chromosome_2",
+    "position_2",
+    "strand_2",
+    "type",
+    "length",
+)
+
+
+def parse_size(size):
+    """'1k' -> 1000, '10m' -> 10000000, '500' -> 500"""
+    size = str(size).strip().lower()
+    if size[-1:] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def snv_config():
+    from dvartk.parser import SnvFileConfig
+
+    return SnvFileConfig(*SNV_MAF_COLUMNS)
+
+
+def sv_config():
+    from dvartk.parser import SvFileConfig
+
+    return SvFileConfig(*SV_COLUMNS)
+
+
+def open_reference(data):
+    """ReferenceCache of the dataset FASTA, built once per dataset"""
+    from dvartk.reference import ReferenceCache, build_reference_cache
+
+    if "genome" not in data:
+        data["genome"] = ReferenceCache(build_reference_cache(data["fasta"]))
+    return data["genome"]
+
+
+def snvs_of(data, key="variants1"):
+    variants = data[key]
+    return variants[variants["Variant_Type"] == "SNP"].reset_index(drop=True)
+
+
+def indels_of(data, key="variants1"):
+    variants = data[key]
+    return variants[variants["Variant_Type"] != "SNP"].reset_index(drop=True)
+
+
+# each setup takes the dataset and returns (run, n_items); only run is timed
+
+
+def setup_load_snv_maf(data):
+    config = snv_config()
+    return (
+        lambda: config.load_and_convert_maf_columns(data["maf1"]),
+        data["variants1"].shape[0],
+    )
+
+
+def setup_load_snv_vcf(data):
+    config = snv_config()
+    return lambda: config.load_vcf(data["vcf2"]), data["variants2"].shape[0]
+
+
+def setup_load_sv_table(data):
+    config = sv_config()
+    return (
+        lambda: config.load_and_convert_maf_columns(data["sv1"]),
+        data["svs1"].shape[0],
+    )
+
+
+def setup_count_snvs(data):
+    from dvartk.process import count_snvs
+
+    genome, snvs = open_reference(data), snvs_of(data)
+    return lambda: count_snvs(snvs, genome), snvs.shape[0]
+
+
+def setup_count_indels(data):
+    from dvartk.process import count_indels
+
+    genome, indels = open_reference(data), indels_of(data)
+    return lambda: count_indels(indels, genome=genome), indels.shape[0]
+
+
+def setup_count_svs(data):
+    from dvartk.process import count_svs
+
+    svs = data["svs1"]
+    return lambda: count_svs(svs), svs.shape[0]
+
+
+def setup_normalize_variants(data):
+    from dvartk.normalize import normalize_variants
+
+    genome, variants = open_reference(data), data["variants1"]
+    return lambda: normalize_variants(variants, genome), variants.shape[0]
+
+
+def setup_snv_comparison(data):
+    from dvartk.parser import SnvComparison
+
+    snvs1, snvs2 = data["variants1"], data["variants2"]
+    return (
+        lambda: SnvComparison(snvs1, snvs2).make_oneliner(),
+        snvs1.shape[0] + snvs2.shape[0],
+    )
+
+
+def setup_sv_comparison(data):
+    from dvartk.parser import SvComparison
+
+    svs1, svs2 = data["svs1"], data["svs2"]
+    return (
+        lambda: SvComparison(svs1, svs2).make_oneliner(),
+        svs1.shape[0] + svs2.shape[0],
+    )
+
+
+def setup_multi_comparison(data):
+    from dvartk.parser import MultiComparison
+
+    tables = [data["variants1"], data["variants2"], snvs_of(data, "variants2")]
+    return (
+        lambda: MultiComparison(tables).make_table(),
+        sum(table.shape[0] for table in tables),
+    )
+
+
+def setup_partitioned_comparison(data):
+    from dvartk.partition import PartitionedComparison
+
+    config = snv_config()
+    scratch_dir = os.path.join(os.path.dirname(data["maf1"]), "scratch")
+    os.makedirs(scratch_dir, exist_ok=True)
+    return (
+        lambda: PartitionedComparison(
+            data["maf1"], data["maf2"], config, scratch_dir=scratch_dir
+        ).make_oneliner(),
+        data["variants1"].shape[0] + data["variants2"].shape[0],
+    )
+
+
+def setup_index_comparison(data):
+    from dvartk.index import IndexComparison, VariantIndex, build_variant_index
+
+    index_path = os.path.join(os.path.dirname(data["maf2"]), "calls2.dvidx")
+    index = VariantIndex(build_variant_index(data["variants2"], index_path))
+    calls = data["variants1"]
+    return lambda: IndexComparison(calls, index).make_oneliner(), calls.shape[0]
+
+
+def setup_save_spectra(data):
+    from dvartk.plotter import save_spectra
+    from dvartk.process import count_snvs
+
+    genome = open_reference(data)
+    counts = pd.DataFrame(
+        {
+            f"S{ix}": count_snvs(snvs_of(data, key), genome)
+            for ix, key in enumerate(["variants1", "variants2"] * 2)
+        }
+    ).T
+    out_dir = os.path.join(os.path.dirname(data["maf1"]), "spectra")
+    return lambda: save_spectra(counts, "snv", out_dir), counts.shape[0]
+
+
+BENCHMARKS = {
+    "load_snv_maf": setup_load_snv_maf,
+    "load_snv_vcf": setup_load_snv_vcf,
+    "load_sv_table": setup_load_sv_table,
+    "count_snvs": setup_count_snvs,
+    "count_indels": setup_count_indels,
+    "count_svs": setup_count_svs,
+    "normalize_variants": setup_normalize_variants,
+    "snv_comparison": setup_snv_comparison,
+    "sv_comparison": setup_sv_comparison,
+    "multi_comparison": setup_multi_comparison,
+    "partitioned_comparison": setup_partitioned_comparison,
+    "index_comparison": setup_index_comparison,
+    "save_spectra": setup_save_spectra,
+}
+
+
+def measure(run, repeat=1, trace_memory=True):
+    """(best wall seconds of repeat runs, peak traced MB or None)"""
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    peak_mb = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return min(seconds), peak_mb
+
+
+def run_benchmarks(sizes, names=None, repeat=1, trace_memory=True, data_dir=None):
+    """Run the named benchmarks (default: all) at each size
+
+    sizes: variant counts (int or '1k'-style str) of the synthetic datasets,
+        written under data_dir [default: a temporary directory]
+    returns: DataFrame with one row per benchmark and size
+    """
+    names = list(BENCHMARKS) if names is None else list(names)
+    unknown = sorted(set(names) - set(BENCHMARKS))
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {unknown}")
+    records = []
+    with tempfile.TemporaryDirectory(dir=data_dir) as tmp_dir:
+        for size in [parse_size(size) for size in sizes]:
+            # three chromosomes, so about one variant per bp at the largest sizes
+            genome_length = max(1_000_000, size // 3)
+            data = make_dataset(
+                os.path.join(tmp_dir, str(size)), size, genome_length=genome_length
+            )
+            for name in names:
+                run, n_items = BENCHMARKS[name](data)
+                seconds, peak_mb = measure(run, repeat, trace_memory)
+                records.append(
+                    {
+                        "benchmark": name,
+                        "size": size,
+                        "n_items": n_items,
+                        "seconds": seconds,
+                        "items_per_second": n_items / seconds if seconds else np.nan,
+                        "peak_mb": peak_mb,
+                    }
+                )
+            del data
+    return pd.DataFrame(records)
+
+
+def environment():
+    import dvartk
+
+    return {
+        "dvartk": getattr(dvartk, "__version__", None),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark dvartk entry points on synthetic data, offline",
+    )
+    parser.add_argument(
+        "--sizes",
+        default="1k,100k",
+        help="comma-separated variant counts, e.g. 1k,100k,10m [default: 1k,100k]",
+    )
+    parser.add_argument(
+        "--only",
+        default=None,
+        help="comma-separated benchmarks to run [default: all]: "
+        + ", ".join(BENCHMARKS),
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per size")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc peak run"
+    )
+    parser.add_argument(
+        "--data-dir", default=None, help="where to write the synthetic files"
+    )
+    parser.add_argument("-o", "--output", default=None, help="JSON results path")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else None
+    results = run_benchmarks(
+        args.sizes.split(","),
+        names=names,
+        repeat=args.repeat,
+        trace_memory=not args.no_memory,
+        data_dir=args.data_dir,
+    )
+    print(results.to_csv(sep="\t", index=False, float_format="%.4g"), end="")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "environment": environment(),
+                    "results": results.to_dict(orient="records"),
+                },
+                output,
+                indent=1,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Scaling of SnvComparison and SvComparison with n_jobs
+
+Both comparisons split their inputs by chromosome (SNVs, in threads) or
+chromosome pair (SVs, in processes), so the synthetic data here spread over
+24 chromosomes. Every parallel run is checked against the serial counts.
+
+    python -m benchmarks.scaling --size 10m --jobs 1,8,16,32 --output scaling.json
+"""
+
+import argparse
+import json
+import pandas as pd
+
+from benchmarks.run import environment, measure, parse_size
+from benchmarks.synthetic import make_genome, make_sv_pair, make_variants
+from benchmarks.synthetic import overlapping_copy
+
+N_CHROMS = 24
+
+
+def make_scaling_data(size, n_chroms=N_CHROMS, seed=0):
+    """SNV/indel and SV call set pairs of size rows over n_chroms chromosomes"""
+    genome = make_genome(n_chroms, length=max(100_000, size // n_chroms), seed=seed)
+    variants = make_variants(genome, size, seed=seed + 1)
+    chroms = tuple(genome)
+    svs1, svs2 = make_sv_pair(max(size // 10, 10), seed=seed + 3, chroms=chroms)
+    return {
+        "snv": (variants, overlapping_copy(variants, seed=seed + 2, genome=genome)),
+        "sv": (svs1, svs2),
+    }
+
+
+def run_scaling(sizes, jobs, kinds=("snv", "sv"), repeat=1):
+    """Seconds per (kind, size, n_jobs), with speedup over n_jobs=1
+
+    returns: DataFrame with kind, size, n_jobs, seconds, speedup and
+        identical (parallel counts equal to the serial ones) columns
+    """
+    from dvartk.parser import SnvComparison, SvComparison
+
+    comparisons = {"snv": SnvComparison, "sv": SvComparison}
+    records = []
+    for size in [parse_size(size) for size in sizes]:
+        data = make_scaling_data(size)
+        for kind in kinds:
+            table1, table2 = data[kind]
+            expected = comparisons[kind](table1, table2).make_oneliner()
+            baseline = None
+            for n_jobs in jobs:
+
+                def run():
+                    cmp = comparisons[kind](table1, table2, n_jobs=n_jobs)
+                    return cmp.make_oneliner()
+
+                seconds = measure(run, repeat, trace_memory=False)[0]
+                baseline = seconds if baseline is None else baseline
+                records.append(
+                    {
+                        "kind": kind,
+                        "size": table1.shape[0] + table2.shape[0],
+                        "n_jobs": n_jobs,
+                        "seconds": seconds,
+                        "speedup": baseline / seconds,
+                        "identical": run() == expected,
+                    }
+                )
+    return pd.DataFrame(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.scaling",
+        description="Time SnvComparison/SvComparison across n_jobs values",
+    )
+    parser.add_argument("--sizes", default="1m", help="variant counts, e.g. 1m,10m")
+    parser.add_argument(
+        "--jobs", default="1,2,4,8", help="n_jobs values, first is base"
+    )
+    parser.add_argument("--kinds", default="snv,sv", help="snv, sv or both")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per point")
+    parser.add_argument("-o", "--output", default=None, help="JSON results path")
+    args = parser.parse_args(argv)
+
+    results = run_scaling(
+        args.sizes.split(","),
+        [int(n_jobs) for n_jobs in args.jobs.split(",")],
+        kinds=args.kinds.split(","),
+        repeat=args.repeat,
+    )
+    print(results.to_csv(sep="\t", index=False, float_format="%.4g"), end="")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "environment": environment(),
+                    "results": results.to_dict(orient="records"),
+                },
+                output,
+                indent=1,
+            )
+
+
+if __name__ == "__main__":
+    main()
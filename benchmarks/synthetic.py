@@ -0,0 +1,244 @@
+"""Deterministic synthetic genomes, variant tables and files for benchmarks
+
+Everything is generated from numpy seeds, so runs are reproducible and need
+no downloads.
+"""
+
+import gzip
+import os
+import numpy as np
+import pandas as pd
+
+BASES = np.frombuffer(b"ACGT", dtype="S1")
+MAF_COLUMNS = {
+    "chrom": "Chromosome",
+    "pos": "Start_Position",
+    "ref": "Reference_Allele",
+    "alt": "Tumor_Seq_Allele2",
+}
+SV_MAF_COLUMNS = [
+    "chromosome_1",
+    "position_1",
+    "strand_1",
+    "chromosome_2",
+    "position_2",
+    "strand_2",
+    "type",
+    "length",
+]
+
+
+def make_genome(n_chroms=3, length=1_000_000, seed=0):
+    """{chrom: sequence} of tandem-repeat-rich random sequence
+
+    Motifs of 1-3 bases repeated 1-5 times give indels something to shift
+    through, as in real genomes.
+    """
+    rng = np.random.default_rng(seed)
+    genome = {}
+    for ix in range(n_chroms):
+        n_motifs = length // 3 + 1
+        motif_lengths = rng.integers(1, 4, size=n_motifs)
+        copies = rng.integers(1, 6, size=n_motifs)
+        bases = BASES[rng.integers(0, 4, size=int(motif_lengths.sum()))]
+        motif_starts = np.cumsum(motif_lengths) - motif_lengths
+        # each motif spans motif_length * copies bases, cycling through it
+        spans = motif_lengths * copies
+        motif_ids = np.repeat(np.arange(n_motifs), spans)[:length]
+        offsets = np.arange(motif_ids.shape[0]) - (np.cumsum(spans) - spans)[motif_ids]
+        seq = bases[motif_starts[motif_ids] + offsets % motif_lengths[motif_ids]]
+        genome[str(ix + 1)] = seq.tobytes().decode("ascii")
+    return genome
+
+
+def write_fasta(path, genome, width=60):
+    with open(path, "w") as fasta:
+        for chrom, seq in genome.items():
+            fasta.write(f">{chrom}\n")
+            for start in range(0, len(seq), width):
+                fasta.write(seq[start : start + width] + "\n")
+    return str(path)
+
+
+def gather_strings(seq, starts, lengths):
+    """seq[start : start + length] per row, vectorized per distinct length"""
+    out = np.empty(starts.shape[0], dtype=object)
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        codes = seq[starts[rows, None] + np.arange(length)]
+        out[rows] = codes.view(f"S{length}").ravel().astype(str)
+    return out
+
+
+def make_variants(genome, n, indel_fraction=0.1, seed=1):
+    """chrom/pos/ref/alt/Variant_Type table of SNVs and VCF-style indels
+
+    Positions are sorted per chromosome and alleles agree with the genome.
+    """
+    rng = np.random.default_rng(seed)
+    chroms = list(genome)
+    chrom_ixs = np.sort(rng.integers(0, len(chroms), size=n))
+    tables = []
+    for chrom_ix, count in zip(*np.unique(chrom_ixs, return_counts=True)):
+        chrom = chroms[chrom_ix]
+        seq = np.frombuffer(genome[chrom].encode("ascii"), dtype="S1")
+        positions = np.sort(rng.integers(2, seq.shape[0] - 10, size=count))
+        kinds = rng.choice(
+            np.array(["SNP", "DEL", "INS"], dtype=object),
+            size=count,
+            p=[1 - indel_fraction, indel_fraction / 2, indel_fraction / 2],
+        )
+        lengths = rng.integers(1, 5, size=count)
+        anchors = gather_strings(seq, positions - 1, np.ones(count, dtype=int))
+        flanks = gather_strings(seq, positions, lengths)
+        base_codes = pd.Series(anchors).map(dict(zip("ACGT", range(4)))).to_numpy()
+        snv_alts = (
+            BASES[(base_codes + 1 + positions % 3) % 4].astype(str).astype(object)
+        )
+        is_del, is_ins = kinds == "DEL", kinds == "INS"
+        tables.append(
+            pd.DataFrame(
+                {
+                    "chrom": chrom,
+                    "pos": positions,
+                    "ref": np.where(is_del, anchors + flanks, anchors),
+                    "alt": np.where(
+                        is_ins, anchors + flanks, np.where(is_del, anchors, snv_alts)
+                    ),
+                    "Variant_Type": kinds,
+                }
+            )
+        )
+    return pd.concat(tables, ignore_index=True)
+
+
+def overlapping_copy(variants, overlap=0.5, seed=2, genome=None):
+    """A second call set sharing an overlap fraction of variants
+
+    The rest are new SNVs drawn with make_variants (genome required) or
+    shifted copies of the remaining rows.
+    """
+    rng = np.random.default_rng(seed)
+    n = variants.shape[0]
+    shared = variants.iloc[np.sort(rng.choice(n, size=int(n * overlap), replace=False))]
+    n_new = n - shared.shape[0]
+    if genome is not None:
+        new = make_variants(genome, n_new, seed=seed + 1)
+    else:
+        new = variants.sample(n_new, random_state=seed).assign(
+            pos=lambda df: df.pos + 1
+        )
+    return pd.concat([shared, new], ignore_index=True)
+
+
+def write_maf(path, variants):
+    """Tab-separated (gzipped for .gz) MAF with a version comment line"""
+    maf = variants.rename(columns=MAF_COLUMNS)
+    opener = gzip.open if str(path).endswith("gz") else open
+    with opener(path, "wt") as maf_file:
+        maf_file.write("#version 2.4\n")
+        maf.to_csv(maf_file, sep="\t", index=False)
+    return str(path)
+
+
+def write_vcf(path, variants):
+    """Plain VCF; sort variants by chrom and pos first for bgzip_and_index"""
+    with open(path, "w") as vcf:
+        vcf.write("##fileformat=VCFv4.2\n")
+        for chrom in pd.unique(variants["chrom"]):
+            vcf.write(f"##contig=<ID={chrom}>\n")
+        vcf.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        body = pd.DataFrame(
+            {
+                "chrom": variants["chrom"],
+                "pos": variants["pos"],
+                "id": ".",
+                "ref": variants["ref"],
+                "alt": variants["alt"],
+                "qual": ".",
+                "filter": "PASS",
+                "info": ".",
+            }
+        )
+        body.to_csv(vcf, sep="\t", index=False, header=False)
+    return str(path)
+
+
+def make_svs(n, chroms=("1", "2", "3"), length=1_000_000, seed=3):
+    """SV table in the SvFileConfig dst schema"""
+    rng = np.random.default_rng(seed)
+    types = rng.choice(["del", "dup", "inv", "translocation"], size=n)
+    chromosome_1 = rng.choice(list(chroms), size=n)
+    chromosome_2 = np.where(
+        types == "translocation", rng.choice(list(chroms), size=n), chromosome_1
+    )
+    position_1 = rng.integers(1, length, size=n)
+    sv_lengths = np.exp(rng.uniform(np.log(100), np.log(1e6), size=n)).astype(int)
+    position_2 = np.where(
+        types == "translocation",
+        rng.integers(1, length, size=n),
+        np.minimum(position_1 + sv_lengths, length),
+    )
+    strands = {"del": "+-", "dup": "-+", "inv": "++", "translocation": "+-"}
+    strand_pairs = pd.Series(types).map(strands)
+    return pd.DataFrame(
+        {
+            "chromosome_1": chromosome_1,
+            "position_1": position_1,
+            "strand_1": strand_pairs.str[0].to_numpy(),
+            "chromosome_2": chromosome_2,
+            "position_2": position_2,
+            "strand_2": strand_pairs.str[1].to_numpy(),
+            "type": types,
+            "length": np.where(types == "translocation", -1, position_2 - position_1),
+        }
+    )
+
+
+def make_sv_pair(n, overlap=0.5, jitter=100, seed=3, chroms=("1", "2", "3")):
+    """(truth, calls): calls re-detect an overlap fraction of truth SVs with
+    breakpoints moved by up to jitter bp, the rest are new SVs
+    """
+    rng = np.random.default_rng(seed)
+    truth = make_svs(n, chroms=chroms, seed=seed)
+    n_shared = int(n * overlap)
+    shared = truth.iloc[:n_shared].copy()
+    for col in ("position_1", "position_2"):
+        shared[col] = np.maximum(
+            shared[col] + rng.integers(-jitter, jitter + 1, size=n_shared), 1
+        )
+    calls = pd.concat(
+        [shared, make_svs(n - n_shared, chroms=chroms, seed=seed + 1)],
+        ignore_index=True,
+    )
+    return truth, calls
+
+
+def write_sv_table(path, svs):
+    svs.to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+def make_dataset(directory, n, seed=0, genome_length=1_000_000):
+    """Write a FASTA, SNV/indel MAF and VCF pairs and SV tables for n variants
+
+    returns: dict of paths plus the in-memory tables
+    """
+    os.makedirs(directory, exist_ok=True)
+    genome = make_genome(length=genome_length, seed=seed)
+    variants = make_variants(genome, n, seed=seed + 1)
+    other = overlapping_copy(variants, seed=seed + 2, genome=genome)
+    other = other.sort_values(["chrom", "pos"], ignore_index=True)
+    truth_svs, called_svs = make_sv_pair(max(n // 10, 10), seed=seed + 3)
+    return {
+        "fasta": write_fasta(os.path.join(directory, "genome.fa"), genome),
+        "maf1": write_maf(os.path.join(directory, "calls1.maf.gz"), variants),
+        "maf2": write_maf(os.path.join(directory, "calls2.maf.gz"), other),
+        "vcf2": write_vcf(os.path.join(directory, "calls2.vcf"), other),
+        "sv1": write_sv_table(os.path.join(directory, "svs1.tsv"), truth_svs),
+        "sv2": write_sv_table(os.path.join(directory, "svs2.tsv"), called_svs),
+        "variants1": variants,
+        "variants2": other,
+        "svs1": truth_svs,
+        "svs2": called_svs,
+    }
@@ -1,21 +1,70 @@
-from dvartk.parser import (
-    SvFileConfig,
-    SnvFileConfig,
-    SvComparison,
-    SnvComparison,
-    convert_type_names,
-)
+"""dvartk exports its public names lazily
 
-from dvartk.process import (
-    count_svs,
-    count_snvs,
-    count_indels,
-)
+Submodules, and the pandas/matplotlib/SigProfiler stacks behind them, are
+imported on first attribute access (PEP 562), so `import dvartk` stays
+cheap for jobs that only compare tables.
+"""
+
+import importlib
 
-from dvartk.plotter import (
-    plot_sv_spectra,
-    plot_snv_spectra,
-    plot_indel_spectra,
-    proc_indel_dataframe,
-    plot_venn2,
+EXPORTS = {
+    "SvFileConfig": "dvartk.parser",
+    "SnvFileConfig": "dvartk.parser",
+    "SvComparison": "dvartk.parser",
+    "SnvComparison": "dvartk.parser",
+    "MultiComparison": "dvartk.parser",
+    "convert_type_names": "dvartk.parser",
+    "normalize_sv_types": "dvartk.svtypes",
+    "register_sv_type_aliases": "dvartk.svtypes",
+    "PartitionedComparison": "dvartk.partition",
+    "count_svs": "dvartk.process",
+    "count_snvs": "dvartk.process",
+    "count_snvs_cohort": "dvartk.process",
+    "count_snv_spectra": "dvartk.process",
+    "count_indels": "dvartk.process",
+    "plot_sv_spectra": "dvartk.plotter",
+    "plot_snv_spectra": "dvartk.plotter",
+    "plot_indel_spectra": "dvartk.plotter",
+    "proc_indel_dataframe": "dvartk.plotter",
+    "plot_venn2": "dvartk.plotter",
+    "SpectraRenderer": "dvartk.plotter",
+    "save_spectra": "dvartk.plotter",
+}
+
+# submodules reachable as attributes, e.g. dvartk.parser.SnvFileConfig
+SUBMODULES = (
+    "batch",
+    "cache",
+    "channels",
+    "cli",
+    "index",
+    "instrument",
+    "matching",
+    "normalize",
+    "parallel",
+    "parser",
+    "partition",
+    "plotter",
+    "process",
+    "reference",
+    "regions",
+    "svtypes",
+    "vcf",
 )
+
+__all__ = list(EXPORTS)
+
+
+def __getattr__(name):
+    if name in EXPORTS:
+        value = getattr(importlib.import_module(EXPORTS[name]), name)
+    elif name in SUBMODULES:
+        value = importlib.import_module(f"dvartk.{name}")
+    else:
+        raise AttributeError(f"module 'dvartk' has no attribute '{name}'")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS) | set(SUBMODULES))
@@ -0,0 +1,5 @@
+import sys
+
+from dvartk.cli import main
+
+sys.exit(main())
@@ -0,0 +1,251 @@
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+COUNT_KINDS = ("snv", "indel", "sv")
+
+# per-process state set up by init_worker
+_worker = {}
+
+
+def read_manifest(manifest, sample_col="sample", path_col="path"):
+    """Sample to MAF path table from a TSV path, DataFrame or {sample: path} dict
+
+    returns: DataFrame with 'sample' and 'path' columns
+    """
+    if isinstance(manifest, dict):
+        manifest = pd.DataFrame(
+            {"sample": list(manifest), "path": list(manifest.values())}
+        )
+    elif isinstance(manifest, (str, os.PathLike)):
+        manifest = pd.read_csv(manifest, sep="\t", dtype=str)
+    manifest = manifest.rename(columns={sample_col: "sample", path_col: "path"})
+    assert {"sample", "path"} <= set(manifest.columns), "manifest needs sample and path"
+    assert manifest["sample"].is_unique, "duplicate samples in manifest"
+    return manifest[["sample", "path"]].reset_index(drop=True)
+
+
+def open_genome(genome):
+    """ReferenceCache for a .dvref path, pyfaidx.Fasta for other paths
+
+    Opened objects are returned as they are.
+    """
+    if not isinstance(genome, (str, os.PathLike)):
+        return genome
+    genome = os.fspath(genome)
+    if genome.endswith(".dvref"):
+        from dvartk.reference import ReferenceCache
+
+        return ReferenceCache(genome)
+    from pyfaidx import Fasta
+
+    return Fasta(genome)
+
+
+def genome_spec(genome):
+    """Picklable handle for genome: an absolute path, as workers change dirs
+
+    A pyfaidx.Fasta is passed by its FASTA path; a ReferenceCache pickles
+    itself by path.
+    """
+    if genome is None:
+        return None
+    genome = getattr(genome, "filename", genome)
+    if isinstance(genome, (str, os.PathLike)):
+        return os.path.abspath(genome)
+    return genome
+
+
+def init_worker(genome, scratch_root):
+    """Open the genome once per worker and move it into its own scratch dir
+
+    Temporary files (tempfile, SigProfiler output) and the working directory
+    of each worker live under scratch_root/<pid>, so concurrent samples never
+    share paths. Plotting goes through the non-interactive Agg backend.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    scratch_dir = os.path.join(scratch_root, str(os.getpid()))
+    os.makedirs(scratch_dir, exist_ok=True)
+    os.chdir(scratch_dir)
+    tempfile.tempdir = scratch_dir
+    _worker["genome"] = open_genome(genome) if genome is not None else None
+
+
+def load_sample(path, kind, file_config, genome, cache_dir=None):
+    """Load one MAF as the chrom/pos/ref/alt or SV table count_<kind>s expects"""
+    if kind != "indel":
+        return file_config.load_and_convert_maf_columns(path, cache_dir=cache_dir)
+
+    from dvartk.parser import read_maf
+    from dvartk.process import anchor_maf_indels
+
+    maf = read_maf(
+        path,
+        dtype={file_config.chrom_src: str},
+        usecols=list(file_config.col_converter) + ["Variant_Type"],
+        chunksize=500000,
+        chunk_filter=file_config.select_indels,
+    )
+    maf = file_config.convert_maf_columns(maf)
+    if genome is not None:
+        maf = anchor_maf_indels(maf, genome)
+    return maf
+
+
+def count_sample(variants, kind, genome):
+    """Count one sample; returns a Series indexed by channel label"""
+    from dvartk.process import count_indels, count_snvs, count_svs
+
+    if kind == "snv":
+        return count_snvs(variants, genome)
+    if kind == "indel":
+        return count_indels(variants, genome=genome)["count"]
+    return count_svs(variants)
+
+
+def plot_sample(counts, kind, sample, plot_dir, plot_format="png"):
+    """Save the spectrum of one sample to plot_dir/<sample>.<kind>.<plot_format>
+
+    Uses one SpectraRenderer per kind and process, built on first use.
+    """
+    from dvartk.plotter import SpectraRenderer
+
+    renderers = _worker.setdefault("renderers", {})
+    if kind not in renderers:
+        renderers[kind] = SpectraRenderer(kind)
+    save_path = os.path.join(plot_dir, f"{sample}.{kind}.{plot_format}")
+    renderers[kind].save(counts, sample, save_path)
+
+
+def process_sample(
+    sample, path, kind, file_config, plot_dir=None, cache_dir=None, plot_format="png"
+):
+    """Load, count and optionally plot one sample in a worker
+
+    returns: (counts Series or None, timing dict); errors are recorded in the
+    timing dict instead of being raised, so one bad sample does not stop a cohort
+    """
+    genome = _worker.get("genome")
+    timing = {
+        "sample": sample,
+        "n_variants": 0,
+        "load_seconds": 0.0,
+        "count_seconds": 0.0,
+        "plot_seconds": 0.0,
+        "error": None,
+    }
+    counts = None
+    step = "load_seconds"
+    try:
+        start = time.perf_counter()
+        variants = load_sample(path, kind, file_config, genome, cache_dir=cache_dir)
+        timing["n_variants"] = variants.shape[0]
+        timing[step] = time.perf_counter() - start
+
+        step, start = "count_seconds", time.perf_counter()
+        counts = count_sample(variants, kind, genome)
+        timing[step] = time.perf_counter() - start
+
+        if plot_dir is not None:
+            step, start = "plot_seconds", time.perf_counter()
+            plot_sample(counts, kind, sample, plot_dir, plot_format)
+            timing[step] = time.perf_counter() - start
+    except Exception as error:
+        timing[step] = time.perf_counter() - start
+        timing["error"] = repr(error)
+    return counts, timing
+
+
+def run_cohort(
+    manifest,
+    kind,
+    file_config,
+    genome=None,
+    n_workers=None,
+    plot_dir=None,
+    scratch_dir=None,
+    cache_dir=None,
+    plot_format="png",
+):
+    """Count (and plot) every sample of a manifest across a process pool
+
+    manifest: see read_manifest
+    kind [str]: element in {'snv', 'indel', 'sv'}
+    file_config: SnvFileConfig for 'snv'/'indel', SvFileConfig for 'sv'
+    genome: FASTA or .dvref path, pyfaidx.Fasta or ReferenceCache, required
+        for 'snv' and 'indel'; each worker opens it once, and a ReferenceCache
+        is memory-mapped so its pages are shared between workers
+    n_workers [int]: worker processes [default: os.cpu_count()]
+    plot_dir [str]: if given, save <sample>.<kind>.<plot_format> spectra there
+    plot_format [str]: 'png', 'svg' or 'pdf'
+    scratch_dir [str]: parent of the per-worker scratch dirs [default: system
+        temp dir]; the scratch dirs are removed afterwards
+    cache_dir [str]: passed to load_and_convert_maf_columns ('snv', 'sv')
+    returns: (counts, timings); counts is a samples x channels DataFrame
+        (96 SNV / 83 ID / 25 SV channels) of the samples that succeeded,
+        timings has n_variants, load/count/plot seconds and error per sample
+    """
+    assert kind in COUNT_KINDS, f"kind must be one of {COUNT_KINDS}"
+    if kind in ("snv", "indel"):
+        assert genome is not None, f"counting {kind}s requires a genome"
+    manifest = read_manifest(manifest)
+    if plot_dir is not None:
+        os.makedirs(plot_dir, exist_ok=True)
+        plot_dir = os.path.abspath(plot_dir)
+    if cache_dir is not None:
+        cache_dir = os.path.abspath(cache_dir)
+    paths = [os.path.abspath(path) for path in manifest["path"]]
+
+    scratch_root = tempfile.mkdtemp(prefix="dvartk-batch-", dir=scratch_dir)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=init_worker,
+            initargs=(genome_spec(genome), scratch_root),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    process_sample,
+                    sample,
+                    path,
+                    kind,
+                    file_config,
+                    plot_dir,
+                    cache_dir,
+                    plot_format,
+                )
+                for sample, path in zip(manifest["sample"], paths)
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(scratch_root, ignore_errors=True)
+
+    timings = pd.DataFrame([timing for _, timing in results]).set_index("sample")
+    failed = timings["error"].notna()
+    if failed.any():
+        warnings.warn(
+            "Warning: {} of {} samples failed, e.g. {}: {}".format(
+                failed.sum(),
+                failed.shape[0],
+                timings.index[failed][0],
+                timings.loc[failed, "error"].iloc[0],
+            )
+        )
+    counts = {
+        timing["sample"]: sample_counts
+        for sample_counts, timing in results
+        if sample_counts is not None
+    }
+    if counts:
+        counts = pd.DataFrame(counts).T.astype(int)
+    else:
+        counts = pd.DataFrame(dtype=int)
+    counts.index.name = "sample"
+    return counts, timings
@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+
+CACHE_FORMAT_VERSION = 1
+
+
+def import_feather():
+    try:
+        from pyarrow import feather
+    except ImportError as error:
+        raise ImportError(
+            "the table cache needs pyarrow; install with `pip install dvartk[cache]`"
+        ) from error
+    return feather
+
+
+def table_cache_path(cache_dir, source_path, fields):
+    """Cache file path keyed by source path, size, mtime and loader fields"""
+    stat = os.stat(source_path)
+    payload = json.dumps(
+        {
+            "version": CACHE_FORMAT_VERSION,
+            "source_path": os.path.abspath(source_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "fields": fields,
+        },
+        sort_keys=True,
+    )
+    key = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+    return os.path.join(cache_dir, f"{os.path.basename(source_path)}.{key}.feather")
+
+
+def write_cached_table(df, cache_path):
+    """Write df as uncompressed Feather (Arrow IPC), atomically"""
+    feather = import_feather()
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+
+
+def read_cached_table(cache_path):
+    """Read a Feather cache through a memory map"""
+    feather = import_feather()
+    table = feather.read_table(cache_path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
@@ -0,0 +1,427 @@
+import numpy as np
+import pandas as pd
+
+SBS96_TYPES = ["C>A", "C>G", "C>T", "T>A", "T>C", "T>G"]
+SBS96_LABELS = [
+    f"{left}[{snv}]{right}"
+    for snv in SBS96_TYPES
+    for left in "ACGT"
+    for right in "ACGT"
+]
+
+SNV_STRANDS = ["T", "U"]  # transcribed, untranscribed
+SBS192_LABELS = [
+    f"{strand}:{label}" for strand in SNV_STRANDS for label in SBS96_LABELS
+]
+SBS1536_LABELS = [
+    f"{left2}{left1}[{snv}]{right1}{right2}"
+    for snv in SBS96_TYPES
+    for left2 in "ACGT"
+    for left1 in "ACGT"
+    for right1 in "ACGT"
+    for right2 in "ACGT"
+]
+
+# reference dinucleotides in pyrimidine-first orientation and their
+# alternatives, palindromic references (AT, CG, GC, TA) counting an alt and
+# its reverse complement once, as in SigProfiler's DBS78
+DBS78_ALTS = {
+    "AC": ["CA", "CG", "CT", "GA", "GG", "GT", "TA", "TG", "TT"],
+    "AT": ["CA", "CC", "CG", "GA", "GC", "TA"],
+    "CC": ["AA", "AG", "AT", "GA", "GG", "GT", "TA", "TG", "TT"],
+    "CG": ["AT", "GC", "GT", "TA", "TC", "TT"],
+    "CT": ["AA", "AC", "AG", "GA", "GC", "GG", "TA", "TC", "TG"],
+    "GC": ["AA", "AG", "AT", "CA", "CG", "TA"],
+    "TA": ["AT", "CG", "CT", "GC", "GG", "GT"],
+    "TC": ["AA", "AG", "AT", "CA", "CG", "CT", "GA", "GG", "GT"],
+    "TG": ["AA", "AC", "AT", "CA", "CC", "CT", "GA", "GC", "GT"],
+    "TT": ["AA", "AC", "AG", "CA", "CC", "CG", "GA", "GC", "GG"],
+}
+DBS78_LABELS = [f"{ref}>{alt}" for ref, alts in DBS78_ALTS.items() for alt in alts]
+
+ID83_LABELS = [
+    "1:Del:C:0",
+    "1:Del:C:1",
+    "1:Del:C:2",
+    "1:Del:C:3",
+    "1:Del:C:4",
+    "1:Del:C:5",
+    "1:Del:T:0",
+    "1:Del:T:1",
+    "1:Del:T:2",
+    "1:Del:T:3",
+    "1:Del:T:4",
+    "1:Del:T:5",
+    "1:Ins:C:0",
+    "1:Ins:C:1",
+    "1:Ins:C:2",
+    "1:Ins:C:3",
+    "1:Ins:C:4",
+    "1:Ins:C:5",
+    "1:Ins:T:0",
+    "1:Ins:T:1",
+    "1:Ins:T:2",
+    "1:Ins:T:3",
+    "1:Ins:T:4",
+    "1:Ins:T:5",
+    "2:Del:R:0",
+    "2:Del:R:1",
+    "2:Del:R:2",
+    "2:Del:R:3",
+    "2:Del:R:4",
+    "2:Del:R:5",
+    "3:Del:R:0",
+    "3:Del:R:1",
+    "3:Del:R:2",
+    "3:Del:R:3",
+    "3:Del:R:4",
+    "3:Del:R:5",
+    "4:Del:R:0",
+    "4:Del:R:1",
+    "4:Del:R:2",
+    "4:Del:R:3",
+    "4:Del:R:4",
+    "4:Del:R:5",
+    "5:Del:R:0",
+    "5:Del:R:1",
+    "5:Del:R:2",
+    "5:Del:R:3",
+    "5:Del:R:4",
+    "5:Del:R:5",
+    "2:Ins:R:0",
+    "2:Ins:R:1",
+    "2:Ins:R:2",
+    "2:Ins:R:3",
+    "2:Ins:R:4",
+    "2:Ins:R:5",
+    "3:Ins:R:0",
+    "3:Ins:R:1",
+    "3:Ins:R:2",
+    "3:Ins:R:3",
+    "3:Ins:R:4",
+    "3:Ins:R:5",
+    "4:Ins:R:0",
+    "4:Ins:R:1",
+    "4:Ins:R:2",
+    "4:Ins:R:3",
+    "4:Ins:R:4",
+    "4:Ins:R:5",
+    "5:Ins:R:0",
+    "5:Ins:R:1",
+    "5:Ins:R:2",
+    "5:Ins:R:3",
+    "5:Ins:R:4",
+    "5:Ins:R:5",
+    "2:Del:M:1",
+    "3:Del:M:1",
+    "3:Del:M:2",
+    "4:Del:M:1",
+    "4:Del:M:2",
+    "4:Del:M:3",
+    "5:Del:M:1",
+    "5:Del:M:2",
+    "5:Del:M:3",
+    "5:Del:M:4",
+    "5:Del:M:5",
+]
+
+ID83_TYPES = {
+    "1:Del:C": "1bp Del at Homopolymer C",
+    "1:Del:T": "1bp Del at Homopolymer T",
+    "1:Ins:C": "1bp Ins at Homopolymer C",
+    "1:Ins:T": "1bp Ins at Homopolymer T",
+    "2:Del:R": "2bp Del at Repeats",
+    "3:Del:R": "3bp Del at Repeats",
+    "4:Del:R": "4bp Del at Repeats",
+    "5:Del:R": "5+bp Del at Repeats",
+    "2:Ins:R": "2bp Ins at Repeats",
+    "3:Ins:R": "3bp Ins at Repeats",
+    "4:Ins:R": "4bp Ins at Repeats",
+    "5:Ins:R": "5+bp Ins at Repeats",
+    "2:Del:M": "2bp Del at Microhomology",
+    "3:Del:M": "3bp Del at Microhomology",
+    "4:Del:M": "4bp Del at Microhomology",
+    "5:Del:M": "5+bp Del at Microhomology",
+}
+
+SV_COLORS = [
+    "#d6e6f4",
+    "#abd0e6",
+    "#6aaed6",
+    "#3787c0",
+    "#105ba4",
+    "#08315c",  # deletion
+    "#fedfc0",
+    "#fdb97d",
+    "#fd8c3b",
+    "#e95e0d",
+    "#b63c02",
+    "#642101",  # duplication
+    "#dbcce8",
+    "#b799d2",
+    "#9366bc",
+    "#6f4298",
+    "#4a2c65",
+    "#39224f",  # insertion
+    "#dbf1d6",
+    "#aedea7",
+    "#73c476",
+    "#37a055",
+    "#0b7734",
+    "#043316",  # inversion
+    "#aaaaaa",
+]  # translocation
+
+SNV_COLORS = ["#03BDEE", "#000000", "#E52A25", "#CDC9CA", "#A3CE62", "#ECC6C5"]
+
+DBS_COLORS = [
+    "#03BCEE",
+    "#0266CA",
+    "#A1CE63",
+    "#016601",
+    "#FE9898",
+    "#E32926",
+    "#FEB065",
+    "#FE8002",
+    "#CB98FE",
+    "#4C0299",
+]
+
+INDEL_COLORS = {
+    "1bp Del at Homopolymer C": "#FDBE6E",
+    "1bp Del at Homopolymer T": "#FD7F06",
+    "1bp Ins at Homopolymer C": "#ACDC88",
+    "1bp Ins at Homopolymer T": "#399F31",
+    "2bp Del at Repeats": "#FACAB4",
+    "3bp Del at Repeats": "#FC8A68",
+    "4bp Del at Repeats": "#F14434",
+    "5+bp Del at Repeats": "#BC191C",
+    "2bp Ins at Repeats": "#D0E0F0",
+    "3bp Ins at Repeats": "#94C3E1",
+    "4bp Ins at Repeats": "#4C95C8",
+    "5+bp Ins at Repeats": "#1962A7",
+    "2bp Del at Microhomology": "#E2DFF0",
+    "3bp Del at Microhomology": "#B4B7D8",
+    "4bp Del at Microhomology": "#8584BD",
+    "5+bp Del at Microhomology": "#614099",
+}
+
+
+class SvChannelSchema:
+    """SV channels: type x length bin, plus types counted without length bins
+
+    Length bins are right-inclusive, (edge[i], edge[i + 1]], as in pd.cut,
+    so lengths at or below the first edge or missing are not counted. Labels
+    are 'type:bin_label' for binned types and the type name for the others,
+    in palimpsest order by default.
+    """
+
+    def __init__(
+        self,
+        binned_types=("del", "dup", "ins", "inv"),
+        length_edges=(0, 1e3, 1e4, 1e5, 1e6, 1e7, np.inf),
+        length_labels=("<1kb", "1-10kb", "10-100kb", "100kb-1Mb", "1-10Mb", ">10Mb"),
+        unbinned_types=("translocation",),
+    ):
+        assert len(length_edges) == len(length_labels) + 1
+        assert np.all(np.diff(length_edges) > 0), "length_edges must increase"
+        self.binned_types = list(binned_types)
+        self.length_edges = np.asarray(length_edges, dtype=float)
+        self.length_labels = list(length_labels)
+        self.unbinned_types = list(unbinned_types)
+        self.types = pd.Index(self.binned_types + self.unbinned_types)
+        assert self.types.is_unique, "duplicate SV types"
+
+        self.labels = [
+            f"{svtype}:{length_label}"
+            for svtype in self.binned_types
+            for length_label in self.length_labels
+        ] + self.unbinned_types
+        # channel of the first bin per type; unbinned types take one channel
+        n_bins = len(self.length_labels)
+        self.type_offsets = np.array(
+            [ix * n_bins for ix in range(len(self.binned_types))]
+            + [
+                len(self.binned_types) * n_bins + ix
+                for ix in range(len(self.unbinned_types))
+            ],
+            dtype=np.int64,
+        )
+        self.is_binned = np.arange(len(self.types)) < len(self.binned_types)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def type_codes(self, types):
+        """Position of each type in self.types, -1 for other types"""
+        # look up each distinct type once; code -1 (missing) maps to -1
+        if isinstance(types.dtype, pd.CategoricalDtype):
+            codes, uniques = types.cat.codes.to_numpy(), types.cat.categories
+        else:
+            codes, uniques = pd.factorize(types)
+        lookup = np.append(self.types.get_indexer(uniques), -1)
+        return lookup[codes]
+
+    def channel_codes(self, maf, type_col="type", length_col="length"):
+        """Channel index per row of maf, -1 for rows outside every channel"""
+        type_codes = self.type_codes(maf[type_col])
+        lengths = pd.to_numeric(maf[length_col], errors="coerce").to_numpy(
+            dtype=float, na_value=np.nan
+        )
+        bins = np.searchsorted(self.length_edges, lengths, side="left") - 1
+        in_range = (bins >= 0) & (bins < len(self.length_labels))
+
+        known = type_codes >= 0
+        binned = np.zeros(len(type_codes), dtype=bool)
+        binned[known] = self.is_binned[type_codes[known]]
+        channels = np.full(len(type_codes), -1, dtype=np.int64)
+        channels[known] = self.type_offsets[type_codes[known]]
+        channels[binned & in_range] += bins[binned & in_range]
+        channels[binned & ~in_range] = -1
+        return channels
+
+    def count(self, maf, type_col="type", length_col="length"):
+        """Counts per channel as a Series indexed by self.labels"""
+        channels = self.channel_codes(maf, type_col, length_col)
+        counts = np.bincount(channels[channels >= 0], minlength=len(self))
+        return pd.Series(counts, index=self.labels)
+
+    def count_grouped(self, maf, by, type_col="type", length_col="length"):
+        """Counts per group of the by column as a groups x channels DataFrame"""
+        channels = self.channel_codes(maf, type_col, length_col)
+        group_codes, groups = pd.factorize(maf[by], sort=True)
+        valid = (channels >= 0) & (group_codes >= 0)
+        counts = np.bincount(
+            group_codes[valid].astype(np.int64) * len(self) + channels[valid],
+            minlength=len(groups) * len(self),
+        )
+        return pd.DataFrame(
+            counts.reshape(len(groups), len(self)),
+            index=pd.Index(groups, name=by),
+            columns=self.labels,
+        )
+
+
+SV_SCHEMA = SvChannelSchema()
+
+
+def annotate_groups(table):
+    """Add group_index and group_start (first channel of each type) columns"""
+    table["group_index"] = pd.factorize(table["type"])[0]
+    table["group_start"] = table["type"].ne(table["type"].shift())
+    return table
+
+
+def sbs96_table():
+    """Type (C>A, ...), trinucleotide tick and color per SBS96 channel"""
+    labels = pd.Index(SBS96_LABELS)
+    types = labels.str[2:5]
+    table = pd.DataFrame(
+        {
+            "type": types,
+            "tick": labels.str[0] + labels.str[2] + labels.str[6],
+            "color": [SNV_COLORS[SBS96_TYPES.index(t)] for t in types],
+        },
+        index=labels,
+    )
+    return annotate_groups(table)
+
+
+def sbs192_table():
+    """Strand:type (T:C>A, ...), trinucleotide tick and color per SBS192 channel"""
+    sbs96 = sbs96_table()
+    tables = [
+        sbs96[["tick", "color"]].assign(type=strand + ":" + sbs96["type"])
+        for strand in SNV_STRANDS
+    ]
+    table = pd.concat(tables)[["type", "tick", "color"]]
+    table.index = pd.Index(SBS192_LABELS)
+    return annotate_groups(table)
+
+
+def sbs1536_table():
+    """Type (C>A, ...), pentanucleotide tick and color per SBS1536 channel"""
+    labels = pd.Index(SBS1536_LABELS)
+    types = labels.str[3:6]
+    table = pd.DataFrame(
+        {
+            "type": types,
+            "tick": labels.str[:2] + labels.str[3] + labels.str[-2:],
+            "color": [SNV_COLORS[SBS96_TYPES.index(t)] for t in types],
+        },
+        index=labels,
+    )
+    return annotate_groups(table)
+
+
+def dbs78_table():
+    """Type (reference 'AC>NN', ...), alternative tick and color per DBS78 channel"""
+    refs = list(DBS78_ALTS)
+    rows = [
+        (f"{ref}>NN", alt, DBS_COLORS[refs.index(ref)])
+        for ref, alts in DBS78_ALTS.items()
+        for alt in alts
+    ]
+    table = pd.DataFrame(rows, columns=["type", "tick", "color"], index=DBS78_LABELS)
+    return annotate_groups(table)
+
+
+def id83_tick(insdel, feature, n):
+    # repeat counts of deletions include the deleted unit; top bins are open
+    if insdel == "Del" and feature in ("C", "T", "R"):
+        n, top = n + 1, 6
+    else:
+        top = 5
+    return f"{n}+" if n == top else str(n)
+
+
+def id83_table():
+    """Type (e.g. '2bp Del at Repeats'), feature length tick and color per ID83 channel"""
+    rows = []
+    for label in ID83_LABELS:
+        size, insdel, feature, n = label.split(":")
+        indel_type = ID83_TYPES[f"{size}:{insdel}:{feature}"]
+        rows.append(
+            (indel_type, id83_tick(insdel, feature, int(n)), INDEL_COLORS[indel_type])
+        )
+    table = pd.DataFrame(rows, columns=["type", "tick", "color"], index=ID83_LABELS)
+    return annotate_groups(table)
+
+
+def sv_table(schema=SV_SCHEMA, colors=SV_COLORS):
+    """Type (del, ..., translocation), label tick and color per SV channel"""
+    types = [label.split(":")[0] for label in schema.labels]
+    table = pd.DataFrame(
+        {"type": types, "tick": schema.labels, "color": colors}, index=schema.labels
+    )
+    return annotate_groups(table)
+
+
+CHANNEL_TABLES = {
+    "SBS96": sbs96_table(),
+    "SBS192": sbs192_table(),
+    "SBS1536": sbs1536_table(),
+    "DBS78": dbs78_table(),
+    "ID83": id83_table(),
+    "SV": sv_table(),
+}
+
+
+def register_channel_table(name, table):
+    """Add a channel annotation table (index: labels; type, tick, color columns)"""
+    missing = {"type", "tick", "color"} - set(table.columns)
+    if missing:
+        raise ValueError(f"channel table {name} lacks columns {sorted(missing)}")
+    if "group_index" not in table.columns:
+        table = annotate_groups(table.copy())
+    CHANNEL_TABLES[name] = table
+    return table
+
+
+def channel_table(name):
+    """Channel annotation table by schema name, e.g. 'SBS96', 'ID83' or 'SV'"""
+    if name not in CHANNEL_TABLES:
+        raise ValueError(
+            f"unknown channel schema {name!r}; known: {sorted(CHANNEL_TABLES)}"
+        )
+    return CHANNEL_TABLES[name]
@@ -0,0 +1,319 @@
+"""dvartk command line: compare-snv, compare-sv, count and plot
+
+Each subcommand imports only what it needs (no SigProfiler or matplotlib for
+comparisons) and writes one TSV line per pair/sample as soon as it finishes,
+so long manifests can be followed with tail -f or piped on.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+ONELINER_HEADER = ["name", "A", "B", "A-B", "B-A", "A&B", "A|B"]
+SNV_COLUMNS = "Chromosome,Start_Position,Reference_Allele,Tumor_Seq_Allele2"
+SV_COLUMNS = (
+    "chromosome_1,position_1,strand_1,chromosome_2,position_2,strand_2,type,length"
+)
+
+
+def read_pair_manifest(manifest, name_col="name", path1_col="path1", path2_col="path2"):
+    """Pairs to compare from a TSV with path1, path2 and optional name columns
+
+    returns: list of (name, path1, path2), paths made absolute; unnamed pairs
+    are named by their row number
+    """
+    import pandas as pd
+
+    pairs = pd.read_csv(manifest, sep="\t", dtype=str)
+    assert {path1_col, path2_col} <= set(pairs.columns), "manifest needs path1, path2"
+    if name_col in pairs.columns:
+        names = pairs[name_col].tolist()
+    else:
+        names = [str(ix) for ix in range(pairs.shape[0])]
+    assert len(set(names)) == len(names), "duplicate names in manifest"
+    return [
+        (name, os.path.abspath(path1), os.path.abspath(path2))
+        for name, path1, path2 in zip(names, pairs[path1_col], pairs[path2_col])
+    ]
+
+
+def make_file_config(kind, columns):
+    """SnvFileConfig/SvFileConfig from comma-separated source column names"""
+    from dvartk.parser import SnvFileConfig, SvFileConfig
+
+    columns = columns.split(",")
+    if kind == "sv":
+        assert len(columns) == 8, "SV columns: 8 comma-separated names"
+        return SvFileConfig(*columns)
+    assert len(columns) == 4, "SNV columns: chrom,pos,ref,alt source names"
+    return SnvFileConfig(*columns)
+
+
+def load_table(path, file_config, regions=None):
+    """Converted table of a MAF/TSV, or of a VCF restricted to regions"""
+    if path.endswith((".vcf", ".vcf.gz", ".vcf.bgz")):
+        return file_config.load_vcf(path, regions=regions)
+    return file_config.load_and_convert_maf_columns(path)
+
+
+def compare_pair(kind, name, path1, path2, options):
+    """make_oneliner fields of one comparison, led by its name"""
+    file_config = make_file_config(kind, options["columns"])
+    maf1 = load_table(path1, file_config, options["regions"])
+    maf2 = load_table(path2, file_config, options["regions"])
+    if kind == "sv":
+        from dvartk.parser import SvComparison
+
+        cmp = SvComparison(
+            maf1,
+            maf2,
+            window_size=options["window_size"],
+            one_to_one=options["one_to_one"],
+            regions=options["regions"],
+        )
+    else:
+        from dvartk.parser import SnvComparison
+
+        genome = None
+        if options["genome"] is not None:
+            from dvartk.batch import open_genome
+
+            genome = open_genome(options["genome"])
+        cmp = SnvComparison(
+            maf1,
+            maf2,
+            regions=options["regions"],
+            genome=genome,
+            strip_chr=options["strip_chr"],
+            window=options["window"],
+        )
+    return cmp.make_oneliner(name=name)
+
+
+def iter_finished(executor, func, tasks):
+    """(task, result or None, error or None) per task, in finishing order"""
+    futures = {executor.submit(func, *task): task for task in tasks}
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except Exception as error:
+            yield futures[future], None, error
+
+
+def write_row(out, fields):
+    out.write("\t".join(str(field) for field in fields) + "\n")
+    out.flush()
+
+
+def report_error(name, error):
+    print(f"Warning: {name} failed: {error}", file=sys.stderr)
+
+
+def absolute(path):
+    return None if path is None else os.path.abspath(path)
+
+
+def run_compare(args, out):
+    if args.manifest is not None:
+        pairs = read_pair_manifest(args.manifest)
+    else:
+        assert args.paths and len(args.paths) == 2, "give two paths or --manifest"
+        name = args.name or "pair"
+        pairs = [(name, *[os.path.abspath(path) for path in args.paths])]
+    options = {
+        "columns": args.columns or (SV_COLUMNS if args.kind == "sv" else SNV_COLUMNS),
+        "regions": absolute(args.regions),
+        "genome": absolute(getattr(args, "genome", None)),
+        "strip_chr": getattr(args, "strip_chr", False),
+        "window": getattr(args, "window", 0),
+        "window_size": getattr(args, "window_size", 200),
+        "one_to_one": getattr(args, "one_to_one", False),
+    }
+    write_row(out, ONELINER_HEADER)
+    n_failed = 0
+    tasks = [(args.kind, name, path1, path2, options) for name, path1, path2 in pairs]
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for task, fields, error in iter_finished(executor, compare_pair, tasks):
+            if error is not None:
+                report_error(task[1], error)
+                n_failed += 1
+            else:
+                write_row(out, fields)
+    return n_failed
+
+
+def channel_labels(kind):
+    from dvartk.channels import ID83_LABELS, SBS96_LABELS, SV_SCHEMA
+
+    return {"snv": SBS96_LABELS, "indel": ID83_LABELS, "sv": SV_SCHEMA.labels}[kind]
+
+
+def run_count(args, out):
+    import shutil
+    import tempfile
+    from dvartk.batch import genome_spec, init_worker, process_sample, read_manifest
+
+    if args.manifest is not None:
+        manifest = read_manifest(args.manifest)
+        samples = list(zip(manifest["sample"], manifest["path"]))
+    else:
+        assert args.paths, "give variant file paths or --manifest"
+        samples = [(os.path.basename(path), path) for path in args.paths]
+    kind = args.kind
+    assert kind == "sv" or args.genome is not None, f"counting {kind} needs --genome"
+    default_columns = SV_COLUMNS if kind == "sv" else SNV_COLUMNS
+    file_config = make_file_config(kind, args.columns or default_columns)
+    plot_dir = absolute(args.plot_dir)
+    if plot_dir is not None:
+        os.makedirs(plot_dir, exist_ok=True)
+
+    labels = channel_labels(kind)
+    write_row(out, ["sample"] + list(labels))
+    n_failed = 0
+    tasks = [
+        (sample, os.path.abspath(path), kind, file_config, plot_dir)
+        for sample, path in samples
+    ]
+    scratch_root = tempfile.mkdtemp(prefix="dvartk-cli-")
+    try:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=init_worker,
+            initargs=(genome_spec(args.genome), scratch_root),
+        ) as executor:
+            for task, result, error in iter_finished(executor, process_sample, tasks):
+                counts, timing = result if error is None else (None, {})
+                error = error or timing.get("error")
+                if error is not None:
+                    report_error(task[0], error)
+                    n_failed += 1
+                else:
+                    write_row(out, [task[0]] + counts.reindex(labels).tolist())
+    finally:
+        shutil.rmtree(scratch_root, ignore_errors=True)
+    return n_failed
+
+
+def plot_rows(counts, kind, out_dir, fmt):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from dvartk.plotter import save_spectra
+
+    return save_spectra(counts, kind, out_dir, fmt=fmt)
+
+
+def run_plot(args, out):
+    import pandas as pd
+
+    counts = pd.read_csv(args.counts, sep="\t", index_col=0)
+    counts.index = counts.index.astype(str)
+    out_dir = os.path.abspath(args.out_dir)
+    n_workers = max(1, min(args.workers or os.cpu_count(), counts.shape[0]))
+    if args.format == "multipdf":
+        n_workers = 1
+    chunks = [counts.iloc[ix::n_workers] for ix in range(n_workers)]
+    tasks = [(chunk, args.kind, out_dir, args.format) for chunk in chunks]
+    n_failed = 0
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for task, paths, error in iter_finished(executor, plot_rows, tasks):
+            if error is not None:
+                report_error(",".join(task[0].index), error)
+                n_failed += task[0].shape[0]
+                continue
+            for path in paths:
+                write_row(out, [path])
+    return n_failed
+
+
+def add_common_arguments(parser, default_columns):
+    parser.add_argument(
+        "--columns",
+        default=None,
+        help=f"comma-separated source column names [default: {default_columns}]",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="worker processes"
+    )
+    parser.add_argument("-o", "--output", default=None, help="TSV path [stdout]")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="dvartk", description="Compare, count and plot SNVs, indels and SVs"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for kind in ("snv", "sv"):
+        compare = subparsers.add_parser(
+            f"compare-{kind}",
+            help=f"compare {kind.upper()} call sets pairwise",
+            description="Print name, A, B, A-B, B-A, A&B, A|B per pair",
+        )
+        compare.set_defaults(run=run_compare, kind=kind)
+        compare.add_argument("paths", nargs="*", help="two MAF/TSV/VCF paths")
+        compare.add_argument(
+            "-m", "--manifest", help="TSV of pairs: path1, path2 and optional name"
+        )
+        compare.add_argument("--name", default=None, help="name of a single pair")
+        compare.add_argument("--regions", default=None, help="BED of regions to keep")
+        add_common_arguments(compare, SV_COLUMNS if kind == "sv" else SNV_COLUMNS)
+        if kind == "snv":
+            compare.add_argument(
+                "--genome", help="FASTA or .dvref to left-align indels against"
+            )
+            compare.add_argument(
+                "--strip-chr", action="store_true", help="ignore 'chr' prefixes"
+            )
+            compare.add_argument(
+                "--window", type=int, default=0, help="match alleles within N bp"
+            )
+        else:
+            compare.add_argument("--window-size", type=int, default=200)
+            compare.add_argument("--one-to-one", action="store_true")
+
+    count = subparsers.add_parser(
+        "count",
+        help="count SBS96/ID83/SV spectra per sample",
+        description="Print one row of channel counts per sample",
+    )
+    count.set_defaults(run=run_count)
+    count.add_argument("kind", choices=["snv", "indel", "sv"])
+    count.add_argument("paths", nargs="*", help="variant files, named by basename")
+    count.add_argument("-m", "--manifest", help="TSV of sample and path columns")
+    count.add_argument("--genome", help="FASTA or .dvref, required for snv/indel")
+    count.add_argument("--plot-dir", default=None, help="also save each spectrum")
+    add_common_arguments(count, f"{SNV_COLUMNS} or the SV schema names")
+
+    plot = subparsers.add_parser(
+        "plot",
+        help="render spectra from a samples x channels counts TSV",
+        description="Print the path of each written figure",
+    )
+    plot.set_defaults(run=run_plot)
+    plot.add_argument("kind", choices=["snv", "indel", "sv"])
+    plot.add_argument("counts", help="TSV as written by dvartk count")
+    plot.add_argument("-d", "--out-dir", default=".", help="figure directory")
+    plot.add_argument(
+        "-f", "--format", default="png", choices=["png", "svg", "pdf", "multipdf"]
+    )
+    plot.add_argument(
+        "-j", "--workers", type=int, default=None, help="worker processes"
+    )
+    plot.add_argument("-o", "--output", default=None, help="TSV path [stdout]")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.output is None:
+        n_failed = args.run(args, sys.stdout)
+    else:
+        with open(args.output, "w") as out:
+            n_failed = args.run(args, out)
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
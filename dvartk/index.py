@@ -0,0 +1,305 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from dvartk.matching import (
+    build_chrom_index,
+    count_match_sets,
+    encode_snv_keys,
+    hash_sv_rows,
+    isin_sorted,
+    query_reference_ends,
+    resolve_one_to_one,
+    sort_reference_ends,
+    sorted_unique,
+)
+
+INDEX_VERSION = 2
+INDEX_KINDS = ("snv", "sv")
+SV_TUPLE_COLUMNS = [
+    "chromosome_1",
+    "position_1",
+    "strand_1",
+    "chromosome_2",
+    "position_2",
+    "strand_2",
+    "type",
+]
+
+
+def load_truth(truth, config):
+    """Converted table of a truth set given as a DataFrame, MAF or VCF path"""
+    if isinstance(truth, pd.DataFrame):
+        return truth
+    if os.fspath(truth).endswith((".vcf", ".vcf.gz", ".vcf.bgz")):
+        return config.load_vcf(truth)
+    return config.load_and_convert_maf_columns(truth)
+
+
+def save_array(index_path, name, values):
+    np.save(os.path.join(index_path, f"{name}.npy"), np.ascontiguousarray(values))
+
+
+def encode_sv_groups(
+    chrom_index, strand_index, chromosomes_a, strands_a, chromosomes_b, strands_b
+):
+    """(chromosome_a, strand_a, chromosome_b, strand_b) codes over fixed labels
+
+    Labels missing from chrom_index/strand_index give -1, which no indexed
+    breakpoint has.
+    """
+    codes = [
+        index.get_indexer(np.asarray(values, dtype=object))
+        for index, values in (
+            (chrom_index, chromosomes_a),
+            (strand_index, strands_a),
+            (chrom_index, chromosomes_b),
+            (strand_index, strands_b),
+        )
+    ]
+    n_chroms, n_strands = len(chrom_index), len(strand_index)
+    groups = (
+        (codes[0].astype(np.int64) * n_strands + codes[1]) * n_chroms + codes[2]
+    ) * n_strands + codes[3]
+    return np.where(np.any([code < 0 for code in codes], axis=0), -1, groups)
+
+
+def build_variant_index(truth, index_path, kind="snv", config=None):
+    """Write a truth set as memory-mappable sorted arrays under index_path
+
+    truth: converted DataFrame, or a MAF/VCF path loaded with config
+    kind [str]: 'snv' stores the sorted distinct int64 keys of
+        dvartk.matching.encode_snv_keys and the first truth row of each key;
+        'sv' stores the breakpoint ends in both orientations sorted by
+        (chromosome/strand group, position), as match_breakpoints sorts them
+    Returns index_path, a directory with index.json and .npy arrays. The size
+    and mtime of a truth path are recorded for staleness checks.
+    """
+    assert kind in INDEX_KINDS, f"kind must be one of {INDEX_KINDS}"
+    source = None
+    if not isinstance(truth, pd.DataFrame):
+        stat = os.stat(truth)
+        source = {
+            "path": os.path.abspath(truth),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+    df = load_truth(truth, config).reset_index(drop=True)
+    os.makedirs(index_path, exist_ok=True)
+    meta = {"version": INDEX_VERSION, "kind": kind, "n_rows": df.shape[0]}
+    meta["source"] = source
+
+    if kind == "snv":
+        chrom_index = build_chrom_index(df["chrom"])
+        keys, rows = np.unique(encode_snv_keys(df, chrom_index), return_index=True)
+        meta["chroms"] = chrom_index.astype(str).tolist()
+        save_array(index_path, "keys", keys)
+        save_array(index_path, "rows", rows.astype(np.int64))
+    else:
+        df = df.dropna(subset=["position_1", "position_2"]).reset_index(drop=True)
+        chrom_index = build_chrom_index(df["chromosome_1"], df["chromosome_2"])
+        strand_index = build_chrom_index(df["strand_1"], df["strand_2"])
+        columns = {col: df[col].to_numpy(dtype=object) for col in SV_TUPLE_COLUMNS}
+        positions_1 = df["position_1"].to_numpy(dtype=np.int64)
+        positions_2 = df["position_2"].to_numpy(dtype=np.int64)
+        direct = encode_sv_groups(
+            chrom_index,
+            strand_index,
+            columns["chromosome_1"],
+            columns["strand_1"],
+            columns["chromosome_2"],
+            columns["strand_2"],
+        )
+        crossed = encode_sv_groups(
+            chrom_index,
+            strand_index,
+            columns["chromosome_2"],
+            columns["strand_2"],
+            columns["chromosome_1"],
+            columns["strand_1"],
+        )
+        sorted_keys, sorted_ix, sorted_pos_b = sort_reference_ends(
+            np.concatenate([direct, crossed]),
+            np.concatenate([positions_1, positions_2]),
+            np.concatenate([positions_2, positions_1]),
+        )
+        # SvComparison counts distinct (chromosome_1, ..., type) tuples
+        tuple_keys = hash_sv_rows(df, SV_TUPLE_COLUMNS)
+        meta["chroms"] = chrom_index.astype(str).tolist()
+        meta["strands"] = strand_index.astype(str).tolist()
+        meta["n_rows"] = df.shape[0]
+        save_array(index_path, "keys", sorted_keys)
+        save_array(index_path, "rows", sorted_ix % max(df.shape[0], 1))
+        save_array(index_path, "positions_b", sorted_pos_b)
+        save_array(index_path, "tuple_keys", tuple_keys)
+
+    with open(os.path.join(index_path, "index.json"), "w") as index_file:
+        json.dump(meta, index_file)
+    return index_path
+
+
+class VariantIndex:
+    """Truth set index built by build_variant_index
+
+    The arrays are opened read-only with mmap, so repeated comparisons
+    neither parse the truth set nor re-hash it. If source_path is given, an
+    index whose recorded size/mtime do not match it is refused with ValueError.
+    """
+
+    def __init__(self, index_path, source_path=None):
+        self.index_path = index_path
+        with open(os.path.join(index_path, "index.json")) as index_file:
+            self.meta = json.load(index_file)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported variant index version in {index_path}")
+        if source_path is not None and self.is_stale(source_path):
+            raise ValueError(
+                f"Stale variant index {index_path}: {source_path} changed; "
+                "rebuild it with build_variant_index"
+            )
+        self.kind = self.meta["kind"]
+        self.n_rows = self.meta["n_rows"]
+        self.chrom_index = pd.Index(self.meta["chroms"], dtype=object)
+        self.keys = self.load_array("keys")
+        self.rows = self.load_array("rows")
+        if self.kind == "snv":
+            self.n_unique = self.keys.shape[0]
+        else:
+            self.strand_index = pd.Index(self.meta["strands"], dtype=object)
+            self.positions_b = self.load_array("positions_b")
+            self.tuple_keys = self.load_array("tuple_keys")
+            self.n_unique = sorted_unique(np.asarray(self.tuple_keys)).shape[0]
+
+    def __reduce__(self):
+        return (VariantIndex, (self.index_path,))
+
+    def load_array(self, name):
+        return np.load(os.path.join(self.index_path, f"{name}.npy"), mmap_mode="r")
+
+    def is_stale(self, source_path):
+        source = self.meta.get("source")
+        if source is None:
+            return False
+        stat = os.stat(source_path)
+        return (stat.st_size, stat.st_mtime_ns) != (source["size"], source["mtime_ns"])
+
+    def encode_keys(self, calls):
+        """encode_snv_keys of calls with this index's chromosome codes"""
+        chroms = calls["chrom"].to_numpy(dtype=object)
+        chrom_index = self.chrom_index.append(
+            build_chrom_index(chroms).difference(self.chrom_index)
+        )
+        return encode_snv_keys(calls, chrom_index)
+
+    def truth_rows(self, calls):
+        """First truth row of each SNV call, -1 where the truth set lacks it"""
+        assert self.kind == "snv", "truth_rows needs an SNV index"
+        keys = self.encode_keys(calls)
+        found = isin_sorted(keys, self.keys)
+        rows = np.full(keys.shape[0], -1, dtype=np.int64)
+        rows[found] = self.rows[np.searchsorted(self.keys, keys[found])]
+        return rows
+
+    def match_breakpoints(self, calls, window_size=200, one_to_one=False):
+        """match_breakpoints of SV calls (target) against the truth (reference)
+
+        returns: DataFrame with target_id (calls row) and reference_id (truth
+        row) columns
+        """
+        assert self.kind == "sv", "match_breakpoints needs an SV index"
+        calls = calls.dropna(subset=["position_1", "position_2"])
+        groups = encode_sv_groups(
+            self.chrom_index,
+            self.strand_index,
+            calls["chromosome_1"],
+            calls["strand_1"],
+            calls["chromosome_2"],
+            calls["strand_2"],
+        )
+        tgt_ix, ref_ix, distance = query_reference_ends(
+            self.keys,
+            self.rows,
+            self.positions_b,
+            groups,
+            calls["position_1"].to_numpy(dtype=np.int64),
+            calls["position_2"].to_numpy(dtype=np.int64),
+            window_size,
+        )
+        pairs = pd.DataFrame({"tgt": tgt_ix, "ref": ref_ix, "distance": distance})
+        pairs = pairs.sort_values("distance").drop_duplicates(["tgt", "ref"])
+        pairs = pairs.sort_values(["tgt", "ref"])
+        if one_to_one and not pairs.empty:
+            # break ties as SvComparison(calls, truth) does, with the truth
+            # as its target
+            keep = resolve_one_to_one(
+                pairs["ref"].to_numpy(),
+                pairs["tgt"].to_numpy(),
+                pairs["distance"].to_numpy(),
+            )
+            pairs = pairs.iloc[keep]
+        return pd.DataFrame(
+            {
+                "target_id": calls.index.to_numpy()[pairs["tgt"].to_numpy()],
+                "reference_id": pairs["ref"].to_numpy(),
+            }
+        )
+
+
+class IndexComparison:
+    """Compare a call table (A) against an indexed truth set (B)
+
+    Counts are those of SnvComparison(calls, truth) / SvComparison(calls,
+    truth) without loading the truth table; maf1_match and maf1_nonmatch
+    hold the calls found / not found in the truth set.
+    """
+
+    def __init__(self, calls, index, delimitor="\t", window_size=200, one_to_one=False):
+        if not isinstance(index, VariantIndex):
+            index = VariantIndex(index)
+        self.index = index
+        self.delimitor = delimitor
+        self.maf1 = calls.reset_index(drop=True)
+
+        if index.kind == "snv":
+            keys = index.encode_keys(self.maf1)
+            match1 = isin_sorted(keys, index.keys)
+            n_calls = np.unique(keys).shape[0]
+            n_both = np.unique(keys[match1]).shape[0]
+            n_truth_only = index.n_unique - n_both
+            self.counts = [
+                n_calls,
+                n_both + n_truth_only,
+                n_calls - n_both,
+                n_truth_only,
+                n_both,
+                n_calls + n_truth_only,
+            ]
+        else:
+            sv_match = index.match_breakpoints(
+                self.maf1, window_size=window_size, one_to_one=one_to_one
+            )
+            match1 = self.maf1.index.isin(sv_match["target_id"])
+            truth_match = np.zeros(index.n_rows, dtype=bool)
+            truth_match[sv_match["reference_id"].to_numpy()] = True
+            # with one_to_one a tuple can be both matched and unmatched, so
+            # count the tuple sets of the match result as SvComparison does
+            self.counts = count_match_sets(
+                hash_sv_rows(self.maf1, SV_TUPLE_COLUMNS),
+                np.asarray(index.tuple_keys),
+                match1,
+                truth_match,
+            )
+
+        self.maf1_match = self.maf1[match1]
+        self.maf1_nonmatch = self.maf1[~match1]
+
+    def make_oneliner(self, name=None, get_str=False):
+        """Returns #A, #B, #(A-B), #(B-A), #(A&B), #(A|B)"""
+        field = list(self.counts)
+        if name:
+            field = [name] + field
+        field = [str(_) for _ in field]
+        if get_str:
+            return self.delimitor.join(field)
+        return field
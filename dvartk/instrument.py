@@ -0,0 +1,264 @@
+import contextlib
+import functools
+import json
+import threading
+import time
+import tracemalloc
+import pandas as pd
+
+
+class Span:
+    """One timed call: name, wall seconds, rows processed and peak memory
+
+    rows can be set inside a span() block; peak_mb is the peak traced memory
+    above the memory in use when the span started (None without tracing).
+    """
+
+    __slots__ = ("name", "parent", "depth", "start", "seconds", "rows", "peak_mb")
+    __slots__ += ("start_bytes", "peak_bytes", "start_peak")
+
+    def __init__(self, name, parent=None, depth=0, rows=None):
+        self.name = name
+        self.parent = parent
+        self.depth = depth
+        self.rows = rows
+        self.start = None
+        self.seconds = None
+        self.peak_mb = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "start": self.start,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "peak_mb": self.peak_mb,
+        }
+
+
+class NullSpan:
+    """Stand-in yielded by span() when instrumentation is off"""
+
+    rows = None
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Report:
+    """Spans collected by one instrument() block, in finishing order"""
+
+    def __init__(self):
+        self.spans = []
+
+    def to_records(self):
+        return [span.to_dict() for span in self.spans]
+
+    def to_frame(self):
+        return pd.DataFrame(
+            self.to_records(),
+            columns=["name", "parent", "depth", "start", "seconds", "rows", "peak_mb"],
+        )
+
+    def summary(self):
+        """calls, total seconds, total rows and max peak_mb per span name"""
+        return (
+            self.to_frame()
+            .groupby("name", sort=False)
+            .agg(
+                calls=("seconds", "size"),
+                seconds=("seconds", "sum"),
+                rows=("rows", "sum"),
+                peak_mb=("peak_mb", "max"),
+            )
+        )
+
+    def to_json(self, path=None):
+        """JSON list of span records; written to path if given"""
+        text = json.dumps(self.to_records(), indent=1)
+        if path is not None:
+            with open(path, "w") as json_file:
+                json_file.write(text)
+        return text
+
+
+class Recorder:
+    """Module state: the active report/callback and the open spans per thread
+
+    Each thread keeps its own stack of open spans, so spans opened in worker
+    threads start at depth 0; finished spans are reported under lock.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.report = None
+        self.callback = None
+        self.trace_memory = False
+        self.reset_peaks = False
+        self.origin = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @property
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+
+STATE = Recorder()
+
+
+def span_peak(opened, current, peak):
+    """Peak bytes of opened so far, from tracemalloc.get_traced_memory()
+
+    Without peak resets (tracing started by the caller) a peak no higher than
+    the one when the span opened may predate it, so the memory in use is
+    taken instead and peak_mb is a lower bound.
+    """
+    if STATE.reset_peaks or peak > opened.start_peak:
+        return max(opened.peak_bytes, peak)
+    return max(opened.peak_bytes, current)
+
+
+def open_span(name, rows=None):
+    stack = STATE.stack
+    parent = stack[-1] if stack else None
+    opened = Span(name, parent.name if parent else None, len(stack), rows)
+    if STATE.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        # fold the peak so far into the enclosing spans before resetting it
+        for outer in stack:
+            outer.peak_bytes = span_peak(outer, current, peak)
+        if STATE.reset_peaks:
+            tracemalloc.reset_peak()
+        opened.start_bytes = opened.peak_bytes = current
+        opened.start_peak = peak
+    stack.append(opened)
+    opened.start = time.perf_counter() - STATE.origin
+    return opened
+
+
+def close_span(opened):
+    opened.seconds = time.perf_counter() - STATE.origin - opened.start
+    stack = STATE.stack
+    stack.pop()
+    if STATE.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        opened.peak_bytes = span_peak(opened, current, peak)
+        for outer in stack:
+            outer.peak_bytes = max(outer.peak_bytes, opened.peak_bytes)
+        opened.peak_mb = (opened.peak_bytes - opened.start_bytes) / 2**20
+    with STATE.lock:
+        STATE.report.spans.append(opened)
+        if STATE.callback is not None:
+            STATE.callback(opened.to_dict())
+
+
+@contextlib.contextmanager
+def span(name, rows=None):
+    """Time the enclosed block as a named span
+
+    Does nothing (and yields a stand-in) unless inside instrument(); set
+    .rows on the yielded span to record how many rows the block processed.
+    """
+    if not STATE.active:
+        yield NULL_SPAN
+        return
+    opened = open_span(name, rows)
+    try:
+        yield opened
+    finally:
+        close_span(opened)
+
+
+def count_rows(args, kwargs, result):
+    """Rows of the DataFrame arguments, or of the result if there are none"""
+    frames = [
+        value
+        for value in list(args) + list(kwargs.values())
+        if isinstance(value, (pd.DataFrame, pd.Series))
+    ]
+    if frames:
+        return int(sum(frame.shape[0] for frame in frames))
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return int(result.shape[0])
+    return None
+
+
+def instrumented(func=None, name=None):
+    """Decorator recording each call of func as a span
+
+    The span is named '<module>.<qualname>' (without the 'dvartk.' prefix)
+    unless name is given, and its rows are those of the DataFrame arguments,
+    or of a DataFrame result. Outside instrument() the call goes straight to
+    func after a single flag check.
+    """
+    if func is None:
+        return functools.partial(instrumented, name=name)
+    if name is None:
+        module = func.__module__.split("dvartk.", 1)[-1]
+        name = f"{module}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not STATE.active:
+            return func(*args, **kwargs)
+        opened = open_span(name)
+        try:
+            result = func(*args, **kwargs)
+            opened.rows = count_rows(args, kwargs, result)
+            return result
+        finally:
+            close_span(opened)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def instrument(callback=None, trace_memory=True, json_path=None):
+    """Collect spans of instrumented dvartk calls made inside this block
+
+    callback: called with each finished span as a dict (name, parent,
+        depth, start, seconds, rows, peak_mb), e.g. to forward to a logger
+    trace_memory [bool]: record peak allocations with tracemalloc; started
+        here if not already tracing, and stopped again on exit. The traced
+        peak is reset per span only if tracing was started here, so a
+        caller's tracemalloc session keeps its peak (peak_mb is then a lower
+        bound); with worker threads, spans share one process-wide peak
+    json_path [str]: write the report there on exit
+    yields: Report
+
+        with instrument(json_path="spans.json") as report:
+            cmp = SvComparison(maf1, maf2)
+        report.summary()
+
+    Spans are recorded in the calling process only and blocks do not nest.
+    """
+    if STATE.active:
+        raise RuntimeError("instrument() blocks cannot be nested")
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    report = Report()
+    STATE.report, STATE.callback = report, callback
+    STATE.trace_memory = trace_memory
+    STATE.reset_peaks = started_tracing
+    STATE.local = threading.local()
+    STATE.origin = time.perf_counter()
+    STATE.active = True
+    try:
+        yield report
+    finally:
+        STATE.active = False
+        STATE.report = STATE.callback = None
+        STATE.local = threading.local()
+        if started_tracing:
+            tracemalloc.stop()
+        if json_path is not None:
+            report.to_json(json_path)
@@ -0,0 +1,381 @@
+import numpy as np
+import pandas as pd
+
+from dvartk.instrument import instrumented
+
+
+def encode_breakpoint_groups(chromosomes_a, strands_a, chromosomes_b, strands_b):
+    """Integer code per (chromosome_a, strand_a, chromosome_b, strand_b) tuple
+
+    Inputs are lists of equally long arrays that are coded jointly, so equal
+    tuples get equal codes across all of them.
+    """
+    sizes = [len(values) for values in chromosomes_a]
+    chrom_codes, chroms = pd.factorize(
+        np.concatenate(
+            [np.asarray(v, dtype=object) for v in chromosomes_a + chromosomes_b]
+        ),
+        use_na_sentinel=False,
+    )
+    strand_codes, strands = pd.factorize(
+        np.concatenate([np.asarray(v, dtype=object) for v in strands_a + strands_b]),
+        use_na_sentinel=False,
+    )
+    n_chroms, n_strands = max(len(chroms), 1), max(len(strands), 1)
+    total = sum(sizes)
+    codes = (
+        (chrom_codes[:total] * n_strands + strand_codes[:total]) * n_chroms
+        + chrom_codes[total:]
+    ) * n_strands + strand_codes[total:]
+    return np.split(codes.astype(np.int64), np.cumsum(sizes)[:-1])
+
+
+BREAKPOINT_GROUP_SHIFT = 32
+
+
+def breakpoint_keys(groups, positions):
+    """int64 (group, position) sort keys; positions must be below 2**31"""
+    return (np.asarray(groups, dtype=np.int64) << BREAKPOINT_GROUP_SHIFT) + positions
+
+
+def sort_reference_ends(ref_groups, ref_pos_a, ref_pos_b):
+    """(sorted keys, reference index, position_b) of ends sorted by (group, position_a)"""
+    ref_keys = breakpoint_keys(ref_groups, ref_pos_a)
+    order = np.argsort(ref_keys, kind="stable")
+    return ref_keys[order], order, np.asarray(ref_pos_b)[order]
+
+
+def query_reference_ends(
+    sorted_keys, sorted_ix, sorted_pos_b, tgt_groups, tgt_pos_a, tgt_pos_b, window_size
+):
+    """Candidate pairs of targets against ends sorted by sort_reference_ends
+
+    Each target end takes an O(log n) searchsorted range on position_a and
+    the candidates in that range are filtered on position_b. Returns target
+    indices, reference indices and the summed end distances.
+    """
+    tgt_keys = breakpoint_keys(tgt_groups, tgt_pos_a)
+    lo = np.searchsorted(sorted_keys, tgt_keys - window_size, side="left")
+    hi = np.searchsorted(sorted_keys, tgt_keys + window_size, side="right")
+    n_candidates = hi - lo
+    tgt_ix = np.repeat(np.arange(len(tgt_keys)), n_candidates)
+    starts = np.repeat(lo - np.cumsum(n_candidates) + n_candidates, n_candidates)
+    candidates = starts + np.arange(len(tgt_ix))
+
+    distance_b = np.abs(sorted_pos_b[candidates] - tgt_pos_b[tgt_ix])
+    close = distance_b <= window_size
+    tgt_ix, candidates = tgt_ix[close], candidates[close]
+    ref_pos_a = sorted_keys[candidates] - (tgt_keys[tgt_ix] - tgt_pos_a[tgt_ix])
+    distance = np.abs(ref_pos_a - tgt_pos_a[tgt_ix]) + distance_b[close]
+    return tgt_ix, np.asarray(sorted_ix[candidates]), distance
+
+
+def find_breakpoint_pairs(
+    ref_groups, ref_pos_a, ref_pos_b, tgt_groups, tgt_pos_a, tgt_pos_b, window_size
+):
+    """Candidate (target, reference) index pairs with both ends within window_size
+
+    Reference ends are sorted by (group, position_a) once; each target end
+    then takes an O(log n) searchsorted range on position_a and the candidates
+    in that range are filtered on position_b. Returns target indices,
+    reference indices and the summed end distances.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if len(ref_groups) == 0 or len(tgt_groups) == 0:
+        return empty, empty, empty
+    return query_reference_ends(
+        *sort_reference_ends(ref_groups, ref_pos_a, ref_pos_b),
+        tgt_groups,
+        tgt_pos_a,
+        tgt_pos_b,
+        window_size,
+    )
+
+
+def resolve_one_to_one(tgt_ix, ref_ix, distance):
+    """Greedily keep the closest pairs so that each index is used at most once"""
+    order = np.lexsort((ref_ix, tgt_ix, distance))
+    used_tgt, used_ref, keep = set(), set(), []
+    for ix in order:
+        tgt, ref = tgt_ix[ix], ref_ix[ix]
+        if tgt in used_tgt or ref in used_ref:
+            continue
+        used_tgt.add(tgt)
+        used_ref.add(ref)
+        keep.append(ix)
+    return np.array(sorted(keep), dtype=np.int64)
+
+
+@instrumented
+def match_breakpoints(
+    reference_breakpoints,
+    target_breakpoints,
+    id_col="prediction_id",
+    window_size=200,
+    one_to_one=False,
+):
+    """Match target breakpoints to reference breakpoints within window_size
+
+    Both ends must lie on the same chromosome and strand within window_size
+    bp, in either orientation (reference end 1 to target end 1 and 2 to 2, or
+    crossed), as in wgs_analysis.algorithms.rearrangement.match_breakpoints.
+    Runs in O(n log n + matches) with sorted NumPy arrays. If one_to_one,
+    each reference and target breakpoint is kept in at most one pair,
+    preferring the smallest summed end distance.
+    returns: DataFrame with target_id and reference_id columns
+    """
+    columns = {}
+    for name, df in (("ref", reference_breakpoints), ("tgt", target_breakpoints)):
+        df = df.dropna(subset=["position_1", "position_2"])
+        columns[name] = {
+            "id": df[id_col].to_numpy(),
+            "chromosome_1": df["chromosome_1"].to_numpy(dtype=object),
+            "strand_1": df["strand_1"].to_numpy(dtype=object),
+            "position_1": df["position_1"].to_numpy(dtype=np.int64),
+            "chromosome_2": df["chromosome_2"].to_numpy(dtype=object),
+            "strand_2": df["strand_2"].to_numpy(dtype=object),
+            "position_2": df["position_2"].to_numpy(dtype=np.int64),
+        }
+    ref, tgt = columns["ref"], columns["tgt"]
+
+    # reference ends in both orientations, target ends as given
+    ref_direct, ref_crossed, tgt_groups = encode_breakpoint_groups(
+        [ref["chromosome_1"], ref["chromosome_2"], tgt["chromosome_1"]],
+        [ref["strand_1"], ref["strand_2"], tgt["strand_1"]],
+        [ref["chromosome_2"], ref["chromosome_1"], tgt["chromosome_2"]],
+        [ref["strand_2"], ref["strand_1"], tgt["strand_2"]],
+    )
+    n_ref = len(ref["id"])
+    tgt_ix, ref_ix, distance = find_breakpoint_pairs(
+        np.concatenate([ref_direct, ref_crossed]),
+        np.concatenate([ref["position_1"], ref["position_2"]]),
+        np.concatenate([ref["position_2"], ref["position_1"]]),
+        tgt_groups,
+        tgt["position_1"],
+        tgt["position_2"],
+        window_size,
+    )
+    ref_ix = ref_ix % max(n_ref, 1)
+
+    pairs = pd.DataFrame({"tgt": tgt_ix, "ref": ref_ix, "distance": distance})
+    pairs = pairs.sort_values("distance").drop_duplicates(["tgt", "ref"])
+    pairs = pairs.sort_values(["tgt", "ref"])
+    if one_to_one and not pairs.empty:
+        keep = resolve_one_to_one(
+            pairs["tgt"].to_numpy(),
+            pairs["ref"].to_numpy(),
+            pairs["distance"].to_numpy(),
+        )
+        pairs = pairs.iloc[keep]
+    return pd.DataFrame(
+        {
+            "target_id": tgt["id"][pairs["tgt"].to_numpy()],
+            "reference_id": ref["id"][pairs["ref"].to_numpy()],
+        }
+    )
+
+
+SNV_KEY_CHROM_BITS = 12
+SNV_KEY_POS_BITS = 30
+SNV_KEY_ALLELE_BITS = 21
+
+
+def build_chrom_index(*chroms):
+    """pd.Index of the chromosome labels seen in any of the given arrays"""
+    labels = [np.asarray(values, dtype=object) for values in chroms]
+    return pd.Index(pd.unique(np.concatenate(labels)) if labels else [])
+
+
+def encode_alleles_key(refs, alts):
+    """21-bit allele code: ref * 4 + alt for single-base ACGT alleles, else a hash
+
+    Multi-base or non-ACGT alleles hash 'ref>alt' into the codes above 15, so
+    they may collide with probability ~2**-21 at the same chromosome position.
+    Alleles are factorized first, so string work is per distinct allele only.
+    """
+    ref_codes, ref_uniques = pd.factorize(np.asarray(refs, dtype=object))
+    alt_codes, alt_uniques = pd.factorize(np.asarray(alts, dtype=object))
+    pair_codes = ref_codes.astype(np.int64) * len(alt_uniques) + alt_codes
+    pairs, pair_inverse = np.unique(pair_codes, return_inverse=True)
+    pair_refs = pd.Index(ref_uniques).astype(str).str.upper()[pairs // len(alt_uniques)]
+    pair_alts = pd.Index(alt_uniques).astype(str).str.upper()[pairs % len(alt_uniques)]
+
+    bases = {"A": 0, "C": 1, "G": 2, "T": 3}
+    pair_ref_bases = pair_refs.map(bases).to_numpy(dtype=float)
+    pair_alt_bases = pair_alts.map(bases).to_numpy(dtype=float)
+    simple = ~(np.isnan(pair_ref_bases) | np.isnan(pair_alt_bases))
+    pair_keys = np.zeros(len(pairs), dtype=np.int64)
+    pair_keys[simple] = (pair_ref_bases * 4 + pair_alt_bases)[simple].astype(np.int64)
+    if not simple.all():
+        alleles = (pair_refs + ">" + pair_alts)[~simple].to_numpy(dtype=object)
+        hashed = pd.util.hash_array(alleles) % np.uint64(
+            (1 << SNV_KEY_ALLELE_BITS) - 16
+        )
+        pair_keys[~simple] = hashed.astype(np.int64) + 16
+    return pair_keys[pair_inverse.ravel()]
+
+
+def encode_snv_keys(df, chrom_index):
+    """One int64 key per (chrom, pos, ref, alt) row of df
+
+    Bits from high to low: chromosome code (position in chrom_index, 12
+    bits), position (30 bits) and allele code (21 bits, see encode_alleles_key).
+    """
+    chrom_codes = chrom_index.get_indexer(df["chrom"].to_numpy(dtype=object))
+    if (chrom_codes < 0).any():
+        raise ValueError("chromosome missing from chrom_index")
+    if len(chrom_index) >= 1 << SNV_KEY_CHROM_BITS:
+        raise ValueError(f"more than {1 << SNV_KEY_CHROM_BITS} chromosomes")
+    positions = df["pos"].to_numpy(dtype=np.int64)
+    if len(positions) and (
+        positions.min() < 0 or positions.max() >= 1 << SNV_KEY_POS_BITS
+    ):
+        raise ValueError(f"positions must be within [0, 2**{SNV_KEY_POS_BITS})")
+    alleles = encode_alleles_key(df["ref"], df["alt"])
+    return (
+        (chrom_codes.astype(np.int64) << (SNV_KEY_POS_BITS + SNV_KEY_ALLELE_BITS))
+        | (positions << SNV_KEY_ALLELE_BITS)
+        | alleles
+    )
+
+
+def sorted_unique(keys):
+    """Sorted distinct values of an int64 key array"""
+    keys = np.sort(keys)
+    if keys.shape[0] == 0:
+        return keys
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+
+
+def isin_sorted(keys, sorted_keys):
+    """np.isin for a sorted, distinct sorted_keys array via searchsorted
+
+    Queries are sorted first so the binary searches walk memory in order.
+    """
+    found = np.zeros(keys.shape[0], dtype=bool)
+    if sorted_keys.shape[0] == 0:
+        return found
+    order = np.argsort(keys)
+    ixs = np.searchsorted(sorted_keys, keys[order])
+    ixs[ixs == sorted_keys.shape[0]] = 0
+    found[order] = sorted_keys[ixs] == keys[order]
+    return found
+
+
+def count_key_sets(keys1, keys2):
+    """#A, #B, #(A-B), #(B-A), #(A&B), #(A|B) of two key arrays as sets"""
+    unique1, unique2 = sorted_unique(keys1), sorted_unique(keys2)
+    n_both = np.intersect1d(unique1, unique2, assume_unique=True).shape[0]
+    n1, n2 = unique1.shape[0], unique2.shape[0]
+    return [n1, n2, n1 - n_both, n2 - n_both, n_both, n1 + n2 - n_both]
+
+
+def allele_major_keys(keys):
+    """Reorder encode_snv_keys bits to chromosome, allele code, position
+
+    Keys of one chromosome and allele then sort by position, so a position
+    window is a contiguous key range.
+    """
+    pos_mask = (1 << SNV_KEY_POS_BITS) - 1
+    allele_mask = (1 << SNV_KEY_ALLELE_BITS) - 1
+    chrom_codes = keys >> (SNV_KEY_POS_BITS + SNV_KEY_ALLELE_BITS)
+    positions = (keys >> SNV_KEY_ALLELE_BITS) & pos_mask
+    alleles = keys & allele_mask
+    return (
+        (chrom_codes << (SNV_KEY_POS_BITS + SNV_KEY_ALLELE_BITS))
+        | (alleles << SNV_KEY_POS_BITS)
+        | positions
+    )
+
+
+def isin_window(keys, sorted_keys, window):
+    """Mask of keys with a sorted_keys entry of equal chromosome and alleles
+    within +-window bp; both are allele_major_keys, sorted_keys sorted
+    """
+    pos_mask = (1 << SNV_KEY_POS_BITS) - 1
+    positions = keys & pos_mask
+    lo = np.searchsorted(sorted_keys, keys - np.minimum(window, positions))
+    hi = np.searchsorted(
+        sorted_keys, keys + np.minimum(window, pos_mask - positions), side="right"
+    )
+    return hi > lo
+
+
+def match_snv_keys(keys1, keys2, window=0):
+    """(match1, match2) masks of encode_snv_keys arrays against each other
+
+    Keys match if equal or, with window, of equal chromosome and alleles
+    within +-window bp.
+    """
+    if window:
+        window_keys1 = allele_major_keys(keys1)
+        window_keys2 = allele_major_keys(keys2)
+        match1 = isin_window(window_keys1, np.sort(window_keys2), window)
+        match2 = isin_window(window_keys2, np.sort(window_keys1), window)
+    else:
+        match1 = isin_sorted(keys1, sorted_unique(keys2))
+        match2 = isin_sorted(keys2, sorted_unique(keys1))
+    return match1, match2
+
+
+def count_matched_keys(keys1, keys2, match1, match2):
+    """#A, #B, #(A-B), #(B-A), #(A&B), #(A|B) from per-key match masks
+
+    A&B holds the distinct keys1 that matched, B-A the distinct keys2 that
+    did not, as in SnvComparison's tuple sets.
+    """
+    n1 = sorted_unique(keys1).shape[0]
+    n_both = sorted_unique(keys1[match1]).shape[0]
+    n2_only = sorted_unique(keys2[~match2]).shape[0]
+    return [n1, n_both + n2_only, n1 - n_both, n2_only, n_both, n1 + n2_only]
+
+
+def count_match_sets(keys1, keys2, match1, match2):
+    """#A, #B, #(A-B), #(B-A), #(A&B), #(A|B) of row keys split by match masks
+
+    As the tuple sets of SvComparison: A&B holds the distinct matched keys1,
+    A-B the unmatched keys1 and B-A the unmatched keys2, so with one-to-one
+    matching a key can be in more than one of them.
+    """
+    both = sorted_unique(keys1[match1])
+    only1 = sorted_unique(keys1[~match1])
+    only2 = sorted_unique(keys2[~match2])
+    # union sizes by inclusion-exclusion over sorted searches
+    both_in1 = both[isin_sorted(both, only1)]
+    n_both1 = both_in1.shape[0]
+    n_both2 = int(isin_sorted(both, only2).sum())
+    n_12 = int(isin_sorted(only1, only2).sum())
+    n_all = int(isin_sorted(both_in1, only2).sum())
+    n_a, n_b = len(both) + len(only1) - n_both1, len(both) + len(only2) - n_both2
+    n_union = len(both) + len(only1) + len(only2) - n_both1 - n_both2 - n_12 + n_all
+    return [n_a, n_b, len(only1), len(only2), len(both), n_union]
+
+
+def hash_sv_rows(svs, columns):
+    """uint64 hash per row of the given SV columns
+
+    Positions are hashed as floats and other columns as strings, so that
+    rows equal as tuples (e.g. 5 and 5.0) hash equally.
+    """
+    values = {
+        col: (
+            svs[col].to_numpy(dtype=float)
+            if col.startswith("position")
+            else svs[col].astype(str).to_numpy(dtype=object)
+        )
+        for col in columns
+    }
+    return pd.util.hash_pandas_object(pd.DataFrame(values), index=False).to_numpy()
+
+
+def split_groups(groups, wanted=None):
+    """{group: row indices} of an int64 group code per row, for wanted groups"""
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    if wanted is None:
+        wanted = sorted_unique(groups)
+    starts = np.searchsorted(sorted_groups, wanted, side="left")
+    ends = np.searchsorted(sorted_groups, wanted, side="right")
+    return {
+        int(group): order[start:end] for group, start, end in zip(wanted, starts, ends)
+    }
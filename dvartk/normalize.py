@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+from dvartk.reference import CODE_BASES, encode_bases
+
+
+def strip_chr_prefix(chroms):
+    """Chromosome names without a leading 'chr' (any case), as object array"""
+    chroms = pd.Series(np.asarray(chroms, dtype=object), copy=False).astype(str)
+    return chroms.str.replace("^chr", "", case=False, regex=True).to_numpy(dtype=object)
+
+
+def decode_rows(codes):
+    """One upper case str per row of a 2-D base code array"""
+    width = codes.shape[1]
+    return CODE_BASES[codes].view(f"S{width}").ravel().astype(str).astype(object)
+
+
+def trim_alleles(positions, refs, alts):
+    """Drop shared trailing, then shared leading bases, keeping one base each
+
+    Trailing bases are trimmed first, as in vt normalize, so a repeat indel
+    keeps its anchor base. refs/alts are str Series; returns new
+    (positions, refs, alts).
+    """
+    positions = positions.copy()
+    refs = refs.reset_index(drop=True)
+    alts = alts.reset_index(drop=True)
+    for suffix in (True, False):
+        while True:
+            ix = -1 if suffix else 0
+            trim = (
+                (refs.str.len() > 1)
+                & (alts.str.len() > 1)
+                & (refs.str[ix] == alts.str[ix])
+            ).to_numpy()
+            if not trim.any():
+                break
+            if suffix:
+                refs[trim] = refs[trim].str[:-1]
+                alts[trim] = alts[trim].str[:-1]
+            else:
+                refs[trim] = refs[trim].str[1:]
+                alts[trim] = alts[trim].str[1:]
+                positions[trim] += 1
+    return positions, refs, alts
+
+
+def shift_left(seq, starts, lengths, last_codes):
+    """Left-shift events while the base before them equals their last base
+
+    seq: base codes of the chromosome from position 0
+    starts: 0-based first base after the anchor of each event
+    lengths: length of each inserted/deleted sequence
+    last_codes: function of (rows, shifts) giving the current last base codes
+    returns: number of bases each event moved
+    """
+    shifts = np.zeros(starts.shape[0], dtype=np.int64)
+    active = np.flatnonzero(starts >= 2)
+    while active.shape[0]:
+        positions = starts[active] - shifts[active]
+        before = seq[np.clip(positions - 1, 0, max(seq.shape[0] - 1, 0))]
+        movable = (
+            (positions >= 2)
+            & (positions - 1 < seq.shape[0])
+            & (before != 4)
+            & (before == last_codes(active, shifts[active]))
+        )
+        active = active[movable]
+        shifts[active] += 1
+    return shifts
+
+
+def left_align_indels(df, genome):
+    """Left-align and trim the indels of a VCF-style chrom/pos/ref/alt table
+
+    Shared leading/trailing bases are trimmed, then each simple insertion or
+    deletion (one allele is the anchor base the other starts with) is moved
+    left for as long as the reference allows; the genome is read once per
+    chromosome and all events of a chromosome move together. SNVs, MNVs and
+    complex alleles are kept as they are.
+    genome: pyfaidx.Fasta or dvartk.reference.ReferenceCache
+    returns: copy of df with updated pos, ref and alt
+    """
+    from dvartk.process import fetch_codes
+
+    df = df.copy()
+    positions = df["pos"].to_numpy(dtype=np.int64, copy=True)
+    refs = df["ref"].astype(str).str.upper().reset_index(drop=True)
+    alts = df["alt"].astype(str).str.upper().reset_index(drop=True)
+    ref_lengths = refs.str.len().to_numpy()
+    alt_lengths = alts.str.len().to_numpy()
+    is_indel = (ref_lengths != alt_lengths) & (ref_lengths > 0) & (alt_lengths > 0)
+    indels = np.flatnonzero(is_indel)
+    trimmed = trim_alleles(positions[indels], refs.iloc[indels], alts.iloc[indels])
+    positions[indels] = trimmed[0]
+    refs.iloc[indels] = trimmed[1].to_numpy()
+    alts.iloc[indels] = trimmed[2].to_numpy()
+
+    ref_lengths = refs.str.len().to_numpy()
+    alt_lengths = alts.str.len().to_numpy()
+    first_equal = (refs.str[0] == alts.str[0]).to_numpy()
+    inserted = alts.str[1:]
+    refs, alts = refs.to_numpy(dtype=object), alts.to_numpy(dtype=object)
+    is_del = is_indel & (alt_lengths == 1) & first_equal
+    is_ins = is_indel & (ref_lengths == 1) & first_equal
+
+    chroms = pd.Series(df["chrom"].to_numpy(dtype=object), copy=False)
+    for chrom, rows in chroms.groupby(chroms, sort=False).indices.items():
+        dels, ins = rows[is_del[rows]], rows[is_ins[rows]]
+        if (dels.shape[0] == 0 and ins.shape[0] == 0) or chrom not in genome:
+            continue
+        end = int(
+            np.concatenate([positions[dels] + ref_lengths[dels], positions[ins]]).max()
+        )
+        seq = np.asarray(fetch_codes(genome, chrom, 0, end))
+
+        if dels.shape[0]:
+            # deleted bases are seq[start : start + length]; shifting left by one
+            # needs the anchor to equal the last deleted base
+            starts, lengths = positions[dels], ref_lengths[dels] - 1
+            shifts = shift_left(
+                seq,
+                starts,
+                lengths,
+                lambda ixs, moved: seq[starts[ixs] - moved + lengths[ixs] - 1],
+            )
+            moved = shifts > 0
+            dels, starts, lengths = (
+                dels[moved],
+                starts[moved] - shifts[moved],
+                lengths[moved],
+            )
+            positions[dels] = starts
+            for length in np.unique(lengths):
+                group = lengths == length
+                ref_codes = seq[starts[group, None] - 1 + np.arange(length + 1)]
+                refs[dels[group]] = decode_rows(ref_codes)
+                alts[dels[group]] = decode_rows(ref_codes[:, :1])
+
+        if ins.shape[0]:
+            # inserted bases rotate right by one per shift
+            lengths = alt_lengths[ins] - 1
+            offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            codes = encode_bases(inserted.iloc[ins].str.cat())
+            starts = positions[ins]
+            shifts = shift_left(
+                seq,
+                starts,
+                lengths,
+                lambda ixs, moved: codes[
+                    offsets[ixs] + (lengths[ixs] - 1 - moved) % lengths[ixs]
+                ],
+            )
+            moved = shifts > 0
+            ins, starts, shifts = (
+                ins[moved],
+                starts[moved] - shifts[moved],
+                shifts[moved],
+            )
+            lengths, offsets = lengths[moved], offsets[moved]
+            positions[ins] = starts
+            for length in np.unique(lengths):
+                group = lengths == length
+                columns = np.arange(length)
+                rotated = codes[
+                    offsets[group, None] + (columns - shifts[group, None]) % length
+                ]
+                anchors = seq[starts[group, None] - 1]
+                refs[ins[group]] = decode_rows(anchors)
+                alts[ins[group]] = decode_rows(np.hstack([anchors, rotated]))
+
+    df["pos"] = positions
+    df["ref"] = refs
+    df["alt"] = alts
+    return df
+
+
+def genome_contig_names(chroms, genome):
+    """Genome contig of each chromosome, matching with or without 'chr' prefix
+
+    Chromosomes found in neither form are returned unchanged.
+    """
+    chroms = np.asarray(chroms, dtype=object)
+    stripped_contigs = dict(zip(strip_chr_prefix(list(genome.keys())), genome.keys()))
+    uniques, inverse = np.unique(chroms.astype(str), return_inverse=True)
+    contigs = [
+        chrom if chrom in genome else stripped_contigs.get(stripped, chrom)
+        for chrom, stripped in zip(uniques, strip_chr_prefix(uniques))
+    ]
+    return np.asarray(contigs, dtype=object)[inverse.ravel()]
+
+
+def normalize_variants(df, genome=None, strip_chr=False):
+    """chrom/pos/ref/alt table with the representation differences removed
+
+    strip_chr drops 'chr' prefixes; with a genome, MAF-style '-' alleles get
+    an anchor base and indels are left-aligned (see left_align_indels), with
+    chromosomes looked up in the genome with or without the 'chr' prefix.
+    """
+    df = df[["chrom", "pos", "ref", "alt"]].copy()
+    chroms = df["chrom"].to_numpy(dtype=object)
+    if genome is not None:
+        from dvartk.process import anchor_maf_indels
+
+        df["chrom"] = genome_contig_names(chroms, genome)
+        if df["ref"].eq("-").any() or df["alt"].eq("-").any():
+            df = anchor_maf_indels(df, genome)
+        df = left_align_indels(df, genome)
+    df["chrom"] = strip_chr_prefix(chroms) if strip_chr else chroms
+    return df
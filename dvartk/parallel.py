@@ -0,0 +1,63 @@
+import contextlib
+import os
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+
+def resolve_n_jobs(n_jobs):
+    """Worker count for n_jobs: None -> 1, -1 -> all CPUs, -2 -> all but one"""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+    return max(int(n_jobs), 1)
+
+
+class SharedArrays:
+    """NumPy arrays copied into shared memory blocks for worker processes
+
+    spec is a small picklable {name: (block name, dtype, shape)} dict that
+    workers pass to attached() to map the same memory, so array contents
+    are never pickled. Blocks are unlinked on exit.
+    """
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.arrays = {}
+        self.spec = {}
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            block = SharedMemory(create=True, size=max(values.nbytes, 1))
+            self.blocks.append(block)
+            shared = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+            shared[...] = values
+            self.arrays[name] = shared
+            self.spec[name] = (block.name, values.dtype.str, values.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.arrays.clear()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+@contextlib.contextmanager
+def attached(spec):
+    """{name: array} views of the shared blocks described by spec
+
+    Views must not be kept beyond the block; copy what should outlive it.
+    """
+    blocks, arrays = [], {}
+    try:
+        for name, (block_name, dtype, shape) in spec.items():
+            block = SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        yield arrays
+    finally:
+        arrays.clear()
+        for block in blocks:
+            block.close()
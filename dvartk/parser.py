@@ -1,22 +1,118 @@
 import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-import wgs_analysis.algorithms.rearrangement
+from pandas.api.types import union_categoricals
+from dvartk.cache import read_cached_table, table_cache_path, write_cached_table
+from dvartk.instrument import instrumented
+from dvartk.regions import filter_snvs, filter_svs, load_regions
+from dvartk.svtypes import normalize_sv_types
+from dvartk.parallel import SharedArrays, attached, resolve_n_jobs
+from dvartk.vcf import read_vcf, read_vcf_svs
+from dvartk.normalize import normalize_variants
+from dvartk.matching import (
+    SNV_KEY_ALLELE_BITS,
+    SNV_KEY_POS_BITS,
+    build_chrom_index,
+    count_key_sets,
+    count_match_sets,
+    count_matched_keys,
+    encode_snv_keys,
+    hash_sv_rows,
+    isin_sorted,
+    match_breakpoints,
+    match_snv_keys,
+    sorted_unique,
+    split_groups,
+)
+
+COMPARISON_FORMAT_VERSION = 2
+STATE_ARRAYS = ("keys1", "keys2", "groups1", "groups2", "match1", "match2")
 
 
 def convert_type_names(maf, type_col_name="type"):
-    """Convert SV type names"""
-    df = maf.copy()
-    type_src1 = ["DEL", "INS", "DUP", "INV", "BND"]
-    type_src2 = ["Deletion", "Insertion", "Duplication", "Inversion", "Translocation"]
-    type_src3 = ["deletion", "insertion", "duplication", "inversion", "translocation"]
-    type_dst = ["del", "ins", "dup", "inv", "translocation"]
-
-    df[type_col_name] = df[type_col_name].replace(dict(zip(type_src1, type_dst)))
-    df[type_col_name] = df[type_col_name].replace(dict(zip(type_src2, type_dst)))
-    df[type_col_name] = df[type_col_name].replace(dict(zip(type_src3, type_dst)))
+    """Convert SV type names; see dvartk.svtypes.normalize_sv_types"""
+    return normalize_sv_types(maf, type_col_name)
+
+
+def sniff_delimitor(maf_path, n_chars=10000):
+    """Guess tab or comma delimitor from the head of a (gzipped) table"""
+    if maf_path.endswith("gz"):
+        maf_file = gzip.open(maf_path, "rt")
+    else:
+        maf_file = open(maf_path, "r")
+    with maf_file:
+        head = maf_file.read(n_chars)
+    return "\t" if head.count("\t") > 0 else ","
+
+
+def concat_chunks(chunks):
+    """pd.concat that keeps categorical columns categorical across chunks"""
+    columns = {}
+    for col in chunks[0].columns:
+        series = [chunk[col] for chunk in chunks]
+        if isinstance(series[0].dtype, pd.CategoricalDtype):
+            index = pd.concat([_.index.to_series() for _ in series]).index
+            columns[col] = pd.Series(union_categoricals(series), index=index)
+        else:
+            columns[col] = pd.concat(series)
+    return pd.DataFrame(columns)
+
+
+def downcast_integers(df, columns):
+    """Store integer columns as int32 when their values fit"""
+    info = np.iinfo(np.int32)
+    for col in columns:
+        values = df[col]
+        if pd.api.types.is_integer_dtype(values) and (
+            values.shape[0] == 0
+            or (values.min() >= info.min and values.max() <= info.max)
+        ):
+            df[col] = values.astype(np.int32)
     return df
 
 
+def iter_maf_chunks(
+    maf_path, dtype=None, usecols=None, chunksize=500000, chunk_filter=None
+):
+    """Yield a (gzipped) maf chunksize rows at a time, filtered by chunk_filter
+
+    Unused categories are dropped from each chunk.
+    """
+    delimitor = sniff_delimitor(maf_path)
+    kwargs = dict(dtype=dtype, usecols=usecols, sep=delimitor, comment="#")
+    with pd.read_csv(maf_path, chunksize=chunksize, **kwargs) as reader:
+        for chunk in reader:
+            if chunk_filter:
+                chunk = chunk_filter(chunk)
+            for col in chunk.columns:
+                if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+                    chunk[col] = chunk[col].cat.remove_unused_categories()
+            yield chunk
+
+
+@instrumented
+def read_maf(maf_path, dtype=None, usecols=None, chunksize=None, chunk_filter=None):
+    """Read a (gzipped) maf, optionally column-projected and in chunks
+
+    With chunksize, rows are parsed chunksize at a time and chunk_filter (a
+    function of a DataFrame) is applied to each chunk before it is kept, so
+    filtered-out rows are never accumulated.
+    """
+    delimitor = sniff_delimitor(maf_path)
+    kwargs = dict(dtype=dtype, usecols=usecols, sep=delimitor, comment="#")
+    if chunksize is None:
+        maf = pd.read_csv(maf_path, low_memory=False, **kwargs)
+        return chunk_filter(maf) if chunk_filter else maf
+
+    chunks = list(iter_maf_chunks(maf_path, dtype, usecols, chunksize, chunk_filter))
+    if not chunks:
+        return pd.read_csv(maf_path, nrows=0, **kwargs)
+    return concat_chunks(chunks)
+
+
 class SvFileConfig:
     """Config with source and dest column names"""
 
@@ -59,24 +155,17 @@ class SvFileConfig:
             self.length_src: self.length_dst,
         }
 
-    def load_maf(self, maf_path):
-        """Load a maf"""
-        if maf_path.endswith("gz"):
-            maf_file = gzip.open(maf_path, "rb")
-            head = maf_file.read(10000).decode("utf-8")
-        else:
-            maf_file = open(maf_path, "r")
-            head = maf_file.read(10000)
-        delimitor = "\t" if head.count("\t") > 0 else ","
-        maf = pd.read_csv(
+    @instrumented
+    def load_maf(self, maf_path, usecols=None, chunksize=None):
+        """Load a maf; usecols projects columns, chunksize streams the parse"""
+        maf = read_maf(
             maf_path,
             dtype={
                 self.chromosome_1_src: str,
                 self.chromosome_2_src: str,
             },
-            sep=delimitor,
-            comment="#",
-            low_memory=False,
+            usecols=usecols,
+            chunksize=chunksize,
         )
         return maf
 
@@ -89,10 +178,83 @@ class SvFileConfig:
         maf = convert_type_names(maf)
         return maf
 
-    def load_and_convert_maf_columns(self, maf_path):
-        """Load a maf, then convert column names"""
-        maf = self.load_maf(maf_path)
-        return self.convert_maf_columns(maf)
+    @instrumented
+    def load_and_convert_maf_columns(
+        self, maf_path, extra_columns=(), chunksize=500000, cache_dir=None
+    ):
+        """Load a maf, then convert column names
+
+        Only col_converter columns and extra_columns are parsed, chunksize
+        rows at a time, with categorical chromosome/strand columns. With
+        cache_dir, the converted table is cached as Feather keyed by the maf
+        path, size, mtime and this config, and memory-mapped on later loads.
+        """
+        if cache_dir is not None:
+            cache_path = table_cache_path(
+                cache_dir,
+                maf_path,
+                {
+                    "config": type(self).__name__,
+                    "col_converter": self.col_converter,
+                    "extra_columns": list(extra_columns),
+                },
+            )
+            if os.path.exists(cache_path):
+                return read_cached_table(cache_path)
+
+        usecols = list(self.col_converter) + [
+            col for col in extra_columns if col not in self.col_converter
+        ]
+        categorical_cols = [
+            self.chromosome_1_src,
+            self.chromosome_2_src,
+            self.strand_1_src,
+            self.strand_2_src,
+        ]
+        maf = read_maf(
+            maf_path,
+            dtype={col: "category" for col in categorical_cols},
+            usecols=usecols,
+            chunksize=chunksize,
+        )
+        maf = downcast_integers(maf, [self.position_1_src, self.position_2_src])
+        maf = self.convert_maf_columns(maf)
+        if cache_dir is not None:
+            write_cached_table(maf, cache_path)
+        return maf
+
+    def iter_converted_chunks(self, maf_path, chunksize=500000):
+        """Yield the converted maf chunksize rows at a time (for streaming)"""
+        categorical_cols = [
+            self.chromosome_1_src,
+            self.chromosome_2_src,
+            self.strand_1_src,
+            self.strand_2_src,
+        ]
+        for maf in iter_maf_chunks(
+            maf_path,
+            dtype={col: "category" for col in categorical_cols},
+            usecols=list(self.col_converter),
+            chunksize=chunksize,
+        ):
+            yield self.convert_maf_columns(maf)
+
+    @instrumented
+    def load_vcf(self, vcf_path, regions=None):
+        """Load an SV VCF straight into the dst columns (see dvartk.vcf.read_vcf_svs)
+
+        regions restricts the records read; with a .tbi/.csi index next to a
+        bgzipped VCF only the overlapping blocks are decompressed.
+        """
+        svs = read_vcf_svs(vcf_path, regions=regions)
+        categorical_cols = [
+            self.chromosome_1_dst,
+            self.chromosome_2_dst,
+            self.strand_1_dst,
+            self.strand_2_dst,
+        ]
+        svs = svs.astype({col: "category" for col in categorical_cols})
+        return downcast_integers(svs, [self.position_1_dst, self.position_2_dst])
 
 
 class SnvFileConfig:
@@ -115,32 +277,57 @@ class SnvFileConfig:
             self.alt_src: self.alt_dst,
         }
 
-    def load_maf(self, maf_path):
-        """Load a maf"""
-        if maf_path.endswith("gz"):
-            maf_file = gzip.open(maf_path, "rb")
-            head = maf_file.read(10000).decode("utf-8")
-        else:
-            maf_file = open(maf_path, "r")
-            head = maf_file.read(10000)
-        delimitor = "\t" if head.count("\t") > 0 else ","
-        maf = pd.read_csv(
+    @instrumented
+    def load_maf(self, maf_path, usecols=None, chunksize=None):
+        """Load a maf; usecols projects columns, chunksize streams the parse"""
+        maf = read_maf(
             maf_path,
             dtype={
                 self.chrom_src: str,
             },
-            sep=delimitor,
-            comment="#",
-            low_memory=False,
+            usecols=usecols,
+            chunksize=chunksize,
         )
         return maf
 
+    @instrumented
+    def load_vcf(self, vcf_path, regions=None, info_fields=()):
+        """Load the SNVs of a VCF straight into the dst columns
+
+        Multi-allelic records are split and only single-base ACGT REF/ALT
+        pairs are kept. regions restricts the records read; with a .tbi/.csi
+        index next to a bgzipped VCF only the overlapping blocks are
+        decompressed. info_fields are added as extra columns.
+        """
+        vcf = read_vcf(vcf_path, regions=regions, info_fields=info_fields)
+        is_snv = vcf["ref"].str.fullmatch("[ACGTacgt]") & vcf["alt"].str.fullmatch(
+            "[ACGTacgt]"
+        )
+        vcf = vcf.loc[is_snv, ["chrom", "pos", "ref", "alt", *info_fields]]
+        vcf = vcf.reset_index(drop=True).rename(
+            columns={
+                "chrom": self.chrom_dst,
+                "pos": self.pos_dst,
+                "ref": self.ref_dst,
+                "alt": self.alt_dst,
+            }
+        )
+        categorical_cols = [self.chrom_dst, self.ref_dst, self.alt_dst]
+        vcf = vcf.astype({col: "category" for col in categorical_cols})
+        return downcast_integers(vcf, [self.pos_dst])
+
     def select_SNPs(self, maf):
         """Select variants with SNP tags"""
         assert "Variant_Type" in maf.columns  # TODO: generalize
         maf = maf[maf["Variant_Type"] == "SNP"]  # TODO: generalize
         return maf
 
+    def select_indels(self, maf):
+        """Select variants with DEL or INS tags"""
+        assert "Variant_Type" in maf.columns
+        maf = maf[maf["Variant_Type"].isin(["DEL", "INS"])]
+        return maf
+
     def convert_maf_columns(self, maf):
         """Convert column names"""
         assert len(set(self.col_converter.keys()) & set(maf.columns)) == len(
@@ -149,15 +336,346 @@ class SnvFileConfig:
         maf = maf.rename(columns=self.col_converter)
         return maf
 
-    def load_and_convert_maf_columns(self, maf_path):
-        """Load a maf, select SNPs only, then convert column names"""
-        maf = self.load_maf(maf_path)
-        maf = self.select_SNPs(maf)
-        return self.convert_maf_columns(maf)
+    @instrumented
+    def load_and_convert_maf_columns(
+        self, maf_path, extra_columns=(), chunksize=500000, cache_dir=None
+    ):
+        """Load a maf, select SNPs only, then convert column names
+
+        Only col_converter columns, Variant_Type and extra_columns are parsed,
+        chunksize rows at a time, and non-SNP rows are dropped chunk by chunk.
+        chrom/ref/alt/Variant_Type come back categorical, pos as narrow int.
+        With cache_dir, the converted table is cached as Feather keyed by the
+        maf path, size, mtime and this config, and memory-mapped on later loads.
+        """
+        if cache_dir is not None:
+            cache_path = table_cache_path(
+                cache_dir,
+                maf_path,
+                {
+                    "config": type(self).__name__,
+                    "col_converter": self.col_converter,
+                    "extra_columns": list(extra_columns),
+                },
+            )
+            if os.path.exists(cache_path):
+                return read_cached_table(cache_path)
+
+        usecols = list(self.col_converter) + ["Variant_Type"]
+        usecols += [col for col in extra_columns if col not in usecols]
+        categorical_cols = [self.chrom_src, self.ref_src, self.alt_src, "Variant_Type"]
+        maf = read_maf(
+            maf_path,
+            dtype={col: "category" for col in categorical_cols},
+            usecols=usecols,
+            chunksize=chunksize,
+            chunk_filter=self.select_SNPs,
+        )
+        maf = downcast_integers(maf, [self.pos_src])
+        maf = self.convert_maf_columns(maf)
+        if cache_dir is not None:
+            write_cached_table(maf, cache_path)
+        return maf
+
+    def iter_converted_chunks(self, maf_path, chunksize=500000):
+        """Yield the converted SNP rows of a maf chunksize rows at a time"""
+        categorical_cols = [self.chrom_src, self.ref_src, self.alt_src, "Variant_Type"]
+        for maf in iter_maf_chunks(
+            maf_path,
+            dtype={col: "category" for col in categorical_cols},
+            usecols=list(self.col_converter) + ["Variant_Type"],
+            chunksize=chunksize,
+            chunk_filter=self.select_SNPs,
+        ):
+            yield self.convert_maf_columns(maf)
+
+
+def lazy_frame(name):
+    """Property that selects matched/unmatched maf1/maf2 rows on first access"""
+    return property(lambda self: self.get_frames()[name])
+
+
+class UpdatableComparison:
+    """Incremental updates and save/load for SnvComparison and SvComparison
+
+    Rows are grouped by chromosome (SNVs) or unordered chromosome pair (SVs),
+    which never match across groups. add_a, add_b and remove re-match only
+    the groups of the rows they touch and keep the make_oneliner counts per
+    group, so an update costs the affected groups rather than a rebuild.
+    Subclasses provide build_state, prepare_rows, match_rows, find_rows and
+    index_rows.
+    """
+
+    maf1_match = lazy_frame("maf1_match")
+    maf1_nonmatch = lazy_frame("maf1_nonmatch")
+    maf2_match = lazy_frame("maf2_match")
+    maf2_nonmatch = lazy_frame("maf2_nonmatch")
+
+    def get_frames(self):
+        if self.frames is None:
+            self.frames = {
+                "maf1_match": self.maf1[self.match1],
+                "maf1_nonmatch": self.maf1[~self.match1],
+                "maf2_match": self.maf2[self.match2],
+                "maf2_nonmatch": self.maf2[~self.match2],
+            }
+        return self.frames
+
+    def get_group_counts(self):
+        """{group code: make_oneliner counts}, built on first use"""
+        if self.group_counts is None:
+            self.build_state()
+            self.group_counts = {}
+            self.count_groups(np.union1d(self.groups1, self.groups2))
+        return self.group_counts
+
+    def summed_counts(self):
+        counts = list(self.get_group_counts().values())
+        return [int(count) for count in np.sum(counts, axis=0)] if counts else [0] * 6
+
+    def count_groups(self, groups):
+        rows1 = split_groups(self.groups1, groups)
+        rows2 = split_groups(self.groups2, groups)
+        for group in rows1:
+            ixs1, ixs2 = rows1[group], rows2[group]
+            if ixs1.shape[0] + ixs2.shape[0] == 0:
+                self.group_counts.pop(group, None)
+                continue
+            self.group_counts[group] = count_match_sets(
+                self.keys1[ixs1], self.keys2[ixs2], self.match1[ixs1], self.match2[ixs2]
+            )
+
+    def rematch_groups(self, groups):
+        """Match again the rows of both tables in groups and recount them"""
+        if self.n_jobs > 1:
+            self.match_groups_parallel(groups)
+        else:
+            rows1 = np.flatnonzero(np.isin(self.groups1, groups))
+            rows2 = np.flatnonzero(np.isin(self.groups2, groups))
+            self.match1[rows1], self.match2[rows2] = self.match_rows(rows1, rows2)
+            self.count_groups(groups)
+        self.frames = self.sets = None
+        for name in ("A", "B", "A_not_B", "B_not_A", "A_and_B", "A_and_B_from_maf2"):
+            self.__dict__.pop(name, None)
+
+    def match_groups_parallel(self, groups):
+        """Match and count each of groups as one task for n_jobs workers"""
+        rows1 = split_groups(self.groups1, groups)
+        rows2 = split_groups(self.groups2, groups)
+        tasks = []
+        for group in rows1:
+            if rows1[group].shape[0] + rows2[group].shape[0] == 0:
+                self.group_counts.pop(group, None)
+            else:
+                tasks.append((group, rows1[group], rows2[group]))
+        # largest groups first, so that the workers finish at about the same time
+        tasks.sort(key=lambda task: -(task[1].shape[0] + task[2].shape[0]))
+        for group, counts in self.map_groups(tasks):
+            self.group_counts[group] = counts
+
+    def match_all_groups(self):
+        """Set match1/match2 and the group counts, one group per task"""
+        self.match1 = np.zeros(self.maf1.shape[0], dtype=bool)
+        self.match2 = np.zeros(self.maf2.shape[0], dtype=bool)
+        self.group_counts = {}
+        self.build_state()
+        self.rematch_groups(np.union1d(self.groups1, self.groups2))
+
+    def add_rows(self, side, rows):
+        self.get_group_counts()
+        frame, keys, groups = self.prepare_rows(side, rows)
+        if frame.shape[0] == 0:
+            return
+        maf_name = f"maf{side}"
+        maf = pd.concat([getattr(self, maf_name), frame], ignore_index=True)
+        setattr(self, maf_name, self.index_rows(maf))
+        new = {"keys": keys, "groups": groups, "match": np.zeros(len(keys), bool)}
+        for name, values in new.items():
+            name = f"{name}{side}"
+            setattr(self, name, np.concatenate([getattr(self, name), values]))
+        self.rematch_groups(sorted_unique(groups))
+
+    def add_a(self, rows):
+        """Append rows to maf1 and re-match the chromosomes they are on"""
+        self.add_rows(1, rows)
+
+    def add_b(self, rows):
+        """Append rows to maf2 and re-match the chromosomes they are on"""
+        self.add_rows(2, rows)
+
+    def remove(self, a=None, b=None):
+        """Drop the maf1 rows equal to a row of a, and the maf2 rows equal to b
+
+        Rows are compared on ixs (SNVs after normalization) and the
+        chromosomes of the dropped rows are re-matched.
+        """
+        self.get_group_counts()
+        affected = []
+        for side, rows in ((1, a), (2, b)):
+            if rows is None:
+                continue
+            keep = ~self.find_rows(side, rows)
+            affected.append(getattr(self, f"groups{side}")[~keep])
+            maf = getattr(self, f"maf{side}")[keep].reset_index(drop=True)
+            setattr(self, f"maf{side}", self.index_rows(maf))
+            for name in ("keys", "groups", "match"):
+                name = f"{name}{side}"
+                setattr(self, name, getattr(self, name)[keep])
+        if affected:
+            self.rematch_groups(sorted_unique(np.concatenate(affected)))
+
+    def save(self, path):
+        """Write the comparison state to the directory path; see load"""
+        counts = self.get_group_counts()
+        os.makedirs(path, exist_ok=True)
+        groups = np.array(sorted(counts), dtype=np.int64)
+        arrays = {name: getattr(self, name) for name in STATE_ARRAYS}
+        arrays["groups"] = groups
+        arrays["counts"] = np.array([counts[g] for g in groups], dtype=np.int64)
+        for name, values in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+        for name in ("maf1", "maf2"):
+            # the index is rebuilt by index_rows on load
+            frame = getattr(self, name).reset_index(drop=True)
+            write_cached_table(frame, os.path.join(path, f"{name}.feather"))
+        regions = self.regions
+        if regions is not None:
+            regions = {
+                chrom: [starts.tolist(), ends.tolist()]
+                for chrom, (starts, ends) in regions.items()
+            }
+        meta = {
+            "version": COMPARISON_FORMAT_VERSION,
+            "class": type(self).__name__,
+            "params": {name: getattr(self, name) for name in self.state_params},
+            "chroms": self.chrom_index.tolist(),
+            "regions": regions,
+        }
+        with open(os.path.join(path, "comparison.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+        return path
+
+    @classmethod
+    def load(cls, path, genome=None, n_jobs=None):
+        """Comparison written by save(), ready for further updates
+
+        genome: as given to the SnvComparison, needed to add or remove rows
+            of a comparison that normalized against it
+        n_jobs [int]: workers for later updates, as in the constructor
+        """
+        with open(os.path.join(path, "comparison.json")) as meta_file:
+            meta = json.load(meta_file)
+        if (
+            meta["version"] != COMPARISON_FORMAT_VERSION
+            or meta["class"] != cls.__name__
+        ):
+            raise ValueError(f"{path} is not a saved {cls.__name__}")
+        cmp = cls.__new__(cls)
+        for name, value in meta["params"].items():
+            setattr(cmp, name, value)
+        cmp.chrom_index = build_chrom_index(meta["chroms"])
+        for name in ("maf1", "maf2"):
+            frame = read_cached_table(os.path.join(path, f"{name}.feather"))
+            setattr(cmp, name, cmp.index_rows(frame))
+        cmp.regions = meta["regions"]
+        if cmp.regions is not None:
+            cmp.regions = {
+                chrom: (
+                    np.array(starts, dtype=np.int64),
+                    np.array(ends, dtype=np.int64),
+                )
+                for chrom, (starts, ends) in cmp.regions.items()
+            }
+        for name in STATE_ARRAYS:
+            setattr(cmp, name, np.load(os.path.join(path, f"{name}.npy")))
+        groups = np.load(os.path.join(path, "groups.npy")).tolist()
+        counts = np.load(os.path.join(path, "counts.npy")).tolist()
+        cmp.group_counts = dict(zip(groups, counts))
+        cmp.genome = genome
+        cmp.n_jobs = resolve_n_jobs(n_jobs)
+        cmp.frames = cmp.sets = None
+        return cmp
+
+
+BREAKPOINT_COLUMNS = [
+    "chromosome_1",
+    "strand_1",
+    "position_1",
+    "chromosome_2",
+    "strand_2",
+    "position_2",
+]
+
+
+def match_sv_slices(spec, groups, ends1, ends2, window_size, one_to_one):
+    """Worker task of SvComparison.map_groups: match a batch of chromosome pairs
+
+    The batch's rows of each table are one contiguous slice of the shared
+    arrays of spec, group after group, ending at ends1/ends2; the groups are
+    matched in one match_breakpoints call, as they cannot match each other,
+    and the match masks are written back to the shared arrays.
+    returns: [(group, make_oneliner counts of the group)]
+    """
+    bounds = {1: (ends1[0][0], ends1[-1][1]), 2: (ends2[0][0], ends2[-1][1])}
+    with attached(spec) as arrays:
+        frames = {}
+        for side, (start, end) in bounds.items():
+            columns = {
+                col: arrays[f"{col}_{side}"][start:end].copy()
+                for col in BREAKPOINT_COLUMNS
+            }
+            frames[side] = pd.DataFrame(columns).assign(row_ix=np.arange(end - start))
+        sv_match = match_breakpoints(
+            frames[1],
+            frames[2],
+            id_col="row_ix",
+            window_size=window_size,
+            one_to_one=one_to_one,
+        )
+        match1 = np.isin(frames[1]["row_ix"], sv_match["reference_id"])
+        match2 = np.isin(frames[2]["row_ix"], sv_match["target_id"])
+        arrays["match1"][slice(*bounds[1])] = match1
+        arrays["match2"][slice(*bounds[2])] = match2
+        keys1 = arrays["keys1"][slice(*bounds[1])].copy()
+        keys2 = arrays["keys2"][slice(*bounds[2])].copy()
+    results = []
+    for group, (start1, end1), (start2, end2) in zip(groups, ends1, ends2):
+        rows1 = slice(start1 - bounds[1][0], end1 - bounds[1][0])
+        rows2 = slice(start2 - bounds[2][0], end2 - bounds[2][0])
+        counts = count_match_sets(
+            keys1[rows1], keys2[rows2], match1[rows1], match2[rows2]
+        )
+        results.append((group, counts))
+    return results
+
 
+def balance_tasks(sizes, n_batches):
+    """Task indices per batch, placing the largest tasks first on the
+    least loaded batch"""
+    loads = np.zeros(n_batches, dtype=np.int64)
+    batches = [[] for _ in range(n_batches)]
+    for ix in np.argsort(-np.asarray(sizes), kind="stable"):
+        batch = int(np.argmin(loads))
+        batches[batch].append(int(ix))
+        loads[batch] += sizes[ix]
+    return [batch for batch in batches if batch]
 
-class SvComparison:
-    """Class for comparing two SV 'maf' tables"""
+
+class SvComparison(UpdatableComparison):
+    """Class for comparing two SV 'maf' tables
+
+    Breakpoints match if both ends are within window_size bp (see
+    dvartk.matching.match_breakpoints); one_to_one keeps only the closest
+    match of each SV. regions (BED path, region list or chrom/start/end
+    table) keeps only SVs with both breakpoints inside before matching.
+    add_a, add_b and remove update the comparison per chromosome pair, and
+    save/load keep it across processes (see UpdatableComparison). With
+    n_jobs > 1 (-1 for all CPUs), chromosome pairs are matched in a process
+    pool that reads the breakpoint columns from shared memory; the result
+    is the same as with one job.
+    """
+
+    state_params = ("delimitor", "debug", "window_size", "one_to_one")
 
     ixs = [
         "chromosome_1",
@@ -169,11 +687,30 @@ class SvComparison:
         "type",
     ]
 
-    def __init__(self, maf1, maf2, delimitor="\t", debug=False):
+    @instrumented(name="parser.SvComparison")
+    def __init__(
+        self,
+        maf1,
+        maf2,
+        delimitor="\t",
+        debug=False,
+        window_size=200,
+        one_to_one=False,
+        regions=None,
+        n_jobs=None,
+    ):
+        if regions is not None:
+            regions = load_regions(regions)
+            maf1, maf2 = filter_svs(maf1, regions), filter_svs(maf2, regions)
         self.maf1 = maf1.reset_index(drop=True)
         self.maf2 = maf2.reset_index(drop=True)
         self.delimitor = delimitor
         self.debug = debug
+        self.window_size = window_size
+        self.one_to_one = one_to_one
+        self.regions = regions
+        self.n_jobs = resolve_n_jobs(n_jobs)
+        self.frames = self.group_counts = self.chrom_index = None
 
         if self.debug:
             print(f"self.maf1: {self.maf1}")
@@ -182,23 +719,131 @@ class SvComparison:
         self.maf1["prediction_id"] = maf1.index
         self.maf2["prediction_id"] = maf2.index
 
-        try:
-            sv_match = wgs_analysis.algorithms.rearrangement.match_breakpoints(
-                self.maf1, self.maf2, window_size=200
-            )
-        except ValueError:
-            sv_match = pd.DataFrame(columns=["reference_id", "target_id"])
+        if self.n_jobs > 1:
+            self.match_all_groups()
+            return
+        sv_match = match_breakpoints(
+            self.maf1,
+            self.maf2,
+            window_size=self.window_size,
+            one_to_one=self.one_to_one,
+        )
 
-        self.maf1_match = self.maf1[
-            self.maf1.prediction_id.isin(sv_match["reference_id"])
-        ]
-        self.maf1_nonmatch = self.maf1[
-            ~self.maf1.prediction_id.isin(sv_match["reference_id"])
-        ]
-        self.maf2_match = self.maf2[self.maf2.prediction_id.isin(sv_match["target_id"])]
-        self.maf2_nonmatch = self.maf2[
-            ~self.maf2.prediction_id.isin(sv_match["target_id"])
+        self.match1 = np.isin(self.maf1["prediction_id"], sv_match["reference_id"])
+        self.match2 = np.isin(self.maf2["prediction_id"], sv_match["target_id"])
+
+    def encode_rows(self, svs):
+        """(row hash keys, unordered chromosome pair codes) of SV rows"""
+        chrom_cols = ["chromosome_1", "chromosome_2"]
+        self.chrom_index = build_chrom_index(
+            self.chrom_index, *[svs[col] for col in chrom_cols]
+        )
+        codes1, codes2 = [
+            self.chrom_index.get_indexer(svs[col].to_numpy(dtype=object))
+            for col in chrom_cols
         ]
+        groups = (np.minimum(codes1, codes2).astype(np.int64) << 32) | np.maximum(
+            codes1, codes2
+        )
+        return hash_sv_rows(svs, self.ixs), groups
+
+    def build_state(self):
+        self.chrom_index = build_chrom_index()
+        self.keys1, self.groups1 = self.encode_rows(self.maf1)
+        self.keys2, self.groups2 = self.encode_rows(self.maf2)
+
+    def prepare_rows(self, side, rows):
+        if self.regions is not None:
+            rows = filter_svs(rows, self.regions)
+        rows = rows.reset_index(drop=True)
+        ids = pd.to_numeric(getattr(self, f"maf{side}")["prediction_id"])
+        start = int(ids.max()) + 1 if ids.shape[0] else 0
+        rows["prediction_id"] = np.arange(start, start + rows.shape[0])
+        return (rows, *self.encode_rows(rows))
+
+    def index_rows(self, maf):
+        """maf with a fresh positional index; prediction_id keeps the row ids"""
+        return maf.reset_index(drop=True)
+
+    def match_rows(self, rows1, rows2):
+        sv_match = match_breakpoints(
+            self.maf1.iloc[rows1].assign(row_ix=rows1),
+            self.maf2.iloc[rows2].assign(row_ix=rows2),
+            id_col="row_ix",
+            window_size=self.window_size,
+            one_to_one=self.one_to_one,
+        )
+        return (
+            np.isin(rows1, sv_match["reference_id"]),
+            np.isin(rows2, sv_match["target_id"]),
+        )
+
+    def map_groups(self, tasks):
+        """Match chromosome pairs in worker processes; yields (group, counts)
+
+        Groups are balanced into a few batches per worker and their rows laid
+        out batch by batch in shared memory, with chromosomes and strands as
+        integer codes; the workers write their match masks back into it.
+        """
+        sizes = [len(task[1]) + len(task[2]) for task in tasks]
+        batches = balance_tasks(sizes, min(len(tasks), 4 * self.n_jobs))
+        tasks = [tasks[ix] for batch in batches for ix in batch]
+        rows = {side: np.concatenate([task[side] for task in tasks]) for side in (1, 2)}
+        strand_codes = pd.factorize(
+            np.concatenate(
+                [
+                    getattr(self, f"maf{side}")[col].to_numpy(dtype=object)[rows[side]]
+                    for side in (1, 2)
+                    for col in ("strand_1", "strand_2")
+                ]
+            ),
+            use_na_sentinel=False,
+        )[0]
+        splits = np.cumsum([len(rows[1]), len(rows[1]), len(rows[2])])
+        strand_codes = np.split(strand_codes, splits)
+        arrays = {}
+        for side in (1, 2):
+            maf = getattr(self, f"maf{side}")
+            for end in ("1", "2"):
+                chroms = maf[f"chromosome_{end}"].to_numpy(dtype=object)[rows[side]]
+                arrays[f"chromosome_{end}_{side}"] = self.chrom_index.get_indexer(
+                    chroms
+                )
+                arrays[f"strand_{end}_{side}"] = strand_codes.pop(0)
+                positions = maf[f"position_{end}"].to_numpy(dtype=float)[rows[side]]
+                arrays[f"position_{end}_{side}"] = positions
+            arrays[f"keys{side}"] = getattr(self, f"keys{side}")[rows[side]]
+            arrays[f"match{side}"] = np.zeros(len(rows[side]), dtype=bool)
+        # (start, end) rows of each group in the shared layout
+        bounds = {}
+        for side in (1, 2):
+            lengths = np.array([len(task[side]) for task in tasks])
+            ends = np.cumsum(lengths)
+            bounds[side] = list(zip((ends - lengths).tolist(), ends.tolist()))
+        firsts = np.cumsum([0] + [len(batch) for batch in batches])
+        with SharedArrays(arrays) as shared:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                futures = [
+                    executor.submit(
+                        match_sv_slices,
+                        shared.spec,
+                        [task[0] for task in tasks[first:last]],
+                        bounds[1][first:last],
+                        bounds[2][first:last],
+                        self.window_size,
+                        self.one_to_one,
+                    )
+                    for first, last in zip(firsts[:-1], firsts[1:])
+                ]
+                results = [future.result() for future in futures]
+            self.match1[rows[1]] = shared.arrays["match1"]
+            self.match2[rows[2]] = shared.arrays["match2"]
+        for batch_results in results:
+            yield from batch_results
+
+    def find_rows(self, side, rows):
+        keys = hash_sv_rows(rows, self.ixs)
+        return np.isin(getattr(self, f"keys{side}"), keys)
 
     def make_set(self, data):
         df_ix = data.copy().set_index(self.ixs).index.tolist()
@@ -233,17 +878,20 @@ class SvComparison:
         """Returns #A, #B, #(A-B), #(B-A), #(A&B), #(A|B)"""
         if print_header:
             print("A B A-B B-A A&B A|B".replace(" ", delimitor))
-        for attr in ("A", "B"):
-            if not hasattr(self, attr):
-                self.get_set_counts()
-        field = [
-            len(self.A),
-            len(self.B),
-            len(self.A_not_B),
-            len(self.B_not_A),
-            len(self.A_and_B),
-            len(self.A | self.B),
-        ]
+        if self.group_counts is not None:
+            field = self.summed_counts()
+        else:
+            for attr in ("A", "B"):
+                if not hasattr(self, attr):
+                    self.get_set_counts()
+            field = [
+                len(self.A),
+                len(self.B),
+                len(self.A_not_B),
+                len(self.B_not_A),
+                len(self.A_and_B),
+                len(self.A | self.B),
+            ]
         if name:
             field = [name] + field
         field = [str(_) for _ in field]
@@ -252,57 +900,164 @@ class SvComparison:
         return field
 
 
-class SnvComparison:
-    """Class for comparing two 'maf' tables"""
+def lazy_set(name):
+    """Property that materializes the comparison's tuple sets on first access"""
+    return property(lambda self: self.get_sets()[name])
+
+
+class SnvComparison(UpdatableComparison):
+    """Class for comparing two 'maf' tables
+
+    Variants are encoded as int64 keys (see dvartk.matching.encode_snv_keys)
+    for matching and counting; the tuple sets A, B, A_not_B, B_not_A, A_and_B
+    and A_and_B_from_maf2 are only built when accessed. regions (BED path,
+    region list or chrom/start/end table) keeps only variants inside them
+    before matching.
+
+    Tolerant matching: strip_chr ignores 'chr' prefixes, genome (pyfaidx.Fasta
+    or ReferenceCache) left-aligns and trims indels before keying (see
+    dvartk.normalize.normalize_variants), and window matches variants with
+    equal chromosome and alleles up to window bp apart. Match frames keep
+    the rows as given; counts are over the normalized keys. add_a, add_b
+    and remove update the comparison per chromosome, and save/load keep it
+    across processes (see UpdatableComparison). With n_jobs > 1 (-1 for all
+    CPUs), chromosomes are matched and counted in a thread pool sharing the
+    key arrays (the NumPy sorts and searches release the GIL); the result
+    is the same as with one job.
+    """
+
+    state_params = ("delimitor", "debug", "window", "strip_chr", "needs_genome")
 
     ixs = ["chrom", "pos", "ref", "alt"]
 
-    def __init__(self, maf1, maf2, delimitor="\t", debug=False):
+    A = lazy_set("A")
+    B = lazy_set("B")
+    A_not_B = lazy_set("A_not_B")
+    B_not_A = lazy_set("B_not_A")
+    A_and_B = lazy_set("A_and_B")
+    A_and_B_from_maf2 = lazy_set("A_and_B_from_maf2")
+
+    @instrumented(name="parser.SnvComparison")
+    def __init__(
+        self,
+        maf1,
+        maf2,
+        delimitor="\t",
+        debug=False,
+        regions=None,
+        genome=None,
+        strip_chr=False,
+        window=0,
+        n_jobs=None,
+    ):
+        if regions is not None:
+            regions = load_regions(regions)
+            maf1, maf2 = filter_snvs(maf1, regions), filter_snvs(maf2, regions)
         self.maf1 = maf1.reset_index(drop=True)
         self.maf2 = maf2.reset_index(drop=True)
         self.delimitor = delimitor
         self.debug = debug
+        self.regions = regions
+        self.genome = genome
+        self.strip_chr = strip_chr
+        self.needs_genome = genome is not None
+        self.n_jobs = resolve_n_jobs(n_jobs)
+        self.sets = self.frames = self.group_counts = None
 
         if self.debug:
             print(f"self.maf1: {self.maf1}")
             print(f"self.maf2: {self.maf2}")
 
-        snv_match = pd.merge(
-            self.maf1[self.ixs], self.maf2[self.ixs], how="inner", on=self.ixs
-        ).set_index(self.ixs)
+        self.window = window
+        variants1, variants2 = self.maf1, self.maf2
+        if genome is not None or strip_chr:
+            variants1 = normalize_variants(variants1, genome, strip_chr)
+            variants2 = normalize_variants(variants2, genome, strip_chr)
+        self.chrom_index = build_chrom_index(variants1["chrom"], variants2["chrom"])
+        self.keys1 = encode_snv_keys(variants1, self.chrom_index)
+        self.keys2 = encode_snv_keys(variants2, self.chrom_index)
+        if self.n_jobs > 1:
+            self.match_all_groups()
+        else:
+            self.match1, self.match2 = match_snv_keys(self.keys1, self.keys2, window)
 
         self.maf1 = self.maf1.set_index(self.ixs, drop=False)
         self.maf2 = self.maf2.set_index(self.ixs, drop=False)
 
-        self.maf1_match = self.maf1[
-            self.maf1.prediction_id.isin(snv_match.prediction_id)
-        ]
-        self.maf1_nonmatch = self.maf1[
-            ~self.maf1.prediction_id.isin(snv_match.prediction_id)
-        ]
-        self.maf2_match = self.maf2[
-            self.maf2.prediction_id.isin(snv_match.prediction_id)
-        ]
-        self.maf2_nonmatch = self.maf2[
-            ~self.maf2.prediction_id.isin(snv_match.prediction_id)
-        ]
+    def encode_rows(self, rows):
+        """encode_snv_keys of rows, normalized as the compared tables were"""
+        if self.needs_genome and self.genome is None:
+            raise ValueError("pass the genome to load() to add or remove rows")
+        variants = rows
+        if self.genome is not None or self.strip_chr:
+            variants = normalize_variants(rows, self.genome, self.strip_chr)
+        self.chrom_index = build_chrom_index(self.chrom_index, variants["chrom"])
+        return encode_snv_keys(variants, self.chrom_index)
+
+    def build_state(self):
+        chrom_shift = SNV_KEY_POS_BITS + SNV_KEY_ALLELE_BITS
+        self.groups1 = self.keys1 >> chrom_shift
+        self.groups2 = self.keys2 >> chrom_shift
+
+    def prepare_rows(self, side, rows):
+        if self.regions is not None:
+            rows = filter_snvs(rows, self.regions)
+        rows = rows.reset_index(drop=True)
+        keys = self.encode_rows(rows)
+        groups = keys >> (SNV_KEY_POS_BITS + SNV_KEY_ALLELE_BITS)
+        return rows, keys, groups
+
+    def index_rows(self, maf):
+        """maf indexed by its ixs columns, as the compared tables are"""
+        return maf.set_index(self.ixs, drop=False)
+
+    def match_rows(self, rows1, rows2):
+        return match_snv_keys(self.keys1[rows1], self.keys2[rows2], self.window)
+
+    def map_groups(self, tasks):
+        """Match chromosomes in worker threads; yields (group, counts)"""
+
+        def match_group(task):
+            group, rows1, rows2 = task
+            keys1, keys2 = self.keys1[rows1], self.keys2[rows2]
+            match1, match2 = match_snv_keys(keys1, keys2, self.window)
+            counts = count_match_sets(keys1, keys2, match1, match2)
+            return group, rows1, rows2, match1, match2, counts
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            for group, rows1, rows2, match1, match2, counts in executor.map(
+                match_group, tasks
+            ):
+                self.match1[rows1], self.match2[rows2] = match1, match2
+                yield group, counts
+
+    def find_rows(self, side, rows):
+        keys = self.encode_rows(rows.reset_index(drop=True))
+        return isin_sorted(getattr(self, f"keys{side}"), sorted_unique(keys))
 
     def make_set(self, data):
-        df_ix = data.copy().set_index(self.ixs).index.tolist()
-        df_ix_set = set(df_ix)
-        return df_ix_set
+        return set(data[self.ixs].itertuples(index=False, name=None))
+
+    def get_sets(self):
+        """Materialize the tuple sets; only needed for set contents, not counts"""
+        if self.sets is None:
+            A_and_B = self.make_set(
+                self.maf1_match
+            )  # big assumption that results will be same/similar with self.maf2_match
+            A_not_B = self.make_set(self.maf1_nonmatch)
+            B_not_A = self.make_set(self.maf2_nonmatch)
+            self.sets = {
+                "A": A_and_B | A_not_B,
+                "B": A_and_B | B_not_A,
+                "A_not_B": A_not_B,
+                "B_not_A": B_not_A,
+                "A_and_B": A_and_B,
+                "A_and_B_from_maf2": self.make_set(self.maf2_match),
+            }
+        return self.sets
 
     def get_set_counts(self, get_return=False):
-        self.A_and_B = self.make_set(
-            self.maf1_match
-        )  # big assumption that results will be same/similar with self.maf2_match
-        self.A_and_B_from_maf2 = self.make_set(
-            self.maf2_match
-        )  # for twisted people like Seongmin who can't trust himself
-        self.A_not_B = self.make_set(self.maf1_nonmatch)
-        self.B_not_A = self.make_set(self.maf2_nonmatch)
-        self.A = self.A_and_B.union(self.A_not_B)
-        self.B = self.A_and_B.union(self.B_not_A)
+        self.get_sets()
 
         if get_return:
             return (
@@ -315,20 +1070,100 @@ class SnvComparison:
             )
 
     def make_oneliner(self, name=None, get_str=False):
-        for attr in ("A", "B"):
-            if not hasattr(self, attr):
-                self.get_set_counts()
-        field = [
-            len(self.A),
-            len(self.B),
-            len(self.A - self.B),
-            len(self.B - self.A),
-            len(self.A & self.B),
-            len(self.A | self.B),
-        ]
+        if self.group_counts is not None:
+            field = self.summed_counts()
+        elif self.window:
+            field = count_matched_keys(self.keys1, self.keys2, self.match1, self.match2)
+        else:
+            field = count_key_sets(self.keys1, self.keys2)
         if name:
             field = [name] + field
         field = [str(_) for _ in field]
         if get_str:
             return self.delimitor.join(field)
         return field
+
+
+class MultiComparison:
+    """Class for comparing k SNV 'maf' tables in one pass
+
+    Every variant is encoded once as an int64 key (as in SnvComparison) and
+    gets one membership bitmask over the k tables; pairwise and UpSet-style
+    subset counts are then read off the distinct bitmasks.
+    mafs: list of maf tables, or dict of name -> maf table
+    """
+
+    ixs = ["chrom", "pos", "ref", "alt"]
+
+    @instrumented(name="parser.MultiComparison")
+    def __init__(self, mafs, names=None, delimitor="\t"):
+        if isinstance(mafs, dict):
+            names, mafs = list(mafs.keys()), list(mafs.values())
+        if names is None:
+            names = [f"maf{ix + 1}" for ix in range(len(mafs))]
+        assert len(names) == len(mafs)
+        assert len(mafs) <= 62, "at most 62 tables fit in an int64 bitmask"
+        self.names = list(names)
+        self.delimitor = delimitor
+
+        chrom_index = build_chrom_index(*[maf["chrom"] for maf in mafs])
+        keys = [sorted_unique(encode_snv_keys(maf, chrom_index)) for maf in mafs]
+        owners = np.repeat(np.arange(len(keys), dtype=np.int64), [len(_) for _ in keys])
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        keys, owners = keys[order], owners[order]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        self.keys = keys[starts]
+        if keys.shape[0]:
+            self.membership = np.add.reduceat(np.left_shift(1, owners), starts)
+        else:
+            self.membership = np.zeros(0, dtype=np.int64)
+
+        masks, counts = np.unique(self.membership, return_counts=True)
+        self.subsets = pd.Series(counts, index=masks)
+
+    def has(self, mask, ix):
+        return (np.asarray(mask) >> ix) & 1 == 1
+
+    def membership_counts(self):
+        """Number of variants per exact membership pattern (UpSet-style)"""
+        masks = self.subsets.index.to_numpy()
+        df = pd.DataFrame(
+            {name: self.has(masks, ix) for ix, name in enumerate(self.names)}
+        )
+        df["count"] = self.subsets.to_numpy()
+        return df.sort_values("count", ascending=False, ignore_index=True)
+
+    def make_table(self):
+        """Tidy pairwise table of #A, #B, #(A-B), #(B-A), #(A&B), #(A|B)"""
+        masks = self.subsets.index.to_numpy()
+        counts = self.subsets.to_numpy()
+        rows = []
+        for ix1, name1 in enumerate(self.names):
+            in1 = self.has(masks, ix1)
+            for ix2 in range(ix1 + 1, len(self.names)):
+                in2 = self.has(masks, ix2)
+                rows.append(
+                    [
+                        name1,
+                        self.names[ix2],
+                        counts[in1].sum(),
+                        counts[in2].sum(),
+                        counts[in1 & ~in2].sum(),
+                        counts[in2 & ~in1].sum(),
+                        counts[in1 & in2].sum(),
+                        counts[in1 | in2].sum(),
+                    ]
+                )
+        columns = ["name1", "name2", "A", "B", "A-B", "B-A", "A&B", "A|B"]
+        return pd.DataFrame(rows, columns=columns)
+
+    def make_oneliners(self, get_str=False, print_header=False):
+        """make_oneliner fields prefixed by the two table names, per pair"""
+        table = self.make_table()
+        if print_header:
+            print(self.delimitor.join(table.columns))
+        fields = [[str(_) for _ in row] for row in table.itertuples(index=False)]
+        if get_str:
+            return [self.delimitor.join(field) for field in fields]
+        return fields
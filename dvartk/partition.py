@@ -0,0 +1,240 @@
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dvartk.matching import build_chrom_index, count_key_sets, encode_snv_keys
+from dvartk.parser import SvComparison, concat_chunks
+from dvartk.regions import filter_snvs, filter_svs, load_regions
+from dvartk.vcf import TabixIndex, find_index, is_bgzf
+
+COMPARISON_FIELDS = ["A", "B", "A-B", "B-A", "A&B", "A|B"]
+PARTITION_KINDS = ("snv", "sv")
+VCF_SUFFIXES = (".vcf", ".vcf.gz", ".vcf.bgz")
+EMPTY_COLUMNS = {
+    "snv": ["chrom", "pos", "ref", "alt"],
+    "sv": SvComparison.ixs + ["length"],
+}
+
+
+def is_vcf(path):
+    return os.fspath(path).endswith(VCF_SUFFIXES)
+
+
+def partition_labels(df, kind):
+    """Chromosome per SNV; sorted 'chrom_a|chrom_b' pair per SV
+
+    SVs match in either orientation, so both orientations of a chromosome
+    pair share a partition.
+    """
+    if kind == "snv":
+        return df["chrom"].astype(str).to_numpy(dtype=object)
+    chromosome_1 = df["chromosome_1"].astype(str).to_numpy(dtype=object)
+    chromosome_2 = df["chromosome_2"].astype(str).to_numpy(dtype=object)
+    return np.where(
+        chromosome_1 <= chromosome_2,
+        chromosome_1 + "|" + chromosome_2,
+        chromosome_2 + "|" + chromosome_1,
+    )
+
+
+def filter_table(df, kind, regions):
+    if regions is None:
+        return df
+    if kind == "snv":
+        return filter_snvs(df, regions)
+    return filter_svs(df, regions)
+
+
+class PartitionSpill:
+    """Per-partition pickle files that table chunks are appended to"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.paths = {}
+        self.sizes = {}
+
+    def append(self, df, labels):
+        groups = pd.Series(labels, copy=False).groupby(labels, sort=False).indices
+        for label, rows in groups.items():
+            if label not in self.paths:
+                self.paths[label] = os.path.join(
+                    self.directory, f"{len(self.paths)}.pkl"
+                )
+                self.sizes[label] = 0
+            with open(self.paths[label], "ab") as handle:
+                pickle.dump(df.iloc[rows], handle, protocol=pickle.HIGHEST_PROTOCOL)
+            self.sizes[label] += len(rows)
+
+
+def read_spill(path):
+    """Concatenate the chunks appended to one partition file"""
+    chunks = []
+    with open(path, "rb") as handle:
+        while True:
+            try:
+                chunks.append(pickle.load(handle))
+            except EOFError:
+                break
+    return concat_chunks(chunks)
+
+
+def partition_source(source, config, kind, regions, chunksize, spill_dir):
+    """Split one input into partitions without holding it whole
+
+    source: converted DataFrame, MAF path or VCF path
+    returns: ({label: part}, {label: n_rows}) where a part is loaded by
+        load_partition; rows outside regions are dropped first. An indexed
+        SNV VCF is not read here: each chromosome is queried when compared.
+    """
+    if isinstance(source, pd.DataFrame):
+        df = filter_table(source, kind, regions)
+        labels = partition_labels(df, kind)
+        groups = pd.Series(labels, copy=False).groupby(labels, sort=False).indices
+        parts = {label: ("frame", df.iloc[rows]) for label, rows in groups.items()}
+        return parts, {label: len(rows) for label, rows in groups.items()}
+
+    index_path = find_index(source) if is_vcf(source) else None
+    if kind == "snv" and index_path is not None and is_bgzf(source):
+        parts = {}
+        for chrom in TabixIndex(index_path).names:
+            if regions is None:
+                parts[chrom] = ("vcf", source, config, [chrom])
+            elif chrom in regions:
+                starts, ends = regions[chrom]
+                spans = [(chrom, start, end) for start, end in zip(starts, ends)]
+                parts[chrom] = ("vcf", source, config, spans)
+        return parts, {label: 0 for label in parts}
+
+    if is_vcf(source):
+        # SV VCFs are read whole so that breakend mates can be paired
+        chunks = [config.load_vcf(source)]
+    else:
+        chunks = config.iter_converted_chunks(source, chunksize=chunksize)
+    spill = PartitionSpill(spill_dir)
+    for chunk in chunks:
+        chunk = filter_table(chunk, kind, regions)
+        spill.append(chunk, partition_labels(chunk, kind))
+    parts = {label: ("spill", path) for label, path in spill.paths.items()}
+    return parts, spill.sizes
+
+
+def load_partition(part, kind):
+    """Table of one partition; None is an empty partition"""
+    if part is None:
+        return pd.DataFrame(columns=EMPTY_COLUMNS[kind])
+    if part[0] == "frame":
+        return part[1]
+    if part[0] == "spill":
+        return read_spill(part[1])
+    _, vcf_path, config, regions = part
+    return config.load_vcf(vcf_path, regions=regions)
+
+
+def compare_partition(kind, part1, part2, window_size=200, one_to_one=False):
+    """#A, #B, #(A-B), #(B-A), #(A&B), #(A|B) of one partition"""
+    maf1, maf2 = load_partition(part1, kind), load_partition(part2, kind)
+    if kind == "snv":
+        chrom_index = build_chrom_index(maf1["chrom"], maf2["chrom"])
+        keys1 = encode_snv_keys(maf1, chrom_index)
+        keys2 = encode_snv_keys(maf2, chrom_index)
+        return [int(count) for count in count_key_sets(keys1, keys2)]
+    comparison = SvComparison(
+        maf1, maf2, window_size=window_size, one_to_one=one_to_one
+    )
+    return [int(count) for count in comparison.make_oneliner()]
+
+
+class PartitionedComparison:
+    """Compare two call sets one partition at a time
+
+    SNVs are partitioned by chromosome and SVs by chromosome pair; the
+    partitions are compared independently (optionally across n_workers
+    processes) and their A, B, A-B, B-A, A&B and A|B counts add up to those of
+    SnvComparison / SvComparison on the whole tables. MAF inputs are streamed
+    chunksize rows at a time into per-partition spill files under scratch_dir,
+    so peak memory follows the largest partition rather than the genome;
+    bgzipped and indexed SNV VCFs are queried per chromosome instead.
+    source1, source2: converted DataFrames, MAF paths or VCF paths
+    config1, config2: SnvFileConfig or SvFileConfig per source [config2
+        default: config1]
+    kind [str]: 'snv' or 'sv'
+    regions: BED path, region list or chrom/start/end table; variants (both
+        breakpoints of SVs) outside them are dropped before matching
+    """
+
+    def __init__(
+        self,
+        source1,
+        source2,
+        config1=None,
+        config2=None,
+        kind="snv",
+        regions=None,
+        n_workers=1,
+        chunksize=500000,
+        scratch_dir=None,
+        delimitor="\t",
+        window_size=200,
+        one_to_one=False,
+    ):
+        assert kind in PARTITION_KINDS, f"kind must be one of {PARTITION_KINDS}"
+        config2 = config1 if config2 is None else config2
+        self.kind = kind
+        self.delimitor = delimitor
+        regions = load_regions(regions) if regions is not None else None
+
+        scratch_root = tempfile.mkdtemp(prefix="dvartk-partition-", dir=scratch_dir)
+        try:
+            parts1, sizes1 = partition_source(
+                source1,
+                config1,
+                kind,
+                regions,
+                chunksize,
+                os.path.join(scratch_root, "1"),
+            )
+            parts2, sizes2 = partition_source(
+                source2,
+                config2,
+                kind,
+                regions,
+                chunksize,
+                os.path.join(scratch_root, "2"),
+            )
+            labels = sorted(set(parts1) | set(parts2))
+            # largest partitions first, so that workers finish together
+            order = sorted(
+                labels, key=lambda label: -(sizes1.get(label, 0) + sizes2.get(label, 0))
+            )
+            tasks = [
+                (kind, parts1.get(label), parts2.get(label), window_size, one_to_one)
+                for label in order
+            ]
+            if n_workers == 1 or len(tasks) <= 1:
+                results = [compare_partition(*task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                    results = list(executor.map(compare_partition, *zip(*tasks)))
+        finally:
+            shutil.rmtree(scratch_root, ignore_errors=True)
+
+        counts = pd.DataFrame(
+            results, index=pd.Index(order, name="partition"), columns=COMPARISON_FIELDS
+        )
+        self.counts = counts.reindex(labels).astype(np.int64)
+
+    def make_oneliner(self, name=None, get_str=False):
+        """Returns #A, #B, #(A-B), #(B-A), #(A&B), #(A|B) summed over partitions"""
+        field = self.counts.sum().tolist()
+        if name:
+            field = [name] + field
+        field = [str(_) for _ in field]
+        if get_str:
+            return self.delimitor.join(field)
+        return field
@@ -1,42 +1,32 @@
+import os
+import numpy as np
 import pandas as pd
 import matplotlib
 import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib_venn import venn2, venn2_unweighted
+from dvartk.channels import INDEL_COLORS, SNV_COLORS, SV_COLORS, channel_table
+from dvartk.instrument import instrumented
 
+# channel schema drawn for each spectrum kind
+SPECTRUM_SCHEMAS = {"snv": "SBS96", "indel": "ID83", "sv": "SV"}
 
+
+def finish_figure(fig, save_path):
+    """Save and close fig if save_path is given; return fig either way
+
+    Without save_path the figure stays open for display and the caller owns
+    it: close it with plt.close(fig) when drawing many.
+    """
+    if save_path:
+        fig.savefig(save_path)
+        plt.close(fig)
+    return fig
+
+
+@instrumented
 def plot_sv_spectra(
     counts, title, save_path=False, tag="", yscale_log=False, ylim=None, debug=False
 ):
-    """Draw SV spectra plot based on SV counts"""
-
-    sv_colors = [
-        "#d6e6f4",
-        "#abd0e6",
-        "#6aaed6",
-        "#3787c0",
-        "#105ba4",
-        "#08315c",  # deletion
-        "#fedfc0",
-        "#fdb97d",
-        "#fd8c3b",
-        "#e95e0d",
-        "#b63c02",
-        "#642101",  # duplication
-        "#dbcce8",
-        "#b799d2",
-        "#9366bc",
-        "#6f4298",
-        "#4a2c65",
-        "#39224f",  # insertion
-        "#dbf1d6",
-        "#aedea7",
-        "#73c476",
-        "#37a055",
-        "#0b7734",
-        "#043316",  # inversion
-        "#aaaaaa",
-    ]  # translocation
+    """Draw SV spectra plot based on SV counts; returns the figure"""
 
     fig, ax = plt.subplots(1)
     fig.set_figheight(3.5)
@@ -49,7 +39,7 @@ def plot_sv_spectra(
     font = matplotlib.font_manager.FontProperties()
     font.set_family("monospace")
 
-    ax.bar(height=counts, x=range(counts.shape[0]), color=sv_colors)
+    ax.bar(height=counts, x=range(counts.shape[0]), color=SV_COLORS)
 
     xaxis_index = range(len(counts))
     if debug:
@@ -64,17 +54,16 @@ def plot_sv_spectra(
         plt.ylim(ylim)
     plt.tight_layout()
 
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
+    return finish_figure(fig, save_path)
 
 
+@instrumented
 def plot_snv_spectra(
     counts, title, save_path=False, tag="", yscale_log=False, ylim=None, debug=False
 ):
-    """Draw SNV spectra plot based on SNV counts"""
+    """Draw SNV spectra plot based on SNV counts; returns the figure"""
+    import seaborn as sns
 
-    colors = ["#03BDEE", "#000000", "#E52A25", "#CDC9CA", "#A3CE62", "#ECC6C5"]
     fig, ax = plt.subplots(1)
     fig.set_figheight(4)
     fig.set_figwidth(20)
@@ -83,16 +72,16 @@ def plot_snv_spectra(
         title += tag
     fig.suptitle(title)
 
-    pat = r"([ACGT])\[([ACGT])\>([ACGT])\]([ACGT])"
-    df = pd.DataFrame(counts.copy(), columns=["count"])
-    df["norm_tri_nt"] = df.index.str.replace(pat, r"\1\2\4", regex=True)
-    df["norm_mut_type"] = df.index.str.replace(pat, r"\2>\3", regex=True)
+    annotation = channel_table("SBS96").reindex(counts.index)
+    df = counts.rename("count").to_frame()
+    df["norm_tri_nt"] = annotation["tick"]
+    df["norm_mut_type"] = annotation["type"]
     df["index"] = range(df.shape[0])
     if debug:
         print(df)
 
-    for ix, (mut_type, mut_type_data) in enumerate(df.groupby(["norm_mut_type"])):
-        color = colors[ix]
+    for ix, (mut_type, mut_type_data) in enumerate(df.groupby("norm_mut_type")):
+        color = SNV_COLORS[ix]
         if debug:
             print(mut_type, mut_type_data)
         ax.bar(
@@ -116,102 +105,27 @@ def plot_snv_spectra(
         plt.ylim(ylim)
     plt.tight_layout()
 
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
+    return finish_figure(fig, save_path)
 
 
 def proc_indel_dataframe(indel):
     """indel: DataFrame (not Series) with SigProfiler index and a 'count' column
     returns: annotated df
     """
-    df = indel.copy()
-
-    indel_feature_to_type = {
-        "1:Del:C": "1bp Del at Homopolymer C",
-        "1:Del:T": "1bp Del at Homopolymer T",
-        "1:Ins:C": "1bp Ins at Homopolymer C",
-        "1:Ins:T": "1bp Ins at Homopolymer T",
-        "2:Del:R": "2bp Del at Repeats",
-        "3:Del:R": "3bp Del at Repeats",
-        "4:Del:R": "4bp Del at Repeats",
-        "5:Del:R": "5+bp Del at Repeats",
-        "2:Ins:R": "2bp Ins at Repeats",
-        "3:Ins:R": "3bp Ins at Repeats",
-        "4:Ins:R": "4bp Ins at Repeats",
-        "5:Ins:R": "5+bp Ins at Repeats",
-        "2:Del:M": "2bp Del at Microhomology",
-        "3:Del:M": "3bp Del at Microhomology",
-        "4:Del:M": "4bp Del at Microhomology",
-        "5:Del:M": "5+bp Del at Microhomology",
-    }
-
-    pat = r"(\d):([A-Z][a-z]{2}):([CTRM]):(\d)"
-    df.loc[:, "indel_length"] = df.index.str.replace(pat, r"\1", regex=True).astype(str)
-    df.loc[:, "insdel"] = df.index.str.replace(pat, r"\2", regex=True)
-    df.loc[:, "feature_name"] = df.index.str.replace(pat, r"\3", regex=True)
-    df.loc[:, "feature_length"] = df.index.str.replace(pat, r"\4", regex=True).astype(
-        int
-    )
-    df.loc[:, "feature"] = (
-        df["indel_length"] + ":" + df["insdel"] + ":" + df["feature_name"]
-    )
-    df.loc[:, "indel_type"] = df["feature"].replace(indel_feature_to_type)
-    df.loc[:, "index"] = range(df.shape[0])
-    feature_lengths = []
-    for rix, row in df.iterrows():
-        if row["insdel"] == "Del" and row["feature_name"] in ("C", "T"):
-            feature_length = str(int(row["feature_length"]) + 1)
-            if feature_length == "6":
-                feature_length += "+"
-        elif row["insdel"] == "Ins" and row["feature_name"] in ("C", "T"):
-            feature_length = str(int(row["feature_length"]))
-            if feature_length == "5":
-                feature_length += "+"
-        elif row["insdel"] == "Del" and row["feature_name"] in ("R",):
-            feature_length = str(int(row["feature_length"]) + 1)
-            if feature_length == "6":
-                feature_length += "+"
-        elif row["insdel"] == "Ins" and row["feature_name"] in ("R",):
-            feature_length = str(int(row["feature_length"]))
-            if feature_length == "5":
-                feature_length += "+"
-        elif row["insdel"] == "Del" and row["feature_name"] in ("M",):
-            feature_length = str(int(row["feature_length"]))
-            if feature_length == "5":
-                feature_length += "+"
-        else:
-            print("ERROR: logic hole", file=sys.stderr)
-            break
-        feature_lengths.append(feature_length)
-    df.loc[:, "feature_length"] = feature_lengths
-    df = df[["count", "index", "indel_type", "feature_length"]]
+    annotation = channel_table("ID83").reindex(indel.index)
+    df = indel[["count"]].copy()
+    df["index"] = range(df.shape[0])
+    df["indel_type"] = annotation["type"]
+    df["feature_length"] = annotation["tick"]
     return df
 
 
+@instrumented
 def plot_indel_spectra(
     indel, title, tag="", save_path=None, yscale_log=False, ylim=None
 ):
-    """Plot indel profile for given indel dataframe"""
-
-    indel_colors = {
-        "1bp Del at Homopolymer C": "#FDBE6E",
-        "1bp Del at Homopolymer T": "#FD7F06",
-        "1bp Ins at Homopolymer C": "#ACDC88",
-        "1bp Ins at Homopolymer T": "#399F31",
-        "2bp Del at Repeats": "#FACAB4",
-        "3bp Del at Repeats": "#FC8A68",
-        "4bp Del at Repeats": "#F14434",
-        "5+bp Del at Repeats": "#BC191C",
-        "2bp Ins at Repeats": "#D0E0F0",
-        "3bp Ins at Repeats": "#94C3E1",
-        "4bp Ins at Repeats": "#4C95C8",
-        "5+bp Ins at Repeats": "#1962A7",
-        "2bp Del at Microhomology": "#E2DFF0",
-        "3bp Del at Microhomology": "#B4B7D8",
-        "4bp Del at Microhomology": "#8584BD",
-        "5+bp Del at Microhomology": "#614099",
-    }
+    """Plot indel profile for given indel dataframe; returns the figure"""
+    import seaborn as sns
 
     df = proc_indel_dataframe(indel)
 
@@ -226,13 +140,13 @@ def plot_indel_spectra(
     font = matplotlib.font_manager.FontProperties()
     font.set_family("monospace")
 
-    for mut_type, mut_type_data in df.groupby(["indel_type"], sort=False):
+    for mut_type, mut_type_data in df.groupby("indel_type", sort=False):
         ax.bar(
             data=mut_type_data,
             x="index",
             height="count",
             label=mut_type,
-            color=indel_colors[mut_type],
+            color=INDEL_COLORS[mut_type],
         )
 
     plt.xlabel("feature length")
@@ -247,13 +161,14 @@ def plot_indel_spectra(
         plt.ylim(ylim)
 
     sns.despine(trim=True)
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
+    return finish_figure(fig, save_path)
 
 
+@instrumented
 def plot_venn2(cmp, weighted=False, label1="A", label2="B", title="", save_path=None):
-    """Draw a venn diagram from a Snv/SvComparison instance"""
+    """Draw a venn diagram from a Snv/SvComparison instance; returns the figure"""
+    from matplotlib_venn import venn2, venn2_unweighted
+
     if title:
         plt.title(title)
     if weighted:
@@ -261,6 +176,187 @@ def plot_venn2(cmp, weighted=False, label1="A", label2="B", title="", save_path=
     else:
         venn2_unweighted([cmp.A, cmp.B], set_labels=(label1, label2))
     plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
+    return finish_figure(plt.gcf(), save_path)
+
+
+SPECTRUM_FIGSIZES = {"snv": (20, 4), "indel": (20, 4.5), "sv": (8, 3.5)}
+SPECTRUM_LEGEND_ANCHORS = {"snv": (1, 1), "indel": (0.86, 1)}
+
+
+def spectrum_template(kind):
+    """Bars of a kind's spectrum: channel table with type, tick and color per label"""
+    if kind not in SPECTRUM_SCHEMAS:
+        raise ValueError(f"unknown spectrum kind {kind!r}")
+    return channel_table(SPECTRUM_SCHEMAS[kind])
+
+
+class SpectraRenderer:
+    """Reusable headless figure that draws many spectra of one kind
+
+    The figure, axes, x ticks, colors and legend are built and rasterized once
+    on a plain Agg canvas (no pyplot state, so it is safe in worker
+    processes). Each PNG then restores that background and redraws only the
+    bars, y axis and title; SVG/PDF pages are drawn in full from the same
+    figure. Close it, or use it as a context manager, when done.
+    kind [str]: element in {'snv', 'indel', 'sv'}
+    """
+
+    def __init__(self, kind, yscale_log=False, ylim=None):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.font_manager import FontProperties
+        from matplotlib.patches import Patch
+
+        template = spectrum_template(kind)
+        self.kind = kind
+        self.labels = template.index
+        self.yscale_log = yscale_log
+        self.ylim = ylim
+        if ylim:
+            assert len(ylim) == 2
+
+        self.fig = Figure(figsize=SPECTRUM_FIGSIZES[kind])
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(1, 1, 1)
+        xs = np.arange(len(template))
+        self.bars = self.ax.bar(xs, np.zeros(len(template)), color=template["color"])
+        font = FontProperties(family="monospace")
+        self.ax.set_xticks(xs)
+        self.ax.set_xticklabels(
+            template["tick"], rotation=0 if kind == "indel" else 90, fontproperties=font
+        )
+        self.ax.set_xlim((-1, len(template)))
+        if kind == "indel":
+            self.ax.set_xlabel("feature length")
+        if kind in SPECTRUM_LEGEND_ANCHORS:
+            groups = template[template["group_start"]]
+            handles = [
+                Patch(color=color, label=group)
+                for group, color in zip(groups["type"], groups["color"])
+            ]
+            self.ax.legend(
+                handles=handles,
+                bbox_to_anchor=SPECTRUM_LEGEND_ANCHORS[kind],
+                loc="upper left",
+            )
+        if yscale_log:
+            self.ax.set_yscale("log")
+        if kind != "sv":
+            # as sns.despine(trim=True), which would also freeze the y ticks;
+            # plain spines spare the workers the seaborn import
+            self.ax.spines[["top", "right"]].set_visible(False)
+            self.ax.spines["bottom"].set_bounds(xs[0], xs[-1])
+        self.title = self.fig.suptitle("")
+        # lay out once, with room for wide y tick labels
+        placeholder_ylim = (0.5, 1e6) if yscale_log else (0, 1e6)
+        self.ax.set_ylim(self.ylim or placeholder_ylim)
+        self.fig.tight_layout()
+
+        # everything else is static: rasterize it once as the PNG background
+        # (spines and legend are redrawn too, to stay on top of the bars)
+        self.dynamic_artists = [
+            *self.bars,
+            self.ax.yaxis,
+            *self.ax.spines.values(),
+            *([self.ax.get_legend()] if self.ax.get_legend() else []),
+            self.title,
+        ]
+        self.set_animated(True)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def set_animated(self, animated):
+        for artist in self.dynamic_artists:
+            artist.set_animated(animated)
+
+    def heights(self, counts):
+        """Bar heights in template order from a count Series or 'count' DataFrame"""
+        if isinstance(counts, pd.DataFrame):
+            counts = counts["count"]
+        return counts.reindex(self.labels, fill_value=0).to_numpy(dtype=float)
+
+    def render(self, counts, title, tag=""):
+        """Update the figure to show counts; returns the matplotlib Figure"""
+        heights = self.heights(counts)
+        for bar, height in zip(self.bars, heights):
+            bar.set_height(height)
+        top = max(heights.max(initial=0), 1)
+        if self.ylim:
+            self.ax.set_ylim(self.ylim)
+        elif self.yscale_log:
+            self.ax.set_ylim((0.5, top * 2))
+        else:
+            self.ax.set_ylim((0, top * 1.05))
+        if self.kind != "sv":
+            # trim the y spine to the outer ticks, as sns.despine(trim=True)
+            lower, upper = self.ax.get_ylim()
+            ticks = self.ax.get_yticks()
+            ticks = ticks[(ticks >= lower) & (ticks <= upper)]
+            if ticks.shape[0]:
+                self.ax.spines["left"].set_bounds(ticks[0], ticks[-1])
+        self.title.set_text(f"{title} {tag}" if tag else title)
+        return self.fig
+
+    def save(self, counts, title, save_path, tag=""):
+        """Render and write one spectrum; the format follows save_path's suffix"""
+        self.render(counts, title, tag=tag)
+        if str(save_path).lower().endswith(".png"):
+            from matplotlib.image import imsave
+
+            self.canvas.restore_region(self.background)
+            for artist in self.dynamic_artists:
+                self.fig.draw_artist(artist)
+            imsave(save_path, np.asarray(self.canvas.buffer_rgba()), dpi=self.fig.dpi)
+        else:
+            self.save_vector(save_path)
+
+    def save_vector(self, save_path, **kwargs):
+        # animated artists are skipped by full draws, so switch them off
+        self.set_animated(False)
+        try:
+            self.fig.savefig(save_path, **kwargs)
+        finally:
+            self.set_animated(True)
+
+    def save_pdf(self, counts_matrix, pdf_path):
+        """Write a samples x channels matrix as a multi-page PDF, one page per row"""
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        with PdfPages(pdf_path) as pdf:
+            for sample, counts in counts_matrix.iterrows():
+                self.render(counts, str(sample))
+                self.save_vector(pdf, format="pdf")
+
+    def close(self):
+        """Release the figure"""
+        self.fig.clear()
+        self.bars = self.dynamic_artists = self.background = None
+
+
+@instrumented
+def save_spectra(counts_matrix, kind, out_dir, fmt="png", **kwargs):
+    """Write one <sample>.<kind>.<fmt> spectrum per row of counts_matrix
+
+    fmt [str]: 'png', 'svg' or 'pdf' per sample, or 'multipdf' for a single
+        <kind>_spectra.pdf with one page per sample
+    kwargs: passed to SpectraRenderer (yscale_log, ylim)
+    returns: list of written paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    with SpectraRenderer(kind, **kwargs) as renderer:
+        if fmt == "multipdf":
+            pdf_path = os.path.join(out_dir, f"{kind}_spectra.pdf")
+            renderer.save_pdf(counts_matrix, pdf_path)
+            return [pdf_path]
+        paths = []
+        for sample, counts in counts_matrix.iterrows():
+            path = os.path.join(out_dir, f"{sample}.{kind}.{fmt}")
+            renderer.save(counts, str(sample), path)
+            paths.append(path)
+    return paths
@@ -1,17 +1,25 @@
-import uuid
 import os
-import subprocess
+import tempfile
+import warnings
 import pandas as pd
 import numpy as np
-from pyfaidx import Fasta
-from SigProfilerMatrixGenerator.scripts import SigProfilerMatrixGeneratorFunc as matGen
+from dvartk.channels import (
+    DBS78_ALTS,
+    DBS78_LABELS,
+    ID83_LABELS,
+    SBS1536_LABELS,
+    SBS192_LABELS,
+    SBS96_LABELS,
+    SBS96_TYPES,
+    SV_SCHEMA,
+)
+from dvartk.regions import merge_regions, overlaps_regions, read_bed
+from dvartk.instrument import instrumented
+from dvartk.reference import ReferenceCache, decode_bases, encode_bases
 
 
 def construct_empty_count_series():
-    snvs = ["C>A", "C>G", "C>T", "T>A", "T>C", "T>G"]
-    nts = ["A", "C", "G", "T"]
-    terms = ["{}[{}]{}".format(l, s, r) for s in snvs for l in nts for r in nts]
-    return pd.Series(np.zeros(len(terms), dtype=int), index=terms)
+    return pd.Series(np.zeros(len(SBS96_LABELS), dtype=int), index=SBS96_LABELS)
 
 
 def normalize_snv(context, alt):
@@ -35,8 +43,467 @@ def construct_snv_label(context, alt):
     return "{}[{}>{}]{}".format(context[0], context[1], alt, context[2])
 
 
-def count_svs(maf):
-    """Convert maf to count table as according to palimpsest"""
+COMPLEMENT_CODES = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+
+
+def construct_snv_channel_table():
+    """Lookup table from (left, ref, right, alt) base codes to the index of the
+    normalized trinucleotide label in construct_empty_count_series; -1 if invalid
+    """
+    nts = "ACGT"
+    complement = {"A": "T", "C": "G", "G": "C", "T": "A"}
+    label_index = {
+        label: ix for ix, label in enumerate(construct_empty_count_series().index)
+    }
+    table = np.full((5, 5, 5, 5), -1, dtype=np.int64)
+    for l, m, r, a in np.ndindex(4, 4, 4, 4):
+        context, alt = nts[l] + nts[m] + nts[r], nts[a]
+        if context[1] in ("A", "G"):
+            context = "".join(complement[b] for b in reversed(context))
+            alt = complement[alt]
+        label = "{}[{}>{}]{}".format(context[0], context[1], alt, context[2])
+        table[l, m, r, a] = label_index.get(label, -1)
+    return table
+
+
+SNV_CHANNEL_TABLE = construct_snv_channel_table()
+
+
+def encode_alleles(alleles):
+    """Encode single-base alleles to base codes; multi-base or missing alleles get 4"""
+    alleles = pd.Series(alleles, copy=False)
+    if isinstance(alleles.dtype, pd.CategoricalDtype):
+        # encode each category once
+        codes = np.append(encode_alleles(alleles.cat.categories), np.uint8(4))
+        return codes[alleles.cat.codes.to_numpy()]
+    alleles = alleles.astype(str)
+    first = alleles.str[:1].str.ljust(1, "N").str.cat()
+    codes = encode_bases(first)
+    codes[alleles.str.len().to_numpy() != 1] = 4
+    return codes
+
+
+def fetch_codes(genome, chrom, start, end):
+    """Base codes of 0-based half-open [start, end) of chrom
+
+    genome: pyfaidx.Fasta or dvartk.reference.ReferenceCache
+    """
+    if isinstance(genome, ReferenceCache):
+        return genome.codes(chrom, start, end)
+    return encode_bases(genome[chrom][start:end].seq)
+
+
+def gather_context_codes(snvs, genome, flank=1):
+    """Base codes of the (2 * flank + 1)-mer context around each variant position
+
+    Each chromosome is fetched once and contexts are gathered by fancy indexing;
+    returns a (n, 2 * flank + 1) uint8 array in snvs row order, where positions
+    outside the fetched sequence are coded as 4 (N).
+    """
+    width = 2 * flank + 1
+    contexts = np.full((snvs.shape[0], width), 4, dtype=np.uint8)
+    positions = snvs["pos"].to_numpy(dtype=np.int64)
+    offsets = np.arange(-flank - 1, flank, dtype=np.int64)  # 0-based
+    groups = snvs.groupby("chrom", sort=False, observed=True).indices
+    for chrom, rows in groups.items():
+        if chrom not in genome:
+            warnings.warn("Warning: chromosome {} not in genome".format(chrom))
+            continue
+        pos = positions[rows]
+        start = max(int(pos.min()) - flank - 1, 0)
+        end = int(pos.max()) + flank
+        seq = fetch_codes(genome, chrom, start, end)
+        ixs = pos[:, None] + offsets[None, :] - start
+        inside = (ixs >= 0) & (ixs < seq.shape[0])
+        codes = np.full(ixs.shape, 4, dtype=np.uint8)
+        codes[inside] = seq[ixs[inside]]
+        contexts[rows] = codes
+    return contexts
+
+
+def snv_channel_codes(snvs, genome):
+    """Index into construct_empty_count_series for each SNV; -1 if not countable"""
+    contexts = gather_context_codes(snvs, genome, flank=1)
+    alts = encode_alleles(snvs["alt"])
+    return SNV_CHANNEL_TABLE[contexts[:, 0], contexts[:, 1], contexts[:, 2], alts]
+
+
+@instrumented
+def count_snvs(snvs, genome):
+    """Convert maf form to count table per variant type. Requires 'genome'
+
+    genome: pyfaidx.Fasta or dvartk.reference.ReferenceCache
+
+    Vectorized equivalent of count_snvs_naive: contexts are gathered per
+    chromosome and binned with np.bincount. Soft-masked (lowercase) reference
+    bases are treated as upper case.
+    """
+    counts = construct_empty_count_series()
+    channels = snv_channel_codes(snvs, genome)
+
+    valid = channels >= 0
+    if not valid.all():
+        skipped = snvs.loc[~valid, ["chrom", "pos"]]
+        warnings.warn(
+            "Warning: skipped {} SNVs with N or invalid context, e.g. {}".format(
+                skipped.shape[0],
+                ", ".join(f"{c}:{p}" for c, p in skipped.head(3).to_numpy()),
+            )
+        )
+    counts[:] = np.bincount(channels[valid], minlength=counts.shape[0])
+    return counts
+
+
+def construct_sbs_type_table():
+    """(pyrimidine ref, alt) base codes to the SBS96_TYPES index; -1 if invalid"""
+    table = np.full((5, 5), -1, dtype=np.int64)
+    for ix, snv in enumerate(SBS96_TYPES):
+        table["ACGT".index(snv[0]), "ACGT".index(snv[2])] = ix
+    return table
+
+
+def construct_dbs_channel_table():
+    """(ref1, ref2, alt1, alt2) base codes to the DBS78_LABELS index; -1 if invalid"""
+    label_index = {label: ix for ix, label in enumerate(DBS78_LABELS)}
+    complement = dict(zip("ACGT", "TGCA"))
+
+    def reverse_complement(bases):
+        return "".join(complement[base] for base in reversed(bases))
+
+    table = np.full((5, 5, 5, 5), -1, dtype=np.int64)
+    for r1, r2, a1, a2 in np.ndindex(4, 4, 4, 4):
+        if r1 == a1 or r2 == a2:
+            continue
+        ref, alt = "ACGT"[r1] + "ACGT"[r2], "ACGT"[a1] + "ACGT"[a2]
+        if ref not in DBS78_ALTS:
+            ref, alt = reverse_complement(ref), reverse_complement(alt)
+        if alt not in DBS78_ALTS[ref]:  # palindromic reference
+            alt = reverse_complement(alt)
+        table[r1, r2, a1, a2] = label_index[f"{ref}>{alt}"]
+    return table
+
+
+SBS_TYPE_TABLE = construct_sbs_type_table()
+DBS_CHANNEL_TABLE = construct_dbs_channel_table()
+SNV_SPECTRA = {
+    "SBS96": SBS96_LABELS,
+    "SBS192": SBS192_LABELS,
+    "SBS1536": SBS1536_LABELS,
+    "DBS78": DBS78_LABELS,
+}
+
+
+def sbs_channel_codes(contexts, alts):
+    """SBS channel per variant from its (n, 2 * flank + 1) context codes
+
+    Contexts with a purine reference are reverse complemented; the channel
+    is the SBS96_TYPES index followed by the flanking bases, outermost left
+    first, as base-4 digits: SBS96 for flank 1, SBS1536 for flank 2. Returns
+    -1 for N in the context or an alt that is not a substitution.
+    """
+    flank = contexts.shape[1] // 2
+    purine = (contexts[:, flank] == 0) | (contexts[:, flank] == 2)
+    oriented = np.where(purine[:, None], COMPLEMENT_CODES[contexts[:, ::-1]], contexts)
+    alts = np.where(purine, COMPLEMENT_CODES[alts], alts)
+    types = SBS_TYPE_TABLE[oriented[:, flank], alts]
+    flanks = np.delete(oriented, flank, axis=1).astype(np.int64)
+    channels = types
+    for column in flanks.T:
+        channels = channels * 4 + column
+    valid = (types >= 0) & (flanks < 4).all(axis=1)
+    return np.where(valid, channels, -1)
+
+
+def gene_strands(snvs, genes):
+    """+1/-1 per SNV inside genes of one strand only, 0 elsewhere
+
+    genes: chrom/start/end/strand table (0-based half-open) or stranded BED path
+    """
+    if isinstance(genes, (str, os.PathLike)):
+        genes = read_bed(genes, strand=True)
+    positions = snvs["pos"].to_numpy(dtype=np.int64)
+    chroms = snvs["chrom"].to_numpy(dtype=object)
+    plus, minus = [
+        overlaps_regions(
+            chroms,
+            positions - 1,
+            positions,
+            merge_regions(genes[genes["strand"] == sign]),
+        )
+        for sign in "+-"
+    ]
+    return plus.astype(np.int64) - minus.astype(np.int64)
+
+
+def allele_lengths(alleles):
+    """Length of each allele; categorical alleles are measured per category"""
+    alleles = pd.Series(alleles, copy=False)
+    if isinstance(alleles.dtype, pd.CategoricalDtype):
+        lengths = alleles.cat.categories.astype(str).str.len().to_numpy()
+        return np.append(lengths, 0)[alleles.cat.codes.to_numpy()]
+    return alleles.astype(str).str.len().to_numpy()
+
+
+def find_doublets(chroms, positions, samples, candidates):
+    """First rows of runs of exactly two adjacent candidate SNVs, and all run rows
+
+    Runs are consecutive positions on one chromosome of one sample; rows in
+    runs of three or more are MNVs, consumed but not returned as doublets.
+    returns: (first row of each doublet, mask of rows in any run)
+    """
+    rows = np.flatnonzero(candidates)
+    chrom_codes = pd.factorize(pd.Series(chroms[rows], copy=False))[0]
+    order = rows[np.lexsort((positions[rows], chrom_codes, samples[rows]))]
+    adjacent = (
+        (np.diff(positions[order]) == 1)
+        & (np.diff(samples[order]) == 0)
+        & (chroms[order][1:] == chroms[order][:-1])
+    )
+    before = np.concatenate([[False], adjacent[:-1]])
+    after = np.concatenate([adjacent[1:], [False]])
+    in_run = np.zeros(positions.shape[0], dtype=bool)
+    in_run[order[:-1][adjacent]] = True
+    in_run[order[1:][adjacent]] = True
+    doublet = adjacent & ~before & ~after
+    return order[:-1][doublet], order[1:][doublet], in_run
+
+
+def bin_channels(channels, sample_codes, n_samples, n_channels):
+    """n_samples x n_channels counts of the valid (>= 0) channels"""
+    valid = channels >= 0
+    flat = sample_codes[valid] * n_channels + channels[valid]
+    counts = np.bincount(flat, minlength=n_samples * n_channels)
+    return counts.reshape(n_samples, n_channels)
+
+
+@instrumented
+def count_snv_spectra(
+    snvs, genome, spectra=("SBS96",), genes=None, sample_col=None, doublets=True
+):
+    """Several SNV spectra from one context fetch per variant
+
+    snvs: chrom, pos, alt (and ref) table; single-base alts are SNVs, rows with
+        2-base ref and alt are doublets; DBS78 needs the ref column
+    genome: pyfaidx.Fasta or dvartk.reference.ReferenceCache
+    spectra: any of 'SBS96', 'SBS192', 'SBS1536' and 'DBS78'
+    genes: chrom/start/end/strand table or stranded BED path, needed for
+        SBS192; SNVs in genes of one strand are counted as transcribed (T) or
+        untranscribed (U), as SigProfiler does, others are left out
+    sample_col [str]: count per value of this column
+    doublets [bool]: runs of exactly two adjacent SNVs in a sample are
+        doublets (counted in DBS78), and SNVs in any adjacent run are left
+        out of the SBS spectra, whichever spectra are requested; with False
+        every SNV is counted in the SBS spectra
+    The widest context any spectrum needs (5 bases for SBS1536, else 3) is
+    gathered once per chromosome and all spectra are derived from it.
+    returns: {spectrum: Series indexed by channel label}, or samples x
+        channels DataFrames with sample_col
+    """
+    unknown = set(spectra) - set(SNV_SPECTRA)
+    if unknown:
+        raise ValueError(
+            f"unknown spectra {sorted(unknown)}; known: {list(SNV_SPECTRA)}"
+        )
+    if "SBS192" in spectra and genes is None:
+        raise ValueError("SBS192 needs genes with strands")
+    if "DBS78" in spectra and "ref" not in snvs.columns:
+        raise ValueError("DBS78 needs a ref column")
+
+    flank = 2 if "SBS1536" in spectra else 1
+    contexts = gather_context_codes(snvs, genome, flank=flank)
+    alts = pd.Series(snvs["alt"], copy=False)
+    alt_lengths = allele_lengths(alts)
+    if sample_col is None:
+        sample_codes, samples = np.zeros(snvs.shape[0], dtype=np.int64), None
+    else:
+        sample_codes, samples = pd.factorize(snvs[sample_col])
+    n_samples = 1 if samples is None else len(samples)
+
+    is_snv = alt_lengths == 1
+    alt_codes = encode_alleles(alts)  # 4 unless a single base
+    counts = {}
+    firsts = seconds = np.zeros(0, dtype=np.int64)
+    if doublets:
+        positions = snvs["pos"].to_numpy(dtype=np.int64)
+        chroms = snvs["chrom"].to_numpy(dtype=object)
+        firsts, seconds, in_run = find_doublets(chroms, positions, sample_codes, is_snv)
+        is_snv &= ~in_run
+    if "DBS78" in spectra:
+        # 2-base substitutions given as one row
+        ref_lengths = allele_lengths(snvs["ref"])
+        mnvs = np.flatnonzero((alt_lengths == 2) & (ref_lengths == 2))
+        mnv_alts = alts.iloc[mnvs].astype(str)
+        doublet_rows = np.concatenate([firsts, mnvs])
+        channels = DBS_CHANNEL_TABLE[
+            contexts[doublet_rows, flank],
+            contexts[doublet_rows, flank + 1],
+            np.concatenate([alt_codes[firsts], encode_alleles(mnv_alts.str[:1])]),
+            np.concatenate([alt_codes[seconds], encode_alleles(mnv_alts.str[1:2])]),
+        ]
+        counts["DBS78"] = bin_channels(
+            channels, sample_codes[doublet_rows], n_samples, len(DBS78_LABELS)
+        )
+
+    snv_rows = np.flatnonzero(is_snv)
+    trinucleotides = contexts[snv_rows, flank - 1 : flank + 2]
+    sbs96 = sbs_channel_codes(trinucleotides, alt_codes[snv_rows])
+    skipped = int((sbs96 < 0).sum())
+    if skipped:
+        warnings.warn(f"Warning: skipped {skipped} SNVs with N or invalid context")
+    if "SBS96" in spectra:
+        counts["SBS96"] = bin_channels(
+            sbs96, sample_codes[snv_rows], n_samples, len(SBS96_LABELS)
+        )
+    if "SBS1536" in spectra:
+        channels = sbs_channel_codes(contexts[snv_rows], alt_codes[snv_rows])
+        counts["SBS1536"] = bin_channels(
+            channels, sample_codes[snv_rows], n_samples, len(SBS1536_LABELS)
+        )
+    if "SBS192" in spectra:
+        strands = gene_strands(snvs.iloc[snv_rows], genes)
+        purine = np.isin(trinucleotides[:, 1], [0, 2])
+        # a pyrimidine reference on the gene's strand is untranscribed (1)
+        untranscribed = np.where(strands > 0, ~purine, purine).astype(np.int64)
+        channels = np.where(
+            (strands != 0) & (sbs96 >= 0), untranscribed * len(SBS96_LABELS) + sbs96, -1
+        )
+        counts["SBS192"] = bin_channels(
+            channels, sample_codes[snv_rows], n_samples, len(SBS192_LABELS)
+        )
+
+    result = {}
+    for name in spectra:
+        labels = SNV_SPECTRA[name]
+        if samples is None:
+            result[name] = pd.Series(counts[name][0], index=labels)
+        else:
+            index = pd.Index(samples, name=sample_col)
+            result[name] = pd.DataFrame(counts[name], index=index, columns=labels)
+    return result
+
+
+# bit layout of the (chromosome, position, alt) site keys of count_snvs_cohort
+SITE_POS_SHIFT = 3
+SITE_CHROM_SHIFT = 40
+
+
+def iter_frames(snvs):
+    if isinstance(snvs, pd.DataFrame):
+        yield snvs
+    else:
+        yield from snvs
+
+
+def global_codes(values, index):
+    """Codes of values in index (a dict of value -> code), extending it"""
+    codes, uniques = pd.factorize(pd.Series(values, copy=False), sort=False)
+    lookup = np.array(
+        [index.setdefault(value, len(index)) for value in uniques], dtype=np.int64
+    )
+    return lookup[codes]
+
+
+@instrumented
+def count_snvs_cohort(snvs, genome, sample_col="sample", samples=None):
+    """samples x 96 SBS counts of a long SNV table with a sample column
+
+    snvs: DataFrame of chrom, pos, alt and sample_col columns, or an iterable
+        of such DataFrames (e.g. SnvFileConfig.iter_converted_chunks) to count
+        chunk by chunk
+    genome: pyfaidx.Fasta or dvartk.reference.ReferenceCache
+    samples: row order of the result; samples without SNVs get zero rows
+        [default: order of first appearance]
+    Distinct (chrom, pos, alt) sites are resolved to a channel once, however
+    many samples or chunks carry them, and every row is then scattered into
+    one flat samples x channels np.bincount. Beyond the chunk in hand, memory
+    follows the number of distinct sites and samples.
+    returns: DataFrame indexed by sample with SBS96 label columns
+    """
+    n_channels = len(SBS96_LABELS)
+    sample_index = {
+        sample: ix for ix, sample in enumerate([] if samples is None else samples)
+    }
+    chrom_index = {}
+    chrom_names = []
+    site_keys = np.zeros(0, dtype=np.int64)  # sorted
+    site_channels = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(0, dtype=np.int64)
+    n_skipped = 0
+
+    for chunk in iter_frames(snvs):
+        if chunk.shape[0] == 0:
+            continue
+        chrom_codes = global_codes(chunk["chrom"], chrom_index)
+        chrom_names = list(chrom_index)
+        keys = (
+            (chrom_codes << SITE_CHROM_SHIFT)
+            | (chunk["pos"].to_numpy(dtype=np.int64) << SITE_POS_SHIFT)
+            | encode_alleles(chunk["alt"]).astype(np.int64)
+        )
+        rows_site, keys = pd.factorize(keys)
+        known = np.searchsorted(site_keys, keys)
+        is_known = np.zeros(keys.shape[0], dtype=bool)
+        in_range = known < site_keys.shape[0]
+        is_known[in_range] = site_keys[known[in_range]] == keys[in_range]
+        channels = np.empty(keys.shape[0], dtype=np.int64)
+        channels[is_known] = site_channels[known[is_known]]
+
+        new_keys = keys[~is_known]
+        if new_keys.shape[0]:
+            sites = pd.DataFrame(
+                {
+                    "chrom": np.asarray(chrom_names, dtype=object)[
+                        new_keys >> SITE_CHROM_SHIFT
+                    ],
+                    "pos": (new_keys >> SITE_POS_SHIFT)
+                    & ((1 << (SITE_CHROM_SHIFT - SITE_POS_SHIFT)) - 1),
+                }
+            )
+            contexts = gather_context_codes(sites, genome, flank=1)
+            alts = new_keys & ((1 << SITE_POS_SHIFT) - 1)
+            channels[~is_known] = SNV_CHANNEL_TABLE[
+                contexts[:, 0], contexts[:, 1], contexts[:, 2], alts
+            ]
+            order = np.argsort(np.concatenate([site_keys, new_keys]), kind="stable")
+            site_keys = np.concatenate([site_keys, new_keys])[order]
+            site_channels = np.concatenate([site_channels, channels[~is_known]])[order]
+
+        row_channels = channels[rows_site]
+        sample_codes = global_codes(chunk[sample_col], sample_index)
+        valid = row_channels >= 0
+        n_skipped += int((~valid).sum())
+        flat = sample_codes[valid] * n_channels + row_channels[valid]
+        chunk_counts = np.bincount(flat, minlength=len(sample_index) * n_channels)
+        chunk_counts[: counts.shape[0]] += counts
+        counts = chunk_counts
+
+    if n_skipped:
+        warnings.warn(
+            "Warning: skipped {} SNVs with N or invalid context".format(n_skipped)
+        )
+    counts = np.pad(counts, (0, len(sample_index) * n_channels - counts.shape[0]))
+    return pd.DataFrame(
+        counts.reshape(len(sample_index), n_channels),
+        index=pd.Index(list(sample_index), name=sample_col),
+        columns=SBS96_LABELS,
+    )
+
+
+@instrumented
+def count_svs(maf, schema=SV_SCHEMA, by=None):
+    """Convert maf to count table as according to palimpsest
+
+    schema: dvartk.channels.SvChannelSchema with the SV types and length bins
+    by [str]: if given, count per value of this column (e.g. sample) at once
+    returns: Series indexed by schema.labels, or a groups x labels DataFrame
+    """
+    if by is not None:
+        return schema.count_grouped(maf, by)
+    return schema.count(maf)
+
+
+def count_svs_naive(maf):
+    """String-label reference implementation of count_svs, kept for validation"""
 
     svtypes = ["del", "dup", "ins", "inv", "translocation"]
 
@@ -66,127 +533,234 @@ def count_svs(maf):
     return sv_counts
 
 
-def count_indels(df, genome_version="GRCh37"):
+ID83_INDEX = {label: ix for ix, label in enumerate(ID83_LABELS)}
+ID83_MH_OFFSETS = np.array([0, 0, 72, 73, 75, 78])  # first *:Del:M:1 index by length
+
+
+def anchor_maf_indels(df, genome):
+    """Convert MAF-style indels ('-' alleles) to VCF style with an anchor base
+
+    MAF deletions start at the first deleted base and insertions at the base
+    before the inserted sequence; rows without '-' alleles are left unchanged.
+    """
+    df = df.copy()
+    refs = df["ref"].astype(str).to_numpy(dtype=object)
+    alts = df["alt"].astype(str).to_numpy(dtype=object)
+    is_del, is_ins = alts == "-", refs == "-"
+    positions = df["pos"].to_numpy(dtype=np.int64)
+    positions = np.where(is_del, positions - 1, positions)
+
+    anchors = np.full(df.shape[0], "N", dtype=object)
+    chroms = pd.Series(df["chrom"].to_numpy(), copy=False)
+    for chrom, rows in chroms.groupby(chroms, sort=False).indices.items():
+        rows = rows[is_del[rows] | is_ins[rows]]
+        if rows.shape[0] == 0 or chrom not in genome:
+            continue
+        start = max(int(positions[rows].min()) - 1, 0)
+        seq = fetch_codes(genome, chrom, start, int(positions[rows].max()))
+        ixs = np.clip(positions[rows] - 1 - start, 0, max(seq.shape[0] - 1, 0))
+        anchors[rows] = list(decode_bases(seq[ixs])) if seq.shape[0] else "N"
+
+    df["pos"] = positions
+    df["ref"] = np.where(is_del, anchors + refs, np.where(is_ins, anchors, refs))
+    df["alt"] = np.where(is_ins, anchors + alts, np.where(is_del, anchors, alts))
+    return df
+
+
+def count_repeat_units(seq, units, starts, step, max_copies=5):
+    """Number of consecutive copies of each unit in seq, up to max_copies
+
+    seq: base codes of one chromosome span; units: (n, L) base codes;
+    starts: 0-based start of the first copy to test; step: +1 to walk right,
+    -1 to walk left (the k-th copy then starts at starts - (k - 1) * L)
+    """
+    n, length = units.shape
+    copies = np.zeros(n, dtype=np.int64)
+    extending = np.ones(n, dtype=bool)
+    offsets = np.arange(length)
+    for k in range(max_copies):
+        ixs = (starts + step * k * length)[:, None] + offsets[None, :]
+        inside = (ixs >= 0) & (ixs < seq.shape[0])
+        window = np.full(ixs.shape, 4, dtype=np.uint8)
+        window[inside] = seq[ixs[inside]]
+        extending &= (window == units).all(axis=1)
+        if not extending.any():
+            break
+        copies += extending
+    return copies
+
+
+def count_homology(seq, units, starts, step):
+    """Microhomology length between each unit and its flank, up to L - 1 bases
+
+    step=+1 compares the unit prefix with seq from starts onwards; step=-1
+    compares the unit suffix with seq ending just before starts.
+    """
+    n, length = units.shape
+    if length < 2:
+        return np.zeros(n, dtype=np.int64)
+    if step > 0:
+        ixs = starts[:, None] + np.arange(length - 1)[None, :]
+        bases = units[:, : length - 1]
+    else:
+        ixs = starts[:, None] - 1 - np.arange(length - 1)[None, :]
+        bases = units[:, :0:-1]
+    inside = (ixs >= 0) & (ixs < seq.shape[0])
+    window = np.full(ixs.shape, 4, dtype=np.uint8)
+    window[inside] = seq[ixs[inside]]
+    return np.cumprod(window == bases, axis=1).sum(axis=1)
+
+
+def classify_indel_group(seq, anchors, units, is_del):
+    """ID83 channel indices for indels sharing one unit length on one chromosome
+
+    anchors: 0-based index right after the VCF anchor base; units: (n, L)
+    base codes of the deleted or inserted sequence
+    """
+    length = units.shape[1]
+    left = count_repeat_units(seq, units, anchors - length, -1)
+    right_starts = np.where(is_del, anchors + length, anchors)
+    right = count_repeat_units(seq, units, right_starts, +1)
+    repeats = np.minimum(left + right, 5)
+
+    if length == 1:
+        is_c = (units[:, 0] == 1) | (units[:, 0] == 2)
+        block = np.where(is_del, 0, 12) + np.where(is_c, 0, 6)
+        return block + repeats
+
+    size = min(length, 5)
+    channels = np.where(is_del, 24, 48) + (size - 2) * 6 + repeats
+    candidates = is_del & (repeats == 0)
+    if candidates.any():
+        homology = np.maximum(
+            count_homology(seq, units, anchors + length, +1),
+            count_homology(seq, units, anchors, -1),
+        )
+        microhomology = candidates & (homology > 0)
+        channels[microhomology] = (
+            ID83_MH_OFFSETS[size] + np.minimum(homology[microhomology], 5) - 1
+        )
+    return channels
+
+
+@instrumented
+def classify_indels(df, genome):
+    """ID83 channel index (into ID83_LABELS) for each indel; -1 if not classifiable
+
+    Follows SigProfilerMatrixGenerator's ID83 rules: repeat units are counted on
+    both sides of the indel, microhomology only for deletions without repeats,
+    and insertions with microhomology fall into *:Ins:R:0. Complex indels,
+    non-ACGT alleles and anchors not matching the reference get -1.
+    df: chrom, pos (1-based VCF anchor position), ref, alt columns
+    genome: pyfaidx.Fasta or dvartk.reference.ReferenceCache
+    """
+    channels = np.full(df.shape[0], -1, dtype=np.int64)
+    if df.shape[0] == 0:
+        return channels
+    refs = df["ref"].astype(str).str.upper().to_numpy()
+    alts = df["alt"].astype(str).str.upper().to_numpy()
+    ref_lengths = np.fromiter(map(len, refs), dtype=np.int64, count=len(refs))
+    alt_lengths = np.fromiter(map(len, alts), dtype=np.int64, count=len(alts))
+    # the shared first base is the VCF anchor; anything else is complex
+    anchored = pd.Series(refs).str[0].to_numpy() == pd.Series(alts).str[0].to_numpy()
+    is_del = (alt_lengths == 1) & (ref_lengths > 1) & anchored
+    is_ins = (ref_lengths == 1) & (alt_lengths > 1) & anchored
+    units = np.where(is_del, refs, alts)
+    units = np.array([unit[1:] for unit in units], dtype=object)
+    valid = (is_del | is_ins) & pd.Series(refs + alts).str.fullmatch(
+        "[ACGT]+"
+    ).to_numpy()
+
+    positions = df["pos"].to_numpy(dtype=np.int64)
+    chroms = df["chrom"].to_numpy()
+    lengths = np.where(is_del, ref_lengths, alt_lengths) - 1
+    groups = pd.DataFrame({"chrom": chroms, "valid": valid}).groupby(
+        "chrom", sort=False, observed=True
+    )
+    for chrom, rows in groups.indices.items():
+        rows = rows[valid[rows]]
+        if rows.shape[0] == 0:
+            continue
+        if chrom not in genome:
+            warnings.warn("Warning: chromosome {} not in genome".format(chrom))
+            continue
+        # repeat units are walked up to 5 copies left of the anchor and right
+        # of the deleted bases, so fetch only the span those walks can reach
+        anchors, reach = positions[rows], 5 * lengths[rows]
+        start = max(int((anchors - 1 - reach).min()), 0)
+        end = int((anchors + lengths[rows] + reach).max())
+        seq = fetch_codes(genome, chrom, start, end)
+        anchors = anchors - start
+        inside = (anchors >= 1) & (anchors <= seq.shape[0])
+        anchor_codes = np.full(rows.shape[0], 4, dtype=np.uint8)
+        anchor_codes[inside] = seq[anchors[inside] - 1]
+        ref_codes = encode_bases("".join(ref[0] for ref in refs[rows]))
+        rows = rows[anchor_codes == ref_codes]
+        for length in np.unique(lengths[rows]):
+            group = rows[lengths[rows] == length]
+            group_units = encode_bases("".join(units[group])).reshape(-1, length)
+            channels[group] = classify_indel_group(
+                seq, positions[group] - start, group_units, is_del[group]
+            )
+    return channels
+
+
+@instrumented
+def count_indels(df, genome_version="GRCh37", genome=None):
     """df: pandas DataFrame of chrom, pos, ref, alt columns
     - chrom [str]: chromosome ID, e.g. 'chr1', '1'
     - pos [int]: 1-based VCF format indel coordinate
     - ref: VCF format indel reference
     - alt: VCF format indel alteration
-    genome_version [str]: element in {'GRCh37', 'GRCh38'}
-    """
-    ixs = [
-        "1:Del:C:0",
-        "1:Del:C:1",
-        "1:Del:C:2",
-        "1:Del:C:3",
-        "1:Del:C:4",
-        "1:Del:C:5",
-        "1:Del:T:0",
-        "1:Del:T:1",
-        "1:Del:T:2",
-        "1:Del:T:3",
-        "1:Del:T:4",
-        "1:Del:T:5",
-        "1:Ins:C:0",
-        "1:Ins:C:1",
-        "1:Ins:C:2",
-        "1:Ins:C:3",
-        "1:Ins:C:4",
-        "1:Ins:C:5",
-        "1:Ins:T:0",
-        "1:Ins:T:1",
-        "1:Ins:T:2",
-        "1:Ins:T:3",
-        "1:Ins:T:4",
-        "1:Ins:T:5",
-        "2:Del:R:0",
-        "2:Del:R:1",
-        "2:Del:R:2",
-        "2:Del:R:3",
-        "2:Del:R:4",
-        "2:Del:R:5",
-        "3:Del:R:0",
-        "3:Del:R:1",
-        "3:Del:R:2",
-        "3:Del:R:3",
-        "3:Del:R:4",
-        "3:Del:R:5",
-        "4:Del:R:0",
-        "4:Del:R:1",
-        "4:Del:R:2",
-        "4:Del:R:3",
-        "4:Del:R:4",
-        "4:Del:R:5",
-        "5:Del:R:0",
-        "5:Del:R:1",
-        "5:Del:R:2",
-        "5:Del:R:3",
-        "5:Del:R:4",
-        "5:Del:R:5",
-        "2:Ins:R:0",
-        "2:Ins:R:1",
-        "2:Ins:R:2",
-        "2:Ins:R:3",
-        "2:Ins:R:4",
-        "2:Ins:R:5",
-        "3:Ins:R:0",
-        "3:Ins:R:1",
-        "3:Ins:R:2",
-        "3:Ins:R:3",
-        "3:Ins:R:4",
-        "3:Ins:R:5",
-        "4:Ins:R:0",
-        "4:Ins:R:1",
-        "4:Ins:R:2",
-        "4:Ins:R:3",
-        "4:Ins:R:4",
-        "4:Ins:R:5",
-        "5:Ins:R:0",
-        "5:Ins:R:1",
-        "5:Ins:R:2",
-        "5:Ins:R:3",
-        "5:Ins:R:4",
-        "5:Ins:R:5",
-        "2:Del:M:1",
-        "3:Del:M:1",
-        "3:Del:M:2",
-        "4:Del:M:1",
-        "4:Del:M:2",
-        "4:Del:M:3",
-        "5:Del:M:1",
-        "5:Del:M:2",
-        "5:Del:M:3",
-        "5:Del:M:4",
-        "5:Del:M:5",
-    ]
-    empty_df = pd.DataFrame(0, index=ixs, columns=["count"])
-    tmp_dirname = f"_{str(uuid.uuid4())}"
-    if not os.path.exists(tmp_dirname):
-        subprocess.run(["mkdir", tmp_dirname])
-    df["ID"] = "."
-    df = df[["chrom", "pos", "ID", "ref", "alt"]]
+    genome_version [str]: element in {'GRCh37', 'GRCh38'}, for the fallback only
+    genome: pyfaidx.Fasta or dvartk.reference.ReferenceCache; indels are then
+        classified in-process by classify_indels. If None, falls back to
+        count_indels_sigprofiler with SigProfiler's installed reference
+    returns: DataFrame with ID83_LABELS index and a 'count' column
+    """
+    if genome is None:
+        return count_indels_sigprofiler(df, genome_version=genome_version)
+    channels = classify_indels(df, genome)
+    skipped = int((channels < 0).sum())
+    if skipped:
+        warnings.warn("Warning: skipped {} complex or unmatched indels".format(skipped))
+    counts = np.bincount(channels[channels >= 0], minlength=len(ID83_LABELS))
+    return pd.DataFrame({"count": counts}, index=ID83_LABELS)
+
+
+@instrumented
+def count_indels_sigprofiler(df, genome_version="GRCh37"):
+    """Count indels with SigProfilerMatrixGenerator in a temporary directory
+
+    Reference implementation for count_indels; needs SigProfiler's installed
+    genome_version reference and is much slower.
+    """
+    from SigProfilerMatrixGenerator.scripts import (
+        SigProfilerMatrixGeneratorFunc as matGen,
+    )
+
+    empty_df = pd.DataFrame(0, index=ID83_LABELS, columns=["count"])
+    if df.shape[0] == 0:
+        return empty_df
+    df = df.assign(ID=".")[["chrom", "pos", "ID", "ref", "alt"]]
     df.columns = ["#CHROM", "POS", "ID", "REF", "ALT"]
-    tmp_vcf_path = f"{tmp_dirname}/indels.vcf"
-    df.to_csv(tmp_vcf_path, sep="\t", index=False)
     project = "indels"
-    if df.shape[0] > 0:
+    with tempfile.TemporaryDirectory() as tmp_dirname:
+        df.to_csv(os.path.join(tmp_dirname, "indels.vcf"), sep="\t", index=False)
         try:
             matrices = matGen.SigProfilerMatrixGeneratorFunc(
-                project, genome_version, tmp_dirname
+                project, genome_version, tmp_dirname + os.sep
             )
             counts = matrices["ID"]
             counts.columns = ["count"]
-        except:
+        except Exception as error:
+            warnings.warn(f"Warning: SigProfilerMatrixGenerator failed: {error!r}")
             counts = empty_df
-    else:
-        counts = empty_df
-    if os.path.exists(tmp_dirname):
-        subprocess.run(["rm", "-rf", tmp_dirname])
     return counts
 
 
-def count_snvs(snvs, genome):
-    """Convert maf form to count table per variant type. Requires 'genome'"""
+def count_snvs_naive(snvs, genome):
+    """Row-by-row reference implementation of count_snvs, kept for validation"""
     df = snvs.copy()  # snvs <- essentially "maf" variable
 
     var_converter = {
@@ -197,7 +771,9 @@ def count_snvs(snvs, genome):
         "A>G": "T>C",
         "A>C": "T>G",
     }
-    df["var_type"] = (df["ref"] + ">" + df["alt"]).replace(var_converter)
+    df["var_type"] = (df["ref"].astype(str) + ">" + df["alt"].astype(str)).replace(
+        var_converter
+    )
 
     counts = construct_empty_count_series()
     contexts = []
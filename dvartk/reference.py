@@ -0,0 +1,189 @@
+import gzip
+import hashlib
+import json
+import os
+import numpy as np
+
+CACHE_VERSION = 1
+
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt")):
+    for _base in _bases:
+        BASE_CODES[ord(_base)] = _code
+BASE_TRANSLATION = BASE_CODES.tobytes()
+CODE_BASES = np.frombuffer(b"ACGTN", dtype=np.uint8)
+
+
+def encode_bases(seq):
+    """Encode a str/bytes sequence to uint8 codes: A=0, C=1, G=2, T=3, other=4"""
+    if isinstance(seq, str):
+        seq = seq.encode("ascii")
+    return BASE_CODES[np.frombuffer(seq, dtype=np.uint8)]
+
+
+def decode_bases(codes):
+    """Decode uint8 base codes back to an upper case str"""
+    return CODE_BASES[codes].tobytes().decode("ascii")
+
+
+def open_fasta(fasta_path):
+    """Open a plain or gzipped FASTA in binary mode"""
+    if fasta_path.endswith("gz"):
+        return gzip.open(fasta_path, "rb")
+    return open(fasta_path, "rb")
+
+
+def fasta_checksum(fasta_path, chunk_size=1 << 24):
+    """sha256 hex digest of the FASTA file as stored on disk"""
+    digest = hashlib.sha256()
+    with open(fasta_path, "rb") as fasta:
+        for chunk in iter(lambda: fasta.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_path_of(cache_path):
+    return cache_path + ".json"
+
+
+def write_codes(fasta_path, codes_path, buffer_size):
+    """Write the base codes of a FASTA to codes_path; returns the contig index"""
+    contigs = {}
+    offset = 0
+    with open_fasta(fasta_path) as fasta, open(codes_path, "wb") as cache:
+        name, length, buffer, buffered = None, 0, [], 0
+        for line in fasta:
+            if line.startswith(b">"):
+                if buffer:
+                    cache.write(b"".join(buffer).translate(BASE_TRANSLATION))
+                    buffer, buffered = [], 0
+                if name is not None:
+                    contigs[name] = [offset, length]
+                    offset += length
+                name, length = line[1:].split()[0].decode("ascii"), 0
+                if name in contigs:
+                    raise ValueError(f"duplicate contig {name} in {fasta_path}")
+                continue
+            line = line.rstrip(b"\r\n")
+            buffer.append(line)
+            buffered += len(line)
+            length += len(line)
+            if buffered >= buffer_size:
+                cache.write(b"".join(buffer).translate(BASE_TRANSLATION))
+                buffer, buffered = [], 0
+        if buffer:
+            cache.write(b"".join(buffer).translate(BASE_TRANSLATION))
+        if name is not None:
+            contigs[name] = [offset, length]
+    return contigs
+
+
+def build_reference_cache(fasta_path, cache_path=None, buffer_size=1 << 26):
+    """Pack a FASTA into a uint8-per-base code file with a JSON contig index
+
+    Bases are coded A=0, C=1, G=2, T=3 and any other base (N mask) as 4. The
+    index (cache_path + '.json') stores each contig's offset and length, and
+    the size, mtime and checksum of the source FASTA for staleness checks.
+    Returns the cache path; defaults to fasta_path + '.dvref'. A FASTA with
+    duplicate contig names is refused with ValueError.
+    """
+    if cache_path is None:
+        cache_path = fasta_path + ".dvref"
+    # write next to the cache first, so a failed build leaves no partial cache
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        contigs = write_codes(fasta_path, tmp_path, buffer_size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, cache_path)
+
+    stat = os.stat(fasta_path)
+    index = {
+        "version": CACHE_VERSION,
+        "fasta_path": os.path.abspath(fasta_path),
+        "fasta_size": stat.st_size,
+        "fasta_mtime_ns": stat.st_mtime_ns,
+        "fasta_sha256": fasta_checksum(fasta_path),
+        "contigs": contigs,
+    }
+    with open(index_path_of(cache_path), "w") as index_file:
+        json.dump(index, index_file)
+    return cache_path
+
+
+class ReferenceCache:
+    """Memory-mapped reference genome built by build_reference_cache
+
+    The code file is opened read-only with mmap, so processes opening the same
+    cache share its pages. A cache whose checksum does not match fasta_path
+    (default: the FASTA it was built from, if that still exists) is refused
+    with ValueError; check=False skips the check.
+    """
+
+    def __init__(self, cache_path, fasta_path=None, check=True):
+        self.cache_path = cache_path
+        with open(index_path_of(cache_path)) as index_file:
+            self.index = json.load(index_file)
+        if self.index.get("version") != CACHE_VERSION:
+            raise ValueError(
+                f"Unsupported reference cache version in {cache_path}; rebuild it"
+            )
+        if check and fasta_path is None:
+            recorded = self.index["fasta_path"]
+            fasta_path = recorded if os.path.exists(recorded) else None
+        if check and fasta_path is not None and self.is_stale(fasta_path):
+            raise ValueError(
+                f"Stale reference cache {cache_path}: checksum does not match "
+                f"{fasta_path}; rebuild it with build_reference_cache"
+            )
+        self.contigs = {
+            name: (offset, length)
+            for name, (offset, length) in self.index["contigs"].items()
+        }
+        if os.path.getsize(cache_path) > 0:
+            self.data = np.memmap(cache_path, dtype=np.uint8, mode="r")
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __reduce__(self):
+        # reopen by path in worker processes instead of pickling the mapped
+        # bytes; the cache was already checked when this copy was opened
+        return (ReferenceCache, (self.cache_path, None, False))
+
+    def __contains__(self, chrom):
+        return chrom in self.contigs
+
+    def __len__(self):
+        return len(self.contigs)
+
+    def keys(self):
+        return self.contigs.keys()
+
+    def is_stale(self, fasta_path):
+        """True if fasta_path does not match the FASTA this cache was built from"""
+        stat = os.stat(fasta_path)
+        if stat.st_size != self.index["fasta_size"]:
+            return True
+        if stat.st_mtime_ns == self.index["fasta_mtime_ns"]:
+            return False
+        return fasta_checksum(fasta_path) != self.index["fasta_sha256"]
+
+    def length(self, chrom):
+        return self.contigs[chrom][1]
+
+    def codes(self, chrom, start=0, end=None):
+        """Zero-copy view of base codes for 0-based half-open [start, end)"""
+        offset, length = self.contigs[chrom]
+        start = min(max(start, 0), length)
+        end = length if end is None else min(max(end, start), length)
+        return self.data[offset + start : offset + end]
+
+    def n_mask(self, chrom, start=0, end=None):
+        """Boolean mask of non-ACGT bases for 0-based half-open [start, end)"""
+        return self.codes(chrom, start, end) == 4
+
+    def fetch(self, chrom, start, end):
+        """Upper case sequence of 0-based half-open [start, end)"""
+        return decode_bases(self.codes(chrom, start, end))
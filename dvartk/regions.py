@@ -0,0 +1,126 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+REGION_PATTERN = re.compile(
+    r"^(?P<chrom>[^:]+)(?::(?P<start>[\d,]+)?-?(?P<end>[\d,]+)?)?$"
+)
+
+
+def parse_region(region):
+    """(chrom, start, end) in 0-based half-open coordinates
+
+    region: 'chrom', 'chrom:start-end' (1-based inclusive, samtools style) or a
+    (chrom, start, end) tuple that is already 0-based half-open
+    """
+    if not isinstance(region, str):
+        chrom, start, end = region
+        return str(chrom), int(start), int(end)
+    match = REGION_PATTERN.match(region)
+    if match is None:
+        raise ValueError(f"invalid region {region!r}")
+    start = match.group("start")
+    end = match.group("end")
+    start = int(start.replace(",", "")) - 1 if start else 0
+    end = int(end.replace(",", "")) if end else 1 << 31
+    if start < 0 or end <= start:
+        raise ValueError(f"invalid region {region!r}")
+    return match.group("chrom"), start, end
+
+
+def merge_regions(regions):
+    """Disjoint sorted intervals per chromosome from region strings or tuples
+
+    returns: {chrom: (starts, ends)} of int64 arrays, 0-based half-open
+    """
+    if isinstance(regions, pd.DataFrame):
+        parsed = regions[["chrom", "start", "end"]].itertuples(index=False)
+    else:
+        parsed = [parse_region(region) for region in regions]
+    intervals = {}
+    for chrom, start, end in parsed:
+        intervals.setdefault(str(chrom), []).append((int(start), int(end)))
+    merged = {}
+    for chrom, spans in intervals.items():
+        spans = np.array(sorted(spans), dtype=np.int64)
+        starts, ends = spans[:, 0], np.maximum.accumulate(spans[:, 1])
+        # a new interval starts where it does not touch the ones before it
+        new = np.concatenate([[True], starts[1:] > ends[:-1]])
+        merged[chrom] = (starts[new], np.maximum.reduceat(ends, np.flatnonzero(new)))
+    return merged
+
+
+def overlaps_regions(chroms, starts, ends, merged):
+    """Mask of [start, end) intervals overlapping merged regions on their chrom"""
+    chroms = pd.Series(np.asarray(chroms, dtype=object), copy=False)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    mask = np.zeros(chroms.shape[0], dtype=bool)
+    for chrom, rows in chroms.groupby(chroms, sort=False).indices.items():
+        if chrom not in merged:
+            continue
+        region_starts, region_ends = merged[chrom]
+        # the last region starting before each interval ends is the only candidate
+        ixs = np.searchsorted(region_starts, ends[rows], side="left") - 1
+        hit = ixs >= 0
+        hit[hit] = region_ends[ixs[hit]] > starts[rows][hit]
+        mask[rows] = hit
+    return mask
+
+
+def read_bed(bed_path, strand=False):
+    """chrom/start/end table of a (gzipped) BED file; extra columns are dropped
+
+    strand [bool]: also keep the sixth (strand) column, as 'strand'
+    """
+    names = ["chrom", "start", "end", "name", "score", "strand"]
+    usecols = names[:3] + (["strand"] if strand else [])
+    bed = pd.read_csv(
+        bed_path,
+        sep="\t",
+        header=None,
+        names=names if strand else names[:3],
+        usecols=usecols,
+        dtype=str,
+        comment="#",
+    )
+    # track/browser header lines are not comments but have no coordinates
+    bed = bed[~bed["chrom"].str.match("(track|browser)( |$)")]
+    bed = bed.astype({"start": np.int64, "end": np.int64})
+    return bed.reset_index(drop=True)
+
+
+def load_regions(regions):
+    """Merged regions (see merge_regions) from a BED path, region list or table
+
+    Already merged {chrom: (starts, ends)} dicts are returned as they are.
+    """
+    if isinstance(regions, dict):
+        return regions
+    if isinstance(regions, (str, os.PathLike)):
+        regions = read_bed(regions)
+    return merge_regions(regions)
+
+
+def in_regions(chroms, positions, merged):
+    """Mask of 1-based positions in merged regions; missing positions are not"""
+    positions = pd.to_numeric(positions).to_numpy(dtype=np.float64, na_value=np.nan)
+    known = ~np.isnan(positions)
+    positions = np.where(known, positions, 0).astype(np.int64)
+    return known & overlaps_regions(chroms, positions - 1, positions, merged)
+
+
+def filter_snvs(df, regions):
+    """Rows of a chrom/pos table whose position lies in regions"""
+    merged = load_regions(regions)
+    return df[in_regions(df["chrom"], df["pos"], merged)]
+
+
+def filter_svs(df, regions):
+    """Rows of an SV table with both breakpoints in regions"""
+    merged = load_regions(regions)
+    mask = np.ones(df.shape[0], dtype=bool)
+    for end in ("1", "2"):
+        mask &= in_regions(df[f"chromosome_{end}"], df[f"position_{end}"], merged)
+    return df[mask]
@@ -0,0 +1,102 @@
+import functools
+import warnings
+import numpy as np
+import pandas as pd
+
+SV_TYPES = ("del", "ins", "dup", "inv", "translocation")
+SV_TYPE_DTYPE = pd.CategoricalDtype(list(SV_TYPES))
+
+# canonical label (see canonical_sv_label) -> SV_TYPES entry
+SV_TYPE_ALIASES = {
+    "DEL": "del",
+    "DELETION": "del",
+    "INS": "ins",
+    "INSERTION": "ins",
+    "DUP": "dup",
+    "DUPLICATION": "dup",
+    "TDUP": "dup",
+    "INV": "inv",
+    "INVERSION": "inv",
+    "BND": "translocation",
+    "TRA": "translocation",
+    "CTX": "translocation",  # BreakDancer
+    "TRANSLOCATION": "translocation",
+}
+
+
+def canonical_sv_label(label):
+    """Upper case label without 'SVTYPE=' or VCF '<>' around it
+
+    e.g. '<DEL>', 'SVTYPE=DEL', 'Deletion' and 'del' all give 'DEL'
+    """
+    label = str(label).strip().upper()
+    if label.startswith("SVTYPE="):
+        label = label[len("SVTYPE=") :]
+    return label.strip("<>")
+
+
+def lookup_label(label, aliases):
+    """SV_TYPES index of a label, -1 if unmapped
+
+    Subtyped labels such as 'DUP:TANDEM' or 'INS:ME:ALU' fall back to the
+    part before the first ':'.
+    """
+    label = canonical_sv_label(label)
+    svtype = aliases.get(label, aliases.get(label.split(":")[0]))
+    return SV_TYPES.index(svtype) if svtype is not None else -1
+
+
+@functools.lru_cache(maxsize=None)
+def lookup_sv_type(label):
+    """lookup_label against SV_TYPE_ALIASES, cached per label"""
+    return lookup_label(label, SV_TYPE_ALIASES)
+
+
+def check_aliases(aliases):
+    """aliases with canonical keys; ValueError for targets outside SV_TYPES"""
+    unknown = sorted(set(aliases.values()) - set(SV_TYPES))
+    if unknown:
+        raise ValueError(f"aliases must map to one of {SV_TYPES}, got {unknown}")
+    return {canonical_sv_label(label): svtype for label, svtype in aliases.items()}
+
+
+def register_sv_type_aliases(aliases):
+    """Add {label: SV type} aliases, e.g. caller-specific names, for all loads"""
+    SV_TYPE_ALIASES.update(check_aliases(aliases))
+    lookup_sv_type.cache_clear()
+
+
+def normalize_sv_types(svs, type_col="type", aliases=None):
+    """svs with type_col as a categorical over SV_TYPES
+
+    Each distinct label is resolved once through SV_TYPE_ALIASES (plus
+    aliases for this call only) and rows are mapped with one code lookup.
+    Unmapped labels become missing, with a warning counting each of them.
+    The returned frame is a shallow copy: only type_col is new.
+    """
+    types = svs[type_col]
+    if aliases is None and types.dtype == SV_TYPE_DTYPE:
+        return svs
+    if isinstance(types.dtype, pd.CategoricalDtype):
+        codes, uniques = types.cat.codes.to_numpy(), types.cat.categories
+    else:
+        codes, uniques = pd.factorize(types)
+    if aliases is None:
+        lookup = [lookup_sv_type(label) for label in uniques]
+    else:
+        table = {**SV_TYPE_ALIASES, **check_aliases(aliases)}
+        lookup = [lookup_label(label, table) for label in uniques]
+    # code -1 (missing) stays missing
+    lookup = np.array(lookup + [-1], dtype=np.int64)
+
+    unmapped = np.flatnonzero(lookup[:-1] < 0)
+    if unmapped.shape[0]:
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))[unmapped]
+        summary = ", ".join(
+            f"{uniques[ix]!s}: {count}" for ix, count in zip(unmapped, counts)
+        )
+        warnings.warn(f"Warning: {counts.sum()} SVs of unknown type ({summary})")
+
+    svs = svs.copy(deep=False)
+    svs[type_col] = pd.Categorical.from_codes(lookup[codes], dtype=SV_TYPE_DTYPE)
+    return svs
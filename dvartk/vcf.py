@@ -0,0 +1,470 @@
+import csv
+import gzip
+import io
+import itertools
+import os
+import re
+import shutil
+import struct
+import subprocess
+import warnings
+import zlib
+import numpy as np
+import pandas as pd
+from dvartk.regions import merge_regions, overlaps_regions
+from dvartk.svtypes import normalize_sv_types
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+TABIX_MIN_SHIFT = 14
+TABIX_DEPTH = 5
+VCF_CHUNK_SIZE = 1 << 24
+
+VCF_COLUMNS = ["chrom", "pos", "id", "ref", "alt", "info"]
+BND_PATTERN = r"^(?P<left>[^\[\]]*)(?P<bracket>[\[\]])(?P<chrom>[^:\[\]]+):(?P<pos>\d+)[\[\]](?P<right>[^\[\]]*)$"
+# default breakpoint orientation per SV type when STRANDS is absent
+SV_TYPE_STRANDS = {"DEL": "+-", "DUP": "-+", "INS": "+-", "INV": "++"}
+# SV type of an intra-chromosomal breakend pair per (strand_1, strand_2)
+BND_ORIENTATION_TYPES = {"+-": "DEL", "-+": "DUP", "++": "INV", "--": "INV"}
+
+
+def read_bgzf_block(handle, coffset):
+    """(decompressed data, compressed size) of the BGZF block at coffset"""
+    handle.seek(coffset)
+    header = handle.read(12)
+    if len(header) < 12:
+        return b"", 0
+    if header[:4] != BGZF_MAGIC:
+        raise ValueError(f"not a BGZF block at offset {coffset}")
+    xlen = struct.unpack("<H", header[10:12])[0]
+    extra = handle.read(xlen)
+    block_size = None
+    ix = 0
+    while ix + 4 <= xlen:
+        slen = struct.unpack("<H", extra[ix + 2 : ix + 4])[0]
+        if extra[ix : ix + 2] == b"BC":
+            block_size = struct.unpack("<H", extra[ix + 4 : ix + 6])[0] + 1
+        ix += 4 + slen
+    if block_size is None:
+        raise ValueError(f"BGZF block at offset {coffset} lacks its BC field")
+    rest = handle.read(block_size - 12 - xlen)
+    return zlib.decompress(rest[:-8], -15), block_size
+
+
+def iter_bgzf_range(handle, begin, end):
+    """Decompressed bytes between two BGZF virtual offsets, block by block"""
+    coffset, uoffset = begin >> 16, begin & 0xFFFF
+    end_coffset, end_uoffset = end >> 16, end & 0xFFFF
+    while coffset <= end_coffset:
+        data, size = read_bgzf_block(handle, coffset)
+        if size == 0:
+            break
+        if coffset == end_coffset:
+            yield data[uoffset:end_uoffset]
+            break
+        yield data[uoffset:]
+        coffset, uoffset = coffset + size, 0
+
+
+def is_bgzf(path):
+    with open(path, "rb") as handle:
+        header = handle.read(18)
+    return header[:4] == BGZF_MAGIC and header[12:14] == b"BC"
+
+
+def reg2bins(begin, end, min_shift=TABIX_MIN_SHIFT, depth=TABIX_DEPTH):
+    """All bins that may hold records overlapping [begin, end), as in htslib"""
+    end = min(end, 1 << (min_shift + depth * 3)) - 1
+    bins = []
+    shift, offset = min_shift + depth * 3, 0
+    for level in range(depth + 1):
+        bins.extend(range(offset + (begin >> shift), offset + (end >> shift) + 1))
+        shift -= 3
+        offset += 1 << (level * 3)
+    return bins
+
+
+class TabixIndex:
+    """Bins, chunks and linear index of a .tbi or .csi index
+
+    Chunks are (begin, end) BGZF virtual offsets. CSI indexes carry no linear
+    index, so their queries start at the first chunk of the matching bins.
+    """
+
+    def __init__(self, index_path):
+        with gzip.open(index_path, "rb") as index_file:
+            data = index_file.read()
+        magic, self.ix = data[:4], 4
+        if magic == b"TBI\x01":
+            self.min_shift, self.depth = TABIX_MIN_SHIFT, TABIX_DEPTH
+            n_ref = self.unpack(data, "<i")
+            self.read_header(data)
+            self.read_references(data, n_ref, csi=False)
+        elif magic == b"CSI\x01":
+            self.min_shift, self.depth, l_aux = self.unpack(data, "<iii")
+            aux_end = self.ix + l_aux
+            self.read_header(data)
+            self.ix = aux_end
+            n_ref = self.unpack(data, "<i")
+            self.read_references(data, n_ref, csi=True)
+        else:
+            raise ValueError(f"{index_path} is not a tabix (.tbi/.csi) index")
+        self.ref_ids = {name: ix for ix, name in enumerate(self.names)}
+
+    def unpack(self, data, fmt):
+        values = struct.unpack_from(fmt, data, self.ix)
+        self.ix += struct.calcsize(fmt)
+        return values[0] if len(values) == 1 else values
+
+    def read_header(self, data):
+        self.format, self.col_seq, self.col_beg, self.col_end = self.unpack(
+            data, "<iiii"
+        )
+        self.meta, self.skip, l_nm = self.unpack(data, "<iii")
+        names = data[self.ix : self.ix + l_nm]
+        self.ix += l_nm
+        self.names = [name.decode() for name in names.split(b"\x00") if name]
+
+    def read_references(self, data, n_ref, csi):
+        self.bins, self.linear = [], []
+        for _ in range(n_ref):
+            bins = {}
+            for _ in range(self.unpack(data, "<i")):
+                if csi:
+                    bin_id, _, n_chunk = self.unpack(data, "<IQi")
+                else:
+                    bin_id, n_chunk = self.unpack(data, "<Ii")
+                chunks = struct.unpack_from(f"<{2 * n_chunk}Q", data, self.ix)
+                self.ix += 16 * n_chunk
+                bins[bin_id] = list(zip(chunks[::2], chunks[1::2]))
+            self.bins.append(bins)
+            if csi:
+                self.linear.append(np.zeros(0, dtype=np.uint64))
+            else:
+                n_intv = self.unpack(data, "<i")
+                self.linear.append(
+                    np.frombuffer(data, dtype="<u8", count=n_intv, offset=self.ix)
+                )
+                self.ix += 8 * n_intv
+
+    def chunks(self, chrom, begin, end):
+        """Merged (begin, end) virtual offset ranges that may hold [begin, end)"""
+        if chrom not in self.ref_ids:
+            return []
+        ref_id = self.ref_ids[chrom]
+        bins, linear = self.bins[ref_id], self.linear[ref_id]
+        min_offset = 0
+        if linear.shape[0]:
+            min_offset = int(linear[min(begin >> self.min_shift, linear.shape[0] - 1)])
+        chunks = sorted(
+            chunk
+            for bin_id in reg2bins(begin, end, self.min_shift, self.depth)
+            for chunk in bins.get(bin_id, ())
+            if chunk[1] > min_offset
+        )
+        # chunks starting in the block where the previous one ends are joined;
+        # records between them are dropped by the caller's overlap filter
+        merged = []
+        for chunk_begin, chunk_end in chunks:
+            if merged and chunk_begin >> 16 <= merged[-1][1] >> 16:
+                merged[-1][1] = max(merged[-1][1], chunk_end)
+            else:
+                merged.append([max(chunk_begin, min_offset), chunk_end])
+        return [tuple(chunk) for chunk in merged]
+
+
+def find_index(vcf_path):
+    """Path of the .tbi or .csi index next to vcf_path, or None"""
+    for suffix in (".tbi", ".csi"):
+        if os.path.exists(vcf_path + suffix):
+            return vcf_path + suffix
+    return None
+
+
+def record_ends(pos, ref, info):
+    """0-based exclusive ends of VCF records: INFO END if larger, else POS+len(REF)-1"""
+    pos = pd.Series(pos, copy=False).reset_index(drop=True)
+    ends = pos.to_numpy(dtype=np.int64) - 1 + pd.Series(ref).str.len().to_numpy()
+    info_end = (
+        pd.Series(info).reset_index(drop=True).str.extract(r"(?:^|;)END=(\d+)")[0]
+    )
+    info_end = pd.to_numeric(info_end).fillna(-1).to_numpy(dtype=np.int64)
+    return np.maximum(ends, info_end)
+
+
+def bgzip_and_index(vcf_path, output_path=None, csi=False, min_shift=TABIX_MIN_SHIFT):
+    """bgzip a sorted (gzipped) VCF and index it with htslib's bgzip and tabix
+
+    Runs `bgzip -c vcf > output && tabix -p vcf output` (`tabix -C -m
+    min_shift` for csi=True), streaming a gzipped VCF through bgzip. Returns
+    the output path, by default vcf_path with a .gz suffix (replacing an
+    existing .gz).
+    """
+    tools = {tool: shutil.which(tool) for tool in ("bgzip", "tabix")}
+    missing = [tool for tool, path in tools.items() if path is None]
+    if missing:
+        raise RuntimeError(
+            f"bgzip_and_index needs htslib's {' and '.join(missing)} on PATH"
+        )
+    if output_path is None:
+        output_path = re.sub(r"\.gz$", "", vcf_path) + ".gz"
+
+    # write next to the output first, as the input may be the output path
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    opener = gzip.open if vcf_path.endswith(".gz") else open
+    with opener(vcf_path, "rb") as vcf, open(tmp_path, "wb") as output:
+        bgzip = subprocess.Popen(
+            [tools["bgzip"], "-c"], stdin=subprocess.PIPE, stdout=output
+        )
+        shutil.copyfileobj(vcf, bgzip.stdin)
+        bgzip.stdin.close()
+        returncode = bgzip.wait()
+    if returncode != 0:
+        os.remove(tmp_path)
+        raise RuntimeError(f"bgzip failed on {vcf_path}")
+    os.replace(tmp_path, output_path)
+
+    command = [tools["tabix"], "-f", "-p", "vcf"]
+    if csi:
+        command += ["-C", "-m", str(min_shift)]
+    result = subprocess.run(command + [output_path], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ValueError(f"tabix failed on {output_path}: {result.stderr.strip()}")
+    return output_path
+
+
+def line_chunks(pieces, chunk_size=VCF_CHUNK_SIZE):
+    """Chunks of whole lines, about chunk_size bytes each, of split bytes"""
+    parts, size = [], 0
+    for piece in pieces:
+        parts.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            data = b"".join(parts)
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                yield data[:cut]
+            parts, size = [data[cut:]], len(data) - cut
+    data = b"".join(parts)
+    if data:
+        yield data
+
+
+def iter_vcf_text(vcf_path, regions=None, chunk_size=VCF_CHUNK_SIZE):
+    """Data lines of a VCF as bytes chunks of whole lines
+
+    With regions and an index next to a bgzipped VCF, only the blocks of
+    their chunks are decompressed; otherwise the file is streamed past its
+    header. Either way at most about chunk_size bytes are held at a time.
+    """
+    index_path = find_index(vcf_path)
+    if regions is not None and index_path is not None and is_bgzf(vcf_path):
+        index = TabixIndex(index_path)
+        chunks = sorted(
+            chunk
+            for chrom, (starts, ends) in merge_regions(regions).items()
+            for start, end in zip(starts, ends)
+            for chunk in index.chunks(chrom, int(start), int(end))
+        )
+
+        def pieces(handle):
+            # read in file order; adjacent regions may share chunks, read them once
+            covered = 0
+            for begin, end in chunks:
+                begin = max(begin, covered)
+                if begin < end:
+                    yield from iter_bgzf_range(handle, begin, end)
+                    covered = end
+
+        with open(vcf_path, "rb") as handle:
+            yield from line_chunks(pieces(handle), chunk_size)
+        return
+
+    opener = gzip.open if vcf_path.endswith("gz") else open
+    with opener(vcf_path, "rb") as vcf:
+        # skip the header lines
+        for line in vcf:
+            if not line.startswith(b"#"):
+                break
+        else:
+            return
+        rest = iter(lambda: vcf.read(chunk_size), b"")
+        yield from line_chunks(itertools.chain([line], rest), chunk_size)
+
+
+def parse_info(info, fields):
+    """Columns for the requested INFO keys: str values, None where absent
+
+    Keys seen without a value are flags and come back as bool columns.
+    """
+    wanted = set(fields)
+    columns = {field: [None] * len(info) for field in fields}
+    for row, entry in enumerate(info):
+        for item in entry.split(";"):
+            key, has_value, value = item.partition("=")
+            if key in wanted:
+                columns[key][row] = value if has_value else True
+    for field, values in columns.items():
+        if any(value is True for value in values):
+            columns[field] = [value is not None for value in values]
+    return columns
+
+
+def split_alleles(records, fields):
+    """One row per ALT allele; INFO values with one entry per allele are split"""
+    alts = records["alt"].tolist()
+    n_alts = np.array([alt.count(",") + 1 for alt in alts])
+    if (n_alts == 1).all():
+        return records
+    rows = np.repeat(np.arange(records.shape[0]), n_alts)
+    allele_ixs = np.arange(rows.shape[0]) - np.repeat(
+        np.cumsum(n_alts) - n_alts, n_alts
+    )
+    split = records.iloc[rows].reset_index(drop=True)
+    split["alt"] = [allele for alt in alts for allele in alt.split(",")]
+    multi = np.flatnonzero(n_alts[rows] > 1)
+    for field in fields:
+        values = split[field].to_numpy(dtype=object)
+        for ix in multi:
+            value = values[ix]
+            if isinstance(value, str) and value.count(",") + 1 == n_alts[rows[ix]]:
+                values[ix] = value.split(",")[allele_ixs[ix]]
+        split[field] = values
+    return split
+
+
+def read_vcf_chunk(text, merged):
+    """Records of a chunk of VCF data lines overlapping merged regions (if any)"""
+    records = pd.read_csv(
+        io.BytesIO(text),
+        sep="\t",
+        header=None,
+        usecols=[0, 1, 2, 3, 4, 7],
+        names=VCF_COLUMNS[:5] + ["qual", "filter", "info"],
+        dtype=object,
+        na_filter=False,
+        quoting=csv.QUOTE_NONE,
+    )
+    records["pos"] = records["pos"].astype(np.int64)
+    if merged is not None:
+        ends = record_ends(records["pos"], records["ref"], records["info"])
+        keep = overlaps_regions(records["chrom"], records["pos"] - 1, ends, merged)
+        records = records[keep]
+    return records
+
+
+def read_vcf(vcf_path, regions=None, info_fields=(), split_multiallelic=True):
+    """Load CHROM/POS/ID/REF/ALT and the requested INFO fields of a VCF
+
+    regions: region strings ('chr1:1-1000'), (chrom, start, end) tuples or a
+        chrom/start/end DataFrame (0-based half-open); with a .tbi/.csi index
+        next to a bgzipped VCF only the overlapping blocks are read; the file
+        is parsed in chunks of about VCF_CHUNK_SIZE bytes either way
+    info_fields: INFO keys to add as columns (str values, bool for flags)
+    split_multiallelic: one row per ALT allele; INFO values with one entry
+        per ALT allele are split along
+    returns: DataFrame with chrom, pos, id, ref, alt and info_fields columns,
+        in file order
+    """
+    merged = merge_regions(regions) if regions is not None else None
+    parts = [
+        read_vcf_chunk(text, merged)
+        for text in iter_vcf_text(vcf_path, regions)
+        if text.strip()
+    ]
+    if parts:
+        records = pd.concat(parts, ignore_index=True)
+    else:
+        records = pd.DataFrame({col: pd.Series(dtype=object) for col in VCF_COLUMNS})
+        records["pos"] = records["pos"].astype(np.int64)
+
+    info = parse_info(records["info"].tolist(), info_fields)
+    records = records.drop(columns="info").assign(**info)
+    if split_multiallelic:
+        records = split_alleles(records, info_fields)
+    return records.reset_index(drop=True)
+
+
+def parse_bnd_alts(alts):
+    """Mate chromosome, position and strands of BND ALT strings
+
+    t[p[ -> (+, -), t]p] -> (+, +), ]p]t -> (-, +), [p[t -> (-, -); the
+    strand is + when the retained sequence lies left of the breakend.
+    """
+    parsed = alts.str.extract(BND_PATTERN)
+    strand_1 = np.where(parsed["left"].str.len() > 0, "+", "-")
+    strand_2 = np.where(parsed["bracket"] == "[", "-", "+")
+    return pd.DataFrame(
+        {
+            "chromosome_2": parsed["chrom"],
+            "position_2": pd.to_numeric(parsed["pos"]),
+            "strand_1": strand_1,
+            "strand_2": strand_2,
+            "is_bnd": parsed["bracket"].notna(),
+        },
+        index=alts.index,
+    )
+
+
+def read_vcf_svs(vcf_path, regions=None):
+    """SV VCF as a table in the SvFileConfig dst schema
+
+    Symbolic records use SVTYPE, END, CHR2, SVLEN and STRANDS (defaulting to
+    the usual orientation of the type); breakend records take the mate
+    position and strands from the ALT notation, and only one record of each
+    MATEID pair is kept. Breakends between chromosomes are translocations,
+    those within one are typed by orientation (del, dup or inv); records
+    with neither SVTYPE nor breakend notation are skipped with a warning.
+    SV types are normalized with normalize_sv_types.
+    returns: DataFrame with chromosome_1, position_1, strand_1, chromosome_2,
+        position_2, strand_2, type, length and id columns
+    """
+    records = read_vcf(
+        vcf_path,
+        regions=regions,
+        info_fields=("SVTYPE", "END", "CHR2", "SVLEN", "STRANDS", "MATEID"),
+    )
+    bnd = parse_bnd_alts(records["alt"])
+    untyped = (records["SVTYPE"].isna() & ~bnd["is_bnd"]).to_numpy()
+    if untyped.any():
+        warnings.warn(f"Warning: skipped {untyped.sum()} SV records without SVTYPE")
+        records = records[~untyped].reset_index(drop=True)
+        bnd = bnd[~untyped].reset_index(drop=True)
+    is_bnd = bnd["is_bnd"].to_numpy(dtype=bool)
+    svtype = records["SVTYPE"].where(~is_bnd, "BND")
+
+    default_strands = svtype.map(SV_TYPE_STRANDS).fillna("+-")
+    strands = records["STRANDS"].str[:2].where(records["STRANDS"].notna())
+    strands = strands.fillna(default_strands)
+    chromosome_2 = records["CHR2"].fillna(records["chrom"])
+    position_2 = pd.to_numeric(records["END"]).fillna(records["pos"])
+    svlen = pd.to_numeric(records["SVLEN"]).abs()
+    length = svlen.fillna(position_2 - records["pos"])
+
+    svs = pd.DataFrame(
+        {
+            "chromosome_1": records["chrom"],
+            "position_1": records["pos"],
+            "strand_1": np.where(is_bnd, bnd["strand_1"], strands.str[0]),
+            "chromosome_2": np.where(is_bnd, bnd["chromosome_2"], chromosome_2),
+            "position_2": np.where(is_bnd, bnd["position_2"], position_2),
+            "strand_2": np.where(is_bnd, bnd["strand_2"], strands.str[1]),
+            "type": svtype,
+            "length": np.where(is_bnd, np.nan, length),
+            "id": records["id"],
+        }
+    )
+    svs["position_2"] = svs["position_2"].astype(np.int64)
+
+    # breakends on one chromosome are typed by their orientation
+    intra = (svs["type"].str.upper() == "BND") & (
+        svs["chromosome_1"] == svs["chromosome_2"]
+    )
+    orientation = svs["strand_1"] + svs["strand_2"]
+    svs.loc[intra, "type"] = orientation[intra].map(BND_ORIENTATION_TYPES)
+    svs.loc[intra, "length"] = (svs["position_2"] - svs["position_1"]).abs()[intra]
+
+    # keep one record per breakend pair
+    mate_ids = records["MATEID"]
+    has_mate = mate_ids.notna() & mate_ids.isin(records["id"])
+    svs = svs[~(has_mate & (records["id"] > mate_ids)).to_numpy()]
+    return normalize_sv_types(svs.reset_index(drop=True))
@@ -0,0 +1,34 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from pyfaidx import Fasta
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def write_fasta(path, chroms):
+    with open(path, "w") as fasta:
+        for chrom, seq in chroms.items():
+            fasta.write(f">{chrom}\n")
+            for start in range(0, len(seq), 60):
+                fasta.write(seq[start : start + 60] + "\n")
+    return str(path)
+
+
+def random_snvs(genome, n, seed=1):
+    rng = np.random.default_rng(seed)
+    chroms = rng.choice(list(genome.keys()), size=n)
+    positions = rng.integers(2, len(genome[chroms[0]]), size=n)
+    refs = [genome[c][int(p) - 1 : int(p)].seq for c, p in zip(chroms, positions)]
+    alts = [rng.choice([b for b in "ACGT" if b != r]) for r in refs]
+    return pd.DataFrame({"chrom": chroms, "pos": positions, "ref": refs, "alt": alts})
+
+
+@pytest.fixture
+def genome(tmp_path):
+    rng = np.random.default_rng(0)
+    chroms = {
+        chrom: "".join(rng.choice(list("ACGT"), size=5000)) for chrom in ("1", "2", "X")
+    }
+    return Fasta(write_fasta(tmp_path / "genome.fa", chroms))
@@ -0,0 +1,117 @@
+"""Regenerate id83_fixture.{fa,tsv} with SigProfilerMatrixGenerator's own ID classifier
+
+Run from the repository root: python tests/data/make_id83_fixture.py
+"""
+
+import os
+import tempfile
+from collections import defaultdict
+import numpy as np
+from SigProfilerMatrixGenerator.scripts import MutationMatrixGenerator
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+CHROM = "1"
+
+
+class Counter:
+    """Stands in for the DataFrames SigProfiler increments with .at[key, sample]"""
+
+    def __init__(self):
+        self.at = defaultdict(int)
+
+
+def make_sequence(rng, n_segments=1500):
+    """Low-complexity sequence rich in homopolymers, tandem repeats and microhomology"""
+    segments = []
+    for _ in range(n_segments):
+        kind = rng.integers(3)
+        if kind == 0:
+            segments.append(rng.choice(list("ACGT")) * int(rng.integers(1, 9)))
+        elif kind == 1:
+            unit = "".join(rng.choice(list("ACGT"), size=int(rng.integers(2, 7))))
+            segments.append(unit * int(rng.integers(1, 8)))
+        else:
+            segments.append(
+                "".join(rng.choice(list("ACGT"), size=int(rng.integers(1, 12))))
+            )
+    return "".join(segments)
+
+
+def make_indels(rng, seq, n=3000):
+    indels = []
+    for _ in range(n):
+        pos = int(rng.integers(20, len(seq) - 40))  # 1-based anchor position
+        length = int(rng.choice([1, 1, 1, 2, 3, 4, 5, 6, 8]))
+        if rng.random() < 0.5:
+            ref, alt = seq[pos - 1 : pos + length], seq[pos - 1]
+        else:
+            if rng.random() < 0.6:
+                inserted = seq[pos : pos + length]  # duplicate the following bases
+            else:
+                inserted = "".join(rng.choice(list("ACGT"), size=length))
+            ref, alt = seq[pos - 1], seq[pos - 1] + inserted
+        indels.append((pos, ref, alt))
+    return sorted(set(indels))
+
+
+def classify_with_sigprofiler(seq, indels):
+    tsb_ref = {code: ["N", base] for code, base in enumerate("ACGT")}
+    tsb_ref[16] = ["N", "N"]
+    codes = {"A": 0, "C": 1, "G": 2, "T": 3}
+    channels = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chrom_path = tmp_dir + "/"
+        with open(chrom_path + CHROM + ".txt", "wb") as chrom_file:
+            chrom_file.write(bytes(codes.get(base, 16) for base in seq))
+        for pos, ref, alt in indels:
+            mutation_ID = {
+                key: Counter() for key in ("ID", "simple", "tsb", "complete")
+            }
+            MutationMatrixGenerator.catalogue_generator_INDEL_single(
+                mutation_ID,
+                [["s", CHROM, str(pos), ref, alt]],
+                CHROM,
+                chrom_path,
+                chrom_path,
+                [],
+                None,
+                chrom_path,
+                "fixture",
+                chrom_path,
+                False,
+                "GRCh37",
+                {},
+                True,
+                True,
+                False,
+                None,
+                False,
+                False,
+                tsb_ref,
+                None,
+                False,
+                False,
+                chrom_path + "log.txt",
+            )
+            ((key, _),) = mutation_ID["ID"].at.keys()
+            channels.append(key)
+    return channels
+
+
+def main():
+    rng = np.random.default_rng(83)
+    seq = make_sequence(rng)
+    indels = make_indels(rng, seq)
+    channels = classify_with_sigprofiler(seq, indels)
+    with open(os.path.join(DATA_DIR, "id83_fixture.fa"), "w") as fasta:
+        fasta.write(f">{CHROM}\n")
+        for start in range(0, len(seq), 60):
+            fasta.write(seq[start : start + 60] + "\n")
+    with open(os.path.join(DATA_DIR, "id83_fixture.tsv"), "w") as table:
+        table.write("chrom\tpos\tref\talt\tchannel\n")
+        for (pos, ref, alt), channel in zip(indels, channels):
+            table.write(f"{CHROM}\t{pos}\t{ref}\t{alt}\t{channel}\n")
+
+
+if __name__ == "__main__":
+    main()
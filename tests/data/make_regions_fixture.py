@@ -0,0 +1,27 @@
+"""Regenerate regions_fixture.vcf.gz(.tbi/.csi) with htslib's bgzip and tabix
+
+Run from the repository root: python tests/data/make_regions_fixture.py
+"""
+
+import os
+import shutil
+import tempfile
+from dvartk.vcf import bgzip_and_index
+from tests.test_vcf import random_vcf
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+NAME = "regions_fixture.vcf"
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vcf_path = random_vcf(os.path.join(tmp_dir, NAME), 1000)
+        gz_path = bgzip_and_index(vcf_path)
+        bgzip_and_index(vcf_path, csi=True)
+        for suffix in (".gz", ".gz.tbi", ".gz.csi"):
+            shutil.copy(vcf_path + suffix, os.path.join(DATA_DIR, NAME + suffix))
+    print(gz_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dvartk.batch import read_manifest, run_cohort
+from dvartk.parser import SnvFileConfig
+from dvartk.process import count_snvs
+from tests.conftest import random_snvs
+
+
+def write_sample_maf(path, snvs):
+    maf = pd.DataFrame(
+        {
+            "Chromosome": snvs["chrom"],
+            "Start_Position": snvs["pos"],
+            "Reference_Allele": snvs["ref"],
+            "Tumor_Seq_Allele2": snvs["alt"],
+            "Variant_Type": "SNP",
+        }
+    )
+    maf.to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+def test_run_cohort_counts_snvs_per_sample(genome, tmp_path):
+    config = SnvFileConfig(
+        "Chromosome", "Start_Position", "Reference_Allele", "Tumor_Seq_Allele2"
+    )
+    samples = {f"S{ix}": random_snvs(genome, 200, seed=ix) for ix in range(3)}
+    manifest = {
+        sample: write_sample_maf(tmp_path / f"{sample}.maf", snvs)
+        for sample, snvs in samples.items()
+    }
+    manifest["missing"] = str(tmp_path / "missing.maf")
+
+    with pytest.warns(UserWarning, match="1 of 4 samples failed"):
+        counts, timings = run_cohort(
+            manifest,
+            "snv",
+            config,
+            genome=genome.filename,
+            n_workers=2,
+            plot_dir=tmp_path / "plots",
+            scratch_dir=tmp_path,
+        )
+
+    assert list(counts.index) == ["S0", "S1", "S2"]
+    assert counts.shape[1] == 96
+    for sample, snvs in samples.items():
+        expected = count_snvs(snvs, genome)
+        assert (counts.loc[sample].to_numpy() == expected.to_numpy()).all()
+        assert (tmp_path / "plots" / f"{sample}.snv.png").exists()
+    assert timings.loc["S0", "n_variants"] == 200
+    assert timings.loc["missing", "error"] is not None
+    assert np.isnan(timings.loc[["S0", "S1", "S2"], "error"].astype(float)).all()
+    # per-worker scratch dirs are cleaned up
+    assert not list(tmp_path.glob("dvartk-batch-*"))
+
+
+@pytest.mark.parametrize("kind", ["snv", "indel"])
+def test_run_cohort_requires_genome(kind, tmp_path):
+    config = SnvFileConfig(
+        "Chromosome", "Start_Position", "Reference_Allele", "Tumor_Seq_Allele2"
+    )
+    with pytest.raises(AssertionError, match="requires a genome"):
+        run_cohort({"S0": str(tmp_path / "S0.maf")}, kind, config, genome=None)
+
+
+def test_read_manifest_renames_columns(tmp_path):
+    path = tmp_path / "manifest.tsv"
+    pd.DataFrame({"id": ["a", "b"], "maf": ["a.maf", "b.maf"]}).to_csv(
+        path, sep="\t", index=False
+    )
+    manifest = read_manifest(path, sample_col="id", path_col="maf")
+    assert list(manifest.columns) == ["sample", "path"]
+    assert list(manifest["sample"]) == ["a", "b"]
@@ -0,0 +1,47 @@
+import json
+
+from benchmarks.run import main, parse_size, run_benchmarks
+from benchmarks.scaling import run_scaling
+from benchmarks.synthetic import make_dataset
+
+
+def test_synthetic_dataset_matches_genome(tmp_path):
+    data = make_dataset(tmp_path, 2000, genome_length=20000)
+    genome = {}
+    with open(data["fasta"]) as fasta:
+        for line in fasta:
+            if line.startswith(">"):
+                chrom = line[1:].strip()
+                genome[chrom] = ""
+            else:
+                genome[chrom] += line.strip()
+    variants = data["variants1"]
+    for row in variants.itertuples():
+        assert genome[row.chrom][row.pos - 1 : row.pos - 1 + len(row.ref)] == row.ref
+    assert set(variants["Variant_Type"]) == {"SNP", "DEL", "INS"}
+    assert make_dataset(tmp_path / "again", 2000, genome_length=20000)[
+        "variants2"
+    ].equals(data["variants2"])
+    # half of the second call set is shared with the first
+    shared = variants.merge(data["variants2"], on=["chrom", "pos", "ref", "alt"])
+    assert shared.shape[0] >= 1000
+
+
+def test_run_benchmarks_smoke(tmp_path):
+    assert parse_size("10m") == 10_000_000
+    names = ["load_snv_maf", "count_snvs", "snv_comparison", "sv_comparison"]
+    results = run_benchmarks(["1k"], names=names, data_dir=tmp_path)
+    assert results["benchmark"].tolist() == names
+    assert (results["seconds"] > 0).all()
+    assert (results["peak_mb"] > 0).all()
+
+    output = tmp_path / "results.json"
+    main(["--sizes", "500", "--only", "count_svs", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert report["results"][0]["n_items"] == 50
+
+
+def test_run_scaling_smoke():
+    results = run_scaling(["2k"], [1, 2])
+    assert results["n_jobs"].tolist() == [1, 2, 1, 2]
+    assert results["identical"].all()
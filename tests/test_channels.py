@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from dvartk.channels import (
+    CHANNEL_TABLES,
+    channel_table,
+    register_channel_table,
+)
+
+
+@pytest.mark.parametrize(
+    "name,n_channels,n_types",
+    [
+        ("SBS96", 96, 6),
+        ("SBS192", 192, 12),
+        ("SBS1536", 1536, 6),
+        ("DBS78", 78, 10),
+        ("ID83", 83, 16),
+        ("SV", 25, 5),
+    ],
+)
+def test_channel_tables(name, n_channels, n_types):
+    table = channel_table(name)
+    assert table.shape[0] == n_channels
+    assert table.index.is_unique
+    assert table["group_start"].sum() == n_types
+    assert table["group_index"].max() == n_types - 1
+    # each type is one contiguous block of channels
+    assert table["group_index"].is_monotonic_increasing
+
+
+def test_channel_table_annotations():
+    sbs96 = channel_table("SBS96")
+    assert sbs96.loc["T[C>T]G", ["type", "tick"]].tolist() == ["C>T", "TCG"]
+    sbs192 = channel_table("SBS192")
+    assert sbs192.loc["U:T[C>T]G", ["type", "tick"]].tolist() == ["U:C>T", "TCG"]
+    assert channel_table("DBS78").loc["CC>TT", ["type", "tick"]].tolist() == [
+        "CC>NN",
+        "TT",
+    ]
+    id83 = channel_table("ID83")
+    assert id83.loc["1:Del:C:0", "tick"] == "1"
+    assert id83.loc["1:Del:T:5", "tick"] == "6+"
+    assert id83.loc["1:Ins:T:5", "tick"] == "5+"
+    assert id83.loc["4:Del:R:0", "tick"] == "1"
+    assert id83.loc["5:Del:M:5", ["type", "tick"]].tolist() == [
+        "5+bp Del at Microhomology",
+        "5+",
+    ]
+    assert channel_table("SV").loc["translocation", "type"] == "translocation"
+
+
+def test_register_channel_table():
+    table = pd.DataFrame(
+        {"type": ["a", "a", "b"], "tick": ["1", "2", "1"], "color": ["r", "r", "b"]},
+        index=["a1", "a2", "b1"],
+    )
+    try:
+        registered = register_channel_table("TOY3", table)
+        assert channel_table("TOY3") is registered
+        assert registered["group_start"].tolist() == [True, False, True]
+    finally:
+        CHANNEL_TABLES.pop("TOY3", None)
+    with pytest.raises(ValueError):
+        register_channel_table("BAD", table.drop(columns="color"))
+    with pytest.raises(ValueError):
+        channel_table("TOY3")
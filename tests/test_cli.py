@@ -0,0 +1,70 @@
+import pandas as pd
+from pyfaidx import Fasta
+
+from benchmarks.synthetic import make_dataset
+from dvartk.cli import main
+from dvartk.parser import SnvComparison, SnvFileConfig, SvComparison
+from dvartk.process import count_snvs
+
+
+def test_compare_snv_and_sv_manifests(tmp_path):
+    data = make_dataset(tmp_path / "data", 2000, genome_length=20000)
+    pairs = tmp_path / "pairs.tsv"
+    pd.DataFrame(
+        {
+            "name": ["maf", "vcf", "missing"],
+            "path1": [data["maf1"], data["maf1"], str(tmp_path / "missing.maf")],
+            "path2": [data["maf2"], data["vcf2"], data["maf2"]],
+        }
+    ).to_csv(pairs, sep="\t", index=False)
+    output = tmp_path / "snv.tsv"
+    assert main(["compare-snv", "-m", str(pairs), "-j", "2", "-o", str(output)]) == 1
+
+    rows = pd.read_csv(output, sep="\t", dtype=str).set_index("name")
+    assert sorted(rows.index) == ["maf", "vcf"]
+    config = SnvFileConfig(
+        "Chromosome", "Start_Position", "Reference_Allele", "Tumor_Seq_Allele2"
+    )
+    expected = SnvComparison(
+        config.load_and_convert_maf_columns(data["maf1"]),
+        config.load_and_convert_maf_columns(data["maf2"]),
+    ).make_oneliner()
+    assert rows.loc["maf"].tolist() == expected
+    expected = SnvComparison(
+        config.load_and_convert_maf_columns(data["maf1"]),
+        config.load_vcf(data["vcf2"]),
+    ).make_oneliner()
+    assert rows.loc["vcf"].tolist() == expected
+
+    output = tmp_path / "sv.tsv"
+    argv = ["compare-sv", data["sv1"], data["sv2"], "--name", "svs", "-o", str(output)]
+    assert main(argv) == 0
+    row = pd.read_csv(output, sep="\t", dtype=str).iloc[0].tolist()
+    assert row == ["svs"] + SvComparison(data["svs1"], data["svs2"]).make_oneliner()
+
+
+def test_count_then_plot(tmp_path):
+    data = make_dataset(tmp_path / "data", 2000, genome_length=20000)
+    manifest = tmp_path / "samples.tsv"
+    pd.DataFrame({"sample": ["a", "b"], "path": [data["maf1"], data["maf2"]]}).to_csv(
+        manifest, sep="\t", index=False
+    )
+    counts_path = tmp_path / "counts.tsv"
+    argv = ["count", "snv", "-m", str(manifest), "--genome", data["fasta"]]
+    assert main(argv + ["-o", str(counts_path)]) == 0
+
+    counts = pd.read_csv(counts_path, sep="\t", index_col=0)
+    snvs = data["variants1"][data["variants1"]["Variant_Type"] == "SNP"]
+    expected = count_snvs(snvs, Fasta(data["fasta"]))
+    assert counts.loc["a"].tolist() == expected.tolist()
+    assert list(counts.columns) == list(expected.index)
+
+    listing = tmp_path / "plots.tsv"
+    plot_dir = tmp_path / "plots"
+    argv = ["plot", "snv", str(counts_path), "-d", str(plot_dir), "-o", str(listing)]
+    assert main(argv) == 0
+    assert sorted(path.name for path in plot_dir.iterdir()) == [
+        "a.snv.png",
+        "b.snv.png",
+    ]
+    assert len(listing.read_text().splitlines()) == 2
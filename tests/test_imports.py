@@ -0,0 +1,58 @@
+import json
+import subprocess
+import sys
+
+import dvartk
+
+HEAVY_MODULES = (
+    "matplotlib",
+    "seaborn",
+    "matplotlib_venn",
+    "SigProfilerMatrixGenerator",
+    "sigProfilerPlotting",
+    "pyfaidx",
+)
+# seconds, with pandas and numpy already imported; eager imports took ~2.5 s
+IMPORT_BUDGET = 0.5
+COMPARISON_BUDGET = 1.5
+
+PROBE = """
+import json, sys, time
+import numpy, pandas
+start = time.perf_counter()
+import dvartk
+imported = time.perf_counter() - start
+dvartk.SnvComparison, dvartk.SvComparison, dvartk.PartitionedComparison
+from dvartk.cli import build_parser
+build_parser()
+loaded = time.perf_counter() - start
+heavy = sorted({name.split(".")[0] for name in sys.modules} & set(HEAVY))
+print(json.dumps({"import": imported, "comparison": loaded, "heavy": heavy}))
+"""
+
+
+def test_import_is_lazy_and_within_budget():
+    script = f"HEAVY = {list(HEAVY_MODULES)!r}\n" + PROBE
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    timing = json.loads(result.stdout)
+    assert timing["heavy"] == []
+    assert timing["import"] < IMPORT_BUDGET
+    assert timing["comparison"] < COMPARISON_BUDGET
+
+
+def test_lazy_namespace_keeps_exports():
+    from dvartk.parser import SnvComparison
+    from dvartk.plotter import plot_venn2
+
+    assert dvartk.SnvComparison is SnvComparison
+    assert dvartk.plot_venn2 is plot_venn2
+    assert dvartk.process.count_snvs is dvartk.count_snvs
+    assert set(dvartk.__all__) <= set(dir(dvartk))
+    try:
+        dvartk.no_such_name
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("unknown attributes must raise AttributeError")
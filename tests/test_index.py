@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from dvartk.index import IndexComparison, VariantIndex, build_variant_index
+from dvartk.matching import match_breakpoints
+from dvartk.parser import SnvComparison, SnvFileConfig, SvComparison
+from tests.test_parser import jitter, random_snv_table, random_svs, write_snv_maf
+
+
+def test_snv_index_comparison_matches_snv_comparison(tmp_path):
+    truth = random_snv_table(3000)
+    calls = pd.concat([truth.sample(1500, random_state=0), random_snv_table(2000, 1)])
+    calls.loc[calls.index[:10], "chrom"] = "Y"  # chromosome not in the truth set
+    index_path = build_variant_index(truth, str(tmp_path / "truth.dvidx"))
+
+    cmp = IndexComparison(calls, index_path)
+    expected = SnvComparison(calls, truth)
+    assert cmp.make_oneliner() == expected.make_oneliner()
+    assert cmp.maf1_match.shape[0] == expected.maf1_match.shape[0]
+
+    rows = VariantIndex(index_path).truth_rows(calls)
+    found = rows >= 0
+    assert found.sum() == cmp.maf1_match.shape[0]
+    matched = truth.iloc[rows[found]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(matched, calls[found].reset_index(drop=True))
+
+
+def test_snv_index_from_maf_refuses_stale(tmp_path):
+    maf_path = write_snv_maf(tmp_path / "truth.maf.gz", 2000)
+    config = SnvFileConfig(
+        "Chromosome", "Start_Position", "Reference_Allele", "Tumor_Seq_Allele2"
+    )
+    index_path = build_variant_index(
+        maf_path, str(tmp_path / "truth.dvidx"), config=config
+    )
+    index = VariantIndex(index_path, source_path=maf_path)
+    truth = config.load_and_convert_maf_columns(maf_path)
+    assert index.n_rows == truth.shape[0]
+    assert IndexComparison(truth, index).counts[4] == index.keys.shape[0]
+
+    os.utime(maf_path, ns=(0, 0))
+    with pytest.raises(ValueError, match="Stale"):
+        VariantIndex(index_path, source_path=maf_path)
+
+
+def test_sv_index_comparison_matches_sv_comparison(tmp_path):
+    truth = random_svs(400)
+    calls = pd.concat([jitter(truth.iloc[:200]), random_svs(200, seed=2)])
+    calls = calls.reset_index(drop=True)
+    index = VariantIndex(build_variant_index(truth, str(tmp_path / "sv"), kind="sv"))
+
+    expected = SvComparison(calls, truth, window_size=100)
+    cmp = IndexComparison(calls, index, window_size=100)
+    assert cmp.make_oneliner() == expected.make_oneliner()
+    assert cmp.maf1_match.shape[0] == expected.maf1_match.shape[0]
+
+    pairs = index.match_breakpoints(calls, window_size=100)
+    expected_pairs = match_breakpoints(
+        truth.assign(prediction_id=truth.index),
+        calls.assign(prediction_id=calls.index),
+        window_size=100,
+    )
+    assert sorted(zip(pairs["target_id"], pairs["reference_id"])) == sorted(
+        zip(expected_pairs["target_id"], expected_pairs["reference_id"])
+    )
+    assert np.all(np.diff(np.asarray(index.keys)) >= 0)
+
+
+def test_sv_index_comparison_one_to_one_matches_sv_comparison(tmp_path):
+    truth = random_svs(400)
+    # exact copies and near duplicates compete for the same partners
+    calls = pd.concat(
+        [
+            truth.iloc[:100],
+            jitter(truth.iloc[50:150], scale=30),
+            random_svs(100, seed=2),
+        ]
+    )
+    # the call equal to truth row 0 pairs with a same-breakpoint truth row of
+    # another type first, leaving its identical truth tuple unmatched
+    decoy = truth.iloc[:1].assign(type="ins")
+    truth = pd.concat([decoy, truth, jitter(truth.iloc[50:100], seed=3, scale=30)])
+    calls, truth = calls.reset_index(drop=True), truth.reset_index(drop=True)
+    index = VariantIndex(build_variant_index(truth, str(tmp_path / "sv"), kind="sv"))
+
+    expected = SvComparison(calls, truth, window_size=100, one_to_one=True)
+    cmp = IndexComparison(calls, index, window_size=100, one_to_one=True)
+    assert cmp.make_oneliner() == expected.make_oneliner()
+    pd.testing.assert_frame_equal(cmp.maf1_match, expected.maf1_match[calls.columns])
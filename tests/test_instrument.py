@@ -0,0 +1,94 @@
+import json
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+from dvartk.instrument import STATE, instrument, instrumented, span
+from dvartk.parser import SvComparison
+from tests.test_parser import jitter, random_svs
+
+
+@instrumented(name="allocate")
+def allocate(n_bytes):
+    return np.ones(n_bytes, dtype=np.uint8).sum()
+
+
+def test_spans_nest_with_rows_and_peak_memory(tmp_path):
+    svs = random_svs(300)
+    finished = []
+    json_path = tmp_path / "spans.json"
+    with instrument(callback=finished.append, json_path=json_path) as report:
+        SvComparison(svs, jitter(svs))
+        with span("outer") as outer:
+            outer.rows = 7
+            allocate(8 * 2**20)
+            allocate(1 * 2**20)
+
+    names = [record["name"] for record in finished]
+    assert names == [
+        "matching.match_breakpoints",
+        "parser.SvComparison",
+        "allocate",
+        "allocate",
+        "outer",
+    ]
+    frame = report.to_frame().set_index("name")
+    assert frame.loc["parser.SvComparison", "rows"] == 600
+    assert frame.loc["matching.match_breakpoints", "parent"] == "parser.SvComparison"
+    allocations = report.to_frame().query("name == 'allocate'")
+    assert allocations["peak_mb"].round().tolist() == [8, 1]
+    # the outer peak includes the larger inner allocation made before the
+    # peak was reset for the second one
+    assert frame.loc["outer", "peak_mb"] >= 8
+    assert frame.loc["outer", "rows"] == 7
+    assert report.summary().loc["allocate", "calls"] == 2
+    assert json.loads(json_path.read_text()) == report.to_records()
+
+
+def test_disabled_instrumentation_records_nothing():
+    assert not STATE.active
+    with span("ignored") as stand_in:
+        stand_in.rows = 1
+    assert allocate(10) == 10
+    with instrument(trace_memory=False) as report:
+        allocate(10)
+        with pytest.raises(RuntimeError):
+            with instrument():
+                pass
+    assert report.spans[0].peak_mb is None
+    assert not STATE.active
+
+
+def test_caller_tracemalloc_session_keeps_its_peak():
+    tracemalloc.start()
+    try:
+        big = np.ones(16 * 2**20, dtype=np.uint8)
+        del big
+        session_peak = tracemalloc.get_traced_memory()[1]
+        with instrument() as report:
+            allocate(2 * 2**20)
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= session_peak
+        # below the session peak only memory still in use is seen
+        assert round(report.spans[0].peak_mb) == 0
+        # a new session peak inside the span is measured
+        with instrument() as report:
+            allocate(32 * 2**20)
+        assert round(report.spans[0].peak_mb) == 32
+    finally:
+        tracemalloc.stop()
+
+
+def test_spans_from_worker_threads():
+    with instrument() as report:
+        with span("outer"):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(allocate, [2**16] * 40))
+    frame = report.to_frame()
+    workers = frame[frame["name"] == "allocate"]
+    assert workers.shape[0] == 40
+    # worker threads keep their own stacks of open spans
+    assert workers["parent"].isna().all() and (workers["depth"] == 0).all()
+    assert frame["name"].iloc[-1] == "outer"
+    assert STATE.stack == []
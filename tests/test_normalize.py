@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from pyfaidx import Fasta
+
+from dvartk.normalize import left_align_indels, normalize_variants
+from dvartk.parser import SnvComparison
+from dvartk.reference import ReferenceCache, build_reference_cache
+from tests.conftest import write_fasta
+
+
+def naive_normalize(seq, pos, ref, alt):
+    """vt normalize: trim right, extend left when an allele empties, trim left"""
+    changed = True
+    while changed:
+        changed = False
+        if ref and alt and ref[-1] == alt[-1]:
+            ref, alt, changed = ref[:-1], alt[:-1], True
+        if not ref or not alt:
+            pos -= 1
+            ref, alt, changed = seq[pos - 1] + ref, seq[pos - 1] + alt, True
+    while len(ref) > 1 and len(alt) > 1 and ref[0] == alt[0]:
+        ref, alt, pos = ref[1:], alt[1:], pos + 1
+    return pos, ref, alt
+
+
+def repeat_genome(tmp_path, seed=0):
+    rng = np.random.default_rng(seed)
+    chroms = {}
+    for chrom in ("chr1", "chr2"):
+        pieces = []
+        while sum(len(piece) for piece in pieces) < 5000:
+            motif = "".join(rng.choice(list("ACGT"), size=rng.integers(1, 4)))
+            pieces.append(motif * int(rng.integers(1, 6)))
+        chroms[chrom] = "".join(pieces)
+    return chroms, write_fasta(tmp_path / "repeats.fa", chroms)
+
+
+def random_indels(chroms, n, seed=1):
+    """Deletions and duplications written at a random place in their repeat"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for ix in range(n):
+        chrom = rng.choice(list(chroms))
+        seq = chroms[chrom]
+        pos = int(rng.integers(20, len(seq) - 20))
+        length = int(rng.integers(1, 5))
+        if ix % 2:
+            rows.append((chrom, pos, seq[pos - 1 : pos + length], seq[pos - 1]))
+        else:
+            inserted = seq[pos : pos + length]
+            rows.append((chrom, pos, seq[pos - 1], seq[pos - 1] + inserted))
+    return pd.DataFrame(rows, columns=["chrom", "pos", "ref", "alt"])
+
+
+def test_left_align_matches_naive(tmp_path):
+    chroms, fasta_path = repeat_genome(tmp_path)
+    indels = random_indels(chroms, 400)
+    # padded, right-shifted and MNV/SNV rows on top of the plain indels
+    extra = pd.DataFrame(
+        [
+            (
+                "chr1",
+                30,
+                chroms["chr1"][29:33],
+                chroms["chr1"][29] + chroms["chr1"][32],
+            ),
+            ("chr2", 40, chroms["chr2"][39], "G"),
+            ("chr2", 50, chroms["chr2"][49:51], "TT"),
+        ],
+        columns=["chrom", "pos", "ref", "alt"],
+    )
+    indels = pd.concat([indels, extra], ignore_index=True)
+    for genome in (
+        Fasta(fasta_path),
+        ReferenceCache(build_reference_cache(fasta_path)),
+    ):
+        normalized = left_align_indels(indels, genome)
+        for row, norm in zip(indels.itertuples(), normalized.itertuples()):
+            if len(row.ref) == len(row.alt):
+                assert (norm.pos, norm.ref, norm.alt) == (row.pos, row.ref, row.alt)
+                continue
+            expected = naive_normalize(chroms[row.chrom], row.pos, row.ref, row.alt)
+            assert (norm.pos, norm.ref, norm.alt) == expected, row
+
+
+def test_tolerant_snv_comparison(tmp_path):
+    chroms, fasta_path = repeat_genome(tmp_path)
+    genome = Fasta(fasta_path)
+    calls1 = random_indels(chroms, 300)
+    calls2 = normalize_variants(calls1, genome)
+    calls2["chrom"] = calls2["chrom"].str.replace("chr", "")
+    shifted = calls2["ref"].ne(calls1["ref"]) | calls2["pos"].ne(calls1["pos"])
+    assert shifted.any()
+
+    exact = SnvComparison(calls1, calls2)
+    assert exact.maf1_match.shape[0] == 0
+    tolerant = SnvComparison(calls1, calls2, genome=genome, strip_chr=True)
+    assert tolerant.maf1_match.shape[0] == calls1.shape[0]
+    assert tolerant.maf2_nonmatch.shape[0] == 0
+    assert list(tolerant.maf1_match.columns) == list(exact.maf1_match.columns)
+    assert tolerant.maf1_match.index.names == exact.maf1_match.index.names
+    n_distinct = calls2.drop_duplicates().shape[0]
+    assert tolerant.make_oneliner()[4] == str(n_distinct)
+
+
+def test_window_snv_comparison():
+    calls1 = pd.DataFrame(
+        {
+            "chrom": ["1", "1", "1", "2", "2"],
+            "pos": [100, 200, 300, 5, 1000],
+            "ref": ["A", "C", "G", "T", "A"],
+            "alt": ["T", "G", "A", "C", "G"],
+        }
+    )
+    calls2 = pd.DataFrame(
+        {
+            "chrom": ["chr1", "chr1", "chr1", "chr2", "chr2"],
+            "pos": [102, 200, 310, 1, 1000],
+            "ref": ["A", "C", "G", "T", "A"],
+            "alt": ["T", "A", "A", "C", "G"],
+        }
+    )
+    cmp = SnvComparison(calls1, calls2, strip_chr=True, window=5)
+    assert cmp.maf1_match["pos"].tolist() == [100, 5, 1000]
+    assert cmp.maf2_match["pos"].tolist() == [102, 1, 1000]
+    assert cmp.make_oneliner() == ["5", "5", "2", "2", "3", "7"]
+    assert SnvComparison(calls1, calls2, strip_chr=True).make_oneliner()[4] == "1"
@@ -0,0 +1,296 @@
+import gzip
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from dvartk.matching import match_breakpoints
+from dvartk.parser import (
+    MultiComparison,
+    SnvComparison,
+    SnvFileConfig,
+    SvComparison,
+)
+
+
+def random_svs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    chromosome_1 = rng.choice(["1", "2", "3"], size=n)
+    chromosome_2 = np.where(
+        rng.random(n) < 0.7, chromosome_1, rng.choice(["1", "2", "3"], size=n)
+    )
+    return pd.DataFrame(
+        {
+            "chromosome_1": chromosome_1,
+            "position_1": rng.integers(1, 20000, size=n),
+            "strand_1": rng.choice(["+", "-"], size=n),
+            "chromosome_2": chromosome_2,
+            "position_2": rng.integers(1, 20000, size=n),
+            "strand_2": rng.choice(["+", "-"], size=n),
+            "type": rng.choice(["del", "dup", "inv", "translocation"], size=n),
+            "length": rng.integers(1, 10000, size=n),
+        }
+    )
+
+
+def jitter(svs, seed=1, scale=150):
+    rng = np.random.default_rng(seed)
+    svs = svs.copy()
+    for col in ("position_1", "position_2"):
+        svs[col] = svs[col] + rng.integers(-scale, scale + 1, size=svs.shape[0])
+    return svs
+
+
+def sorted_pairs(match):
+    return sorted(zip(match["target_id"], match["reference_id"]))
+
+
+def test_match_breakpoints_matches_wgs_analysis():
+    rearrangement = pytest.importorskip("wgs_analysis.algorithms.rearrangement")
+    reference = random_svs(300).assign(prediction_id=lambda df: df.index + 1000)
+    target = pd.concat([jitter(reference.iloc[:150]), random_svs(150, seed=2)])
+    crossed = reference.iloc[150:200].rename(
+        columns={
+            "chromosome_1": "chromosome_2",
+            "position_1": "position_2",
+            "strand_1": "strand_2",
+            "chromosome_2": "chromosome_1",
+            "position_2": "position_1",
+            "strand_2": "strand_1",
+        }
+    )
+    target = pd.concat([target, crossed]).reset_index(drop=True)
+    target["prediction_id"] = target.index
+
+    expected = rearrangement.match_breakpoints(reference, target, window_size=200)
+    observed = match_breakpoints(reference, target, window_size=200)
+    assert list(observed.columns) == ["target_id", "reference_id"]
+    assert sorted_pairs(observed) == sorted_pairs(expected)
+    assert len(observed) >= 200
+
+
+def test_match_breakpoints_one_to_one():
+    reference = random_svs(50).assign(prediction_id=range(50))
+    target = pd.concat([jitter(reference, scale=20), jitter(reference, seed=3)])
+    target = target.reset_index(drop=True).assign(prediction_id=range(100))
+    match = match_breakpoints(reference, target, window_size=200, one_to_one=True)
+    assert match["target_id"].is_unique and match["reference_id"].is_unique
+    assert len(match) == 50
+
+
+def test_sv_comparison_window_size():
+    maf1 = random_svs(100)
+    maf2 = jitter(maf1, scale=100)
+    assert SvComparison(maf1, maf2, window_size=100).make_oneliner()[4] == "100"
+    narrow = SvComparison(maf1, maf2, window_size=10).make_oneliner()
+    assert int(narrow[4]) < 100
+
+
+def random_snv_table(n, seed=0):
+    rng = np.random.default_rng(seed)
+    refs = rng.choice(["A", "C", "G", "T", "AT", "CAG"], size=n)
+    return pd.DataFrame(
+        {
+            "chrom": rng.choice(["1", "2", "X"], size=n),
+            "pos": rng.integers(1, 5000, size=n),
+            "ref": refs,
+            "alt": rng.choice(["A", "C", "G", "T", "TTA"], size=n),
+        }
+    )
+
+
+def test_snv_comparison_counts_match_tuple_sets():
+    maf1 = random_snv_table(3000)
+    maf2 = pd.concat([maf1.sample(1500, random_state=0), random_snv_table(2000, 1)])
+    cmp = SnvComparison(maf1, maf2)
+    A = set(maf1.itertuples(index=False, name=None))
+    B = set(maf2.itertuples(index=False, name=None))
+    expected = [len(A), len(B), len(A - B), len(B - A), len(A & B), len(A | B)]
+    assert cmp.make_oneliner() == [str(_) for _ in expected]
+    assert cmp.sets is None  # counting does not materialize tuple sets
+    assert cmp.A == A and cmp.B == B and cmp.A_and_B == A & B
+    assert cmp.maf1_match.shape[0] + cmp.maf1_nonmatch.shape[0] == maf1.shape[0]
+    assert cmp.get_set_counts(get_return=True)[-1] == A | B
+
+
+def test_multi_comparison_matches_pairwise():
+    mafs = {
+        "caller1": random_snv_table(2000, 0),
+        "caller2": random_snv_table(2000, 0).iloc[:1200],
+        "caller3": pd.concat(
+            [random_snv_table(2000, 0).iloc[800:], random_snv_table(500, 3)]
+        ),
+    }
+    cmp = MultiComparison(mafs)
+    table = cmp.make_table()
+    assert table.shape[0] == 3
+    for row in table.itertuples(index=False):
+        pair = SnvComparison(mafs[row.name1], mafs[row.name2]).make_oneliner()
+        assert [str(_) for _ in row[2:]] == pair
+
+    subsets = cmp.membership_counts()
+    assert subsets["count"].sum() == len(cmp.keys)
+    everywhere = subsets[subsets[["caller1", "caller2", "caller3"]].all(axis=1)]
+    assert everywhere["count"].sum() > 0
+
+
+def write_snv_maf(path, n, seed=0, n_extra=20):
+    rng = np.random.default_rng(seed)
+    maf = pd.DataFrame(
+        {
+            "Chromosome": rng.choice(["1", "2", "X"], size=n),
+            "Start_Position": rng.integers(1, 10**8, size=n),
+            "Reference_Allele": rng.choice(list("ACGT"), size=n),
+            "Tumor_Seq_Allele2": rng.choice(list("ACGT"), size=n),
+            "Variant_Type": rng.choice(["SNP", "SNP", "DEL", "INS"], size=n),
+        }
+    )
+    for ix in range(n_extra):
+        maf[f"extra_{ix}"] = rng.random(n)
+    with gzip.open(path, "wt") as maf_file:
+        maf_file.write("#version 2.4\n")
+        maf.to_csv(maf_file, sep="\t", index=False)
+    return str(path)
+
+
+def test_snv_loader_projects_and_filters_in_chunks(tmp_path):
+    maf_path = write_snv_maf(tmp_path / "snvs.maf.gz", 5000)
+    config = SnvFileConfig(
+        "Chromosome", "Start_Position", "Reference_Allele", "Tumor_Seq_Allele2"
+    )
+    full = config.convert_maf_columns(config.select_SNPs(config.load_maf(maf_path)))
+    maf = config.load_and_convert_maf_columns(maf_path, chunksize=700)
+    assert list(maf.columns) == ["chrom", "pos", "ref", "alt", "Variant_Type"]
+    assert isinstance(maf["chrom"].dtype, pd.CategoricalDtype)
+    assert maf["pos"].dtype == np.int32
+    assert (maf.index == full.index).all()
+    for col in ("chrom", "pos", "ref", "alt"):
+        assert (maf[col].astype(str) == full[col].astype(str)).all()
+
+
+def test_load_with_table_cache(tmp_path):
+    pytest.importorskip("pyarrow")
+    maf_path = write_snv_maf(tmp_path / "snvs.maf.gz", 2000)
+    cache_dir = str(tmp_path / "cache")
+    config = SnvFileConfig(
+        "Chromosome", "Start_Position", "Reference_Allele", "Tumor_Seq_Allele2"
+    )
+    loaded = config.load_and_convert_maf_columns(maf_path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    cached = config.load_and_convert_maf_columns(maf_path, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(cached, loaded)
+
+    other = config.load_and_convert_maf_columns(
+        maf_path, extra_columns=["extra_0"], cache_dir=cache_dir
+    )
+    assert "extra_0" in other.columns
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def assert_same_comparison(updated, rebuilt):
+    assert updated.make_oneliner() == rebuilt.make_oneliner()
+    for name in ("maf1_match", "maf1_nonmatch", "maf2_match", "maf2_nonmatch"):
+        frames = [
+            getattr(cmp, name)
+            .reset_index(drop=True)
+            .drop(columns="prediction_id", errors="ignore")
+            for cmp in (updated, rebuilt)
+        ]
+        key = list(frames[0].columns)
+        observed, expected = [
+            frame.sort_values(key, ignore_index=True) for frame in frames
+        ]
+        pd.testing.assert_frame_equal(observed, expected)
+
+
+@pytest.mark.parametrize("window", [0, 20])
+def test_snv_comparison_updates_match_rebuild(tmp_path, window):
+    maf1 = random_snv_table(3000)
+    maf2 = pd.concat([maf1.sample(1500, random_state=0), random_snv_table(2000, 1)])
+    cmp = SnvComparison(maf1.iloc[:1000], maf2.iloc[:500], window=window)
+    cmp.make_oneliner()
+    cmp.add_a(maf1.iloc[1000:])
+    cmp.add_b(maf2.iloc[500:])
+    assert_same_comparison(cmp, SnvComparison(maf1, maf2, window=window))
+
+    # new chromosome, then removals touching two chromosomes
+    extra = random_snv_table(100, 2).assign(chrom="Y")
+    cmp.add_b(extra)
+    removed = maf1[maf1["chrom"].isin(["1", "X"])].iloc[:400]
+    cmp.remove(a=removed, b=extra.iloc[:50])
+    kept1 = maf1.merge(removed.drop_duplicates(), how="left", indicator=True)
+    kept1 = kept1[kept1["_merge"] == "left_only"].drop(columns="_merge")
+    kept2 = pd.concat([maf2, extra.iloc[50:]])
+    rebuilt = SnvComparison(kept1, kept2, window=window)
+    assert_same_comparison(cmp, rebuilt)
+    assert cmp.A == rebuilt.A
+
+    loaded = SnvComparison.load(cmp.save(tmp_path / "cmp"))
+    assert_same_comparison(loaded, rebuilt)
+    loaded.add_a(extra.iloc[:10])
+    assert_same_comparison(
+        loaded, SnvComparison(pd.concat([kept1, extra.iloc[:10]]), kept2, window=window)
+    )
+
+
+@pytest.mark.parametrize("one_to_one", [False, True])
+def test_sv_comparison_updates_match_rebuild(tmp_path, one_to_one):
+    maf1 = random_svs(400)
+    maf2 = pd.concat([jitter(maf1.iloc[:300]), random_svs(100, seed=2)])
+    maf2 = maf2.reset_index(drop=True)
+    cmp = SvComparison(maf1.iloc[:200], maf2.iloc[:100], one_to_one=one_to_one)
+    cmp.add_a(maf1.iloc[200:])
+    cmp.add_b(maf2.iloc[100:])
+    rebuilt = SvComparison(maf1, maf2, one_to_one=one_to_one)
+    assert_same_comparison(cmp, rebuilt)
+    assert cmp.get_set_counts(get_return=True) == rebuilt.get_set_counts(True)
+
+    cmp.remove(b=maf2.iloc[:50])
+    # row labels stay unique after concatenating and dropping rows
+    for maf in (cmp.maf1, cmp.maf2):
+        assert maf.index.equals(pd.RangeIndex(maf.shape[0]))
+        assert maf["prediction_id"].is_unique
+    loaded = SvComparison.load(cmp.save(tmp_path / "cmp"))
+    assert not list((tmp_path / "cmp").glob("*.pkl"))
+    rebuilt = SvComparison(maf1, maf2.iloc[50:], one_to_one=one_to_one)
+    assert_same_comparison(loaded, rebuilt)
+
+
+def test_comparison_save_load_keeps_regions(tmp_path):
+    maf1 = random_snv_table(2000)
+    maf2 = pd.concat([maf1.sample(1000, random_state=0), random_snv_table(1000, 1)])
+    regions = ["1:1-100,000,000", "X"]
+    cmp = SnvComparison(maf1.iloc[:1000], maf2, regions=regions)
+    loaded = SnvComparison.load(cmp.save(tmp_path / "cmp"))
+    loaded.add_a(maf1.iloc[1000:])
+    rebuilt = SnvComparison(maf1, maf2, regions=regions)
+    assert_same_comparison(loaded, rebuilt)
+    assert set(loaded.maf1["chrom"]) <= {"1", "X"}
+
+
+@pytest.mark.parametrize("window", [0, 20])
+def test_snv_comparison_n_jobs_matches_serial(window):
+    maf1 = random_snv_table(3000)
+    maf2 = pd.concat([maf1.sample(1500, random_state=0), random_snv_table(2000, 1)])
+    serial = SnvComparison(maf1, maf2, window=window)
+    parallel = SnvComparison(maf1, maf2, window=window, n_jobs=3)
+    assert_same_comparison(parallel, serial)
+    np.testing.assert_array_equal(parallel.match1, serial.match1)
+    np.testing.assert_array_equal(parallel.match2, serial.match2)
+    extra = random_snv_table(200, 4)
+    parallel.add_a(extra)
+    rebuilt = SnvComparison(pd.concat([maf1, extra]), maf2, window=window)
+    assert_same_comparison(parallel, rebuilt)
+
+
+@pytest.mark.parametrize("one_to_one", [False, True])
+def test_sv_comparison_n_jobs_matches_serial(one_to_one):
+    maf1 = random_svs(600)
+    maf2 = pd.concat([jitter(maf1.iloc[:400]), random_svs(300, seed=2)])
+    maf2 = maf2.reset_index(drop=True)
+    serial = SvComparison(maf1, maf2, one_to_one=one_to_one)
+    parallel = SvComparison(maf1, maf2, one_to_one=one_to_one, n_jobs=2)
+    assert_same_comparison(parallel, serial)
+    np.testing.assert_array_equal(parallel.match1, serial.match1)
+    np.testing.assert_array_equal(parallel.match2, serial.match2)
+    pd.testing.assert_frame_equal(parallel.maf1_match, serial.maf1_match)
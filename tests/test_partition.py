@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from dvartk.parser import SnvComparison, SnvFileConfig, SvComparison
+from dvartk.partition import PartitionedComparison
+from dvartk.regions import filter_snvs, read_bed
+from tests.test_parser import random_snv_table, random_svs, write_snv_maf
+
+SNV_CONFIG = SnvFileConfig(
+    "Chromosome", "Start_Position", "Reference_Allele", "Tumor_Seq_Allele2"
+)
+
+
+def write_bed(path, rows):
+    with open(path, "w") as bed:
+        bed.write("track name=confident\n")
+        for row in rows:
+            bed.write("\t".join(str(field) for field in row) + "\tname\n")
+    return str(path)
+
+
+def test_partitioned_snv_counts_match_whole_comparison(tmp_path):
+    maf1 = random_snv_table(3000)
+    maf2 = pd.concat([maf1.sample(1500, random_state=0), random_snv_table(2000, 1)])
+    expected = SnvComparison(maf1, maf2).make_oneliner()
+    cmp = PartitionedComparison(maf1, maf2, kind="snv")
+    assert cmp.make_oneliner() == expected
+    assert cmp.counts.index.tolist() == ["1", "2", "X"]
+
+    bed_path = write_bed(tmp_path / "confident.bed", [("1", 0, 2000), ("X", 100, 4000)])
+    expected = SnvComparison(maf1, maf2, regions=bed_path).make_oneliner()
+    cmp = PartitionedComparison(maf1, maf2, kind="snv", regions=bed_path, n_workers=2)
+    assert cmp.make_oneliner() == expected
+    assert cmp.counts.index.tolist() == ["1", "X"]
+
+
+def test_partitioned_snv_streams_maf_and_vcf(tmp_path):
+    maf_path = write_snv_maf(tmp_path / "snvs.maf.gz", 5000)
+    maf = SNV_CONFIG.load_and_convert_maf_columns(maf_path)
+    other = maf[["chrom", "pos", "ref", "alt"]].sample(2000, random_state=1)
+    other = other.astype(str).astype({"pos": int}).sort_values(["chrom", "pos"])
+    vcf_path = tmp_path / "other.vcf"
+    with open(vcf_path, "w") as vcf:
+        vcf.write("##fileformat=VCFv4.2\n")
+        vcf.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for row in other.itertuples(index=False):
+            vcf.write(f"{row.chrom}\t{row.pos}\t.\t{row.ref}\t{row.alt}\t.\tPASS\t.\n")
+    vcf_path = str(vcf_path)
+
+    regions = ["1:1-50,000,000", "X"]
+    expected = SnvComparison(
+        maf[["chrom", "pos", "ref", "alt"]], other, regions=regions
+    ).make_oneliner()
+    cmp = PartitionedComparison(
+        maf_path, vcf_path, SNV_CONFIG, kind="snv", regions=regions, chunksize=700
+    )
+    assert cmp.make_oneliner() == expected
+    assert int(expected[4]) == filter_snvs(other, regions).drop_duplicates().shape[0]
+
+
+def test_partitioned_sv_counts_match_whole_comparison(tmp_path):
+    maf1 = random_svs(500)
+    maf2 = pd.concat([maf1.iloc[:250], random_svs(250, seed=2)], ignore_index=True)
+    expected = SvComparison(maf1, maf2).make_oneliner()
+    cmp = PartitionedComparison(maf1, maf2, kind="sv")
+    assert cmp.make_oneliner() == expected
+    assert "1|3" in cmp.counts.index
+
+    bed_path = write_bed(tmp_path / "confident.bed", [("1", 0, 10000), ("2", 0, 20000)])
+    assert read_bed(bed_path).shape[0] == 2
+    expected = SvComparison(maf1, maf2, regions=bed_path).make_oneliner()
+    cmp = PartitionedComparison(maf1, maf2, kind="sv", regions=bed_path)
+    assert cmp.make_oneliner() == expected
+    assert not any("3" in label for label in cmp.counts.index)
+    assert np.all(cmp.counts["A|B"] >= cmp.counts["A&B"])
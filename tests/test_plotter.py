@@ -0,0 +1,87 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from dvartk.plotter import SpectraRenderer, save_spectra, spectrum_template
+
+
+def random_counts(kind, n_samples=3, seed=0):
+    labels = spectrum_template(kind).index
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        rng.integers(0, 500, size=(n_samples, len(labels))),
+        index=[f"S{ix}" for ix in range(n_samples)],
+        columns=labels,
+    )
+
+
+@pytest.mark.parametrize("kind,n_channels", [("snv", 96), ("indel", 83), ("sv", 25)])
+def test_spectrum_template(kind, n_channels):
+    template = spectrum_template(kind)
+    assert template.shape[0] == n_channels
+    assert template["color"].notna().all()
+
+
+@pytest.mark.parametrize("kind", ["snv", "indel", "sv"])
+@pytest.mark.parametrize("fmt", ["png", "svg", "pdf"])
+def test_save_spectra_writes_files(tmp_path, kind, fmt):
+    counts = random_counts(kind)
+    paths = save_spectra(counts, kind, tmp_path, fmt=fmt)
+    assert [p.rsplit("/", 1)[-1] for p in paths] == [
+        f"S{ix}.{kind}.{fmt}" for ix in range(3)
+    ]
+    assert all((tmp_path / path).stat().st_size > 0 for path in paths)
+    assert plt.get_fignums() == []
+
+
+def test_renderer_updates_bars_and_writes_multipage_pdf(tmp_path):
+    counts = random_counts("snv", n_samples=4)
+    with SpectraRenderer("snv") as renderer:
+        renderer.render(counts.iloc[1], "S1")
+        heights = [bar.get_height() for bar in renderer.bars]
+        assert heights == counts.iloc[1].tolist()
+        assert renderer.ax.get_ylim()[1] >= counts.iloc[1].max()
+        renderer.save_pdf(counts, tmp_path / "cohort.pdf")
+    with open(tmp_path / "cohort.pdf", "rb") as pdf:
+        assert b"/Count 4" in pdf.read()
+
+
+def test_pyplot_spectra_use_channel_tables(tmp_path):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from dvartk.plotter import (
+        plot_indel_spectra,
+        plot_snv_spectra,
+        proc_indel_dataframe,
+    )
+
+    snv_counts = random_counts("snv", n_samples=1).iloc[0]
+    plot_snv_spectra(snv_counts, "S0", save_path=tmp_path / "snv.png")
+    indel_counts = random_counts("indel", n_samples=1).iloc[0].to_frame("count")
+    df = proc_indel_dataframe(indel_counts)
+    assert df.columns.tolist() == ["count", "index", "indel_type", "feature_length"]
+    plot_indel_spectra(indel_counts, "S0", save_path=tmp_path / "indel.png")
+    assert (tmp_path / "snv.png").exists() and (tmp_path / "indel.png").exists()
+
+
+def test_pyplot_spectra_close_or_return_figures(tmp_path):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from dvartk.plotter import plot_snv_spectra, plot_sv_spectra
+
+    plt.close("all")
+    snv_counts = random_counts("snv", n_samples=1).iloc[0]
+    sv_counts = random_counts("sv", n_samples=1).iloc[0]
+    for ix in range(3):
+        plot_snv_spectra(snv_counts, "S0", save_path=tmp_path / f"snv{ix}.png")
+        plot_sv_spectra(sv_counts, "S0", save_path=tmp_path / f"sv{ix}.png")
+    assert plt.get_fignums() == []
+
+    # without save_path the caller owns the open figure
+    fig = plot_sv_spectra(sv_counts, "S0")
+    assert plt.get_fignums() == [fig.number]
+    plt.close(fig)
@@ -0,0 +1,258 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from pyfaidx import Fasta
+
+from dvartk import process
+from dvartk.process import (
+    ID83_LABELS,
+    anchor_maf_indels,
+    classify_indels,
+    count_indels,
+    count_snvs,
+    count_snvs_cohort,
+    count_snv_spectra,
+    count_snvs_naive,
+    count_svs,
+    count_svs_naive,
+)
+from dvartk.channels import DBS78_LABELS, SvChannelSchema
+from tests.conftest import DATA_DIR, random_snvs
+
+
+def test_count_snvs_matches_naive(genome):
+    snvs = random_snvs(genome, 2000)
+    counts = count_snvs(snvs, genome)
+    expected = count_snvs_naive(snvs, genome)
+    pd.testing.assert_series_equal(counts, expected)
+    assert counts.sum() == snvs.shape[0]
+
+
+def test_count_snvs_cohort_matches_per_sample(genome):
+    sites = random_snvs(genome, 300)
+    rng = np.random.default_rng(2)
+    # recurrent sites shared across samples, plus duplicates within a sample
+    rows = rng.integers(0, sites.shape[0], size=3000)
+    cohort = sites.iloc[rows].reset_index(drop=True)
+    cohort["sample"] = rng.choice(["S1", "S2", "S3"], size=cohort.shape[0])
+    cohort = cohort.astype({"chrom": "category", "alt": "category"})
+
+    counts = count_snvs_cohort(cohort, genome, samples=["S3", "S2", "S1", "S0"])
+    assert list(counts.index) == ["S3", "S2", "S1", "S0"]
+    assert counts.loc["S0"].sum() == 0
+    for sample, snvs in cohort.groupby("sample"):
+        expected = count_snvs(snvs, genome)
+        assert counts.loc[sample].tolist() == expected.tolist()
+
+    chunks = (cohort.iloc[start : start + 700] for start in range(0, 3000, 700))
+    chunked = count_snvs_cohort(chunks, genome, samples=["S3", "S2", "S1", "S0"])
+    pd.testing.assert_frame_equal(chunked, counts)
+
+    indexed = count_snvs_cohort(cohort, genome, samples=counts.index)
+    pd.testing.assert_frame_equal(indexed, counts)
+
+    unknown = cohort.head(5).assign(chrom="Y")
+    with pytest.warns(UserWarning, match="skipped 5 SNVs"):
+        counts = count_snvs_cohort(pd.concat([cohort, unknown]), genome)
+    assert counts.to_numpy().sum() == cohort.shape[0]
+
+
+def reverse_complement(bases):
+    return bases[::-1].translate(str.maketrans("ACGT", "TGCA"))
+
+
+def test_count_snv_spectra_matches_naive(genome):
+    snvs = random_snvs(genome, 3000)
+    snvs = snvs[snvs["pos"].between(3, 4997)].reset_index(drop=True)
+    genes = pd.DataFrame(
+        {
+            "chrom": ["1", "1", "2", "2"],
+            "start": [0, 3000, 1000, 1500],
+            "end": [2000, 5000, 2000, 2500],
+            "strand": ["+", "-", "+", "-"],
+        }
+    )
+    spectra = count_snv_spectra(
+        snvs, genome, ["SBS96", "SBS192", "SBS1536"], genes=genes, doublets=False
+    )
+    pd.testing.assert_series_equal(
+        spectra["SBS96"], count_snvs(snvs, genome), check_names=False
+    )
+
+    # by default SNVs next to another SNV are left out, whatever is requested
+    ordered = snvs.sort_values(["chrom", "pos"])
+    gaps = ordered.groupby("chrom")["pos"].diff()
+    adjacent = (gaps == 1) | (gaps.shift(-1) == 1)
+    isolated = ordered[~adjacent.to_numpy()]
+    assert adjacent.any()
+    for requested in (["SBS96"], ["SBS96", "DBS78"]):
+        sbs96 = count_snv_spectra(snvs, genome, requested)["SBS96"]
+        pd.testing.assert_series_equal(
+            sbs96, count_snvs(isolated, genome), check_names=False
+        )
+
+    expected_1536, expected_192 = {}, {}
+    for chrom, pos, alt in zip(snvs["chrom"], snvs["pos"], snvs["alt"]):
+        context = genome[chrom][pos - 3 : pos + 2].seq.upper()
+        if context[2] in "AG":
+            context, alt = reverse_complement(context), reverse_complement(alt)
+        label = f"{context[:2]}[{context[2]}>{alt}]{context[3:]}"
+        expected_1536[label] = expected_1536.get(label, 0) + 1
+        on_strands = {
+            strand
+            for gene_chrom, start, end, strand in genes.itertuples(index=False)
+            if gene_chrom == chrom and start < pos <= end
+        }
+        if len(on_strands) == 1:
+            ref = genome[chrom][pos - 1 : pos].seq.upper()
+            same_strand = (ref in "CT") == (on_strands == {"+"})
+            label = f"{'U' if same_strand else 'T'}:{label[1:-1]}"
+            expected_192[label] = expected_192.get(label, 0) + 1
+    for name, expected in [("SBS1536", expected_1536), ("SBS192", expected_192)]:
+        counts = spectra[name]
+        assert counts[counts > 0].to_dict() == expected
+
+
+def test_count_snv_spectra_doublets(genome):
+    seq = genome["1"][:].seq.upper()
+
+    def substitute(bases, shift=1):
+        return "".join("ACGT"[("ACGT".index(base) + shift) % 4] for base in bases)
+
+    rows = []
+    # runs of two (doublets) and three (MNV, not counted) adjacent SNVs
+    for pos, length in [(101, 2), (201, 2), (301, 3), (401, 1)]:
+        for offset in range(length):
+            ref = seq[pos + offset - 1]
+            rows.append(("1", pos + offset, ref, substitute(ref)))
+    # a doublet given as one row
+    rows.append(("1", 501, seq[500:502], substitute(seq[500:502], 2)))
+    snvs = pd.DataFrame(rows, columns=["chrom", "pos", "ref", "alt"])
+    cohort = pd.concat([snvs.assign(sample="S1"), snvs.assign(sample="S2")])
+
+    spectra = count_snv_spectra(cohort, genome, ["SBS96", "DBS78"], sample_col="sample")
+    dbs = spectra["DBS78"]
+    assert list(dbs.columns) == DBS78_LABELS
+    # only the lone SNV is left for SBS96, with or without DBS78
+    assert spectra["SBS96"].sum(axis=1).tolist() == [1, 1]
+    sbs96 = count_snv_spectra(cohort, genome, ["SBS96"], sample_col="sample")
+    pd.testing.assert_frame_equal(sbs96["SBS96"], spectra["SBS96"])
+    with pytest.raises(ValueError, match="ref column"):
+        count_snv_spectra(snvs.drop(columns="ref"), genome, ["DBS78"])
+
+    expected = pd.Series(0, index=DBS78_LABELS)
+    for start in (100, 200, 500):
+        ref = seq[start : start + 2]
+        alt = substitute(ref, 2 if start == 500 else 1)
+        label = f"{ref}>{alt}"
+        if label not in expected.index:
+            label = f"{reverse_complement(ref)}>{reverse_complement(alt)}"
+        expected[label] += 1
+    for sample in ("S1", "S2"):
+        assert dbs.loc[sample].tolist() == expected.tolist()
+
+
+def test_classify_indels_matches_sigprofiler_fixture():
+    # fixture regenerated with tests/data/make_id83_fixture.py from SigProfiler
+    fasta = Fasta(os.path.join(DATA_DIR, "id83_fixture.fa"))
+    indels = pd.read_csv(
+        os.path.join(DATA_DIR, "id83_fixture.tsv"), sep="\t", dtype={"chrom": str}
+    )
+    channels = classify_indels(indels, fasta)
+    assert (channels >= 0).all()
+    indels["observed"] = np.array(ID83_LABELS)[channels]
+    mismatched = indels[indels["observed"] != indels["channel"]]
+    assert mismatched.empty, mismatched.head(20).to_string()
+
+    # a lone indel fetches only the span its repeat/microhomology walks reach
+    for ix in range(0, indels.shape[0], 25):
+        assert classify_indels(indels.iloc[[ix]], fasta)[0] == channels[ix]
+
+    # first bases that differ are complex substitutions, not indels
+    is_del = indels["ref"].str.len() > indels["alt"].str.len()
+    complex_indels = pd.concat(
+        [
+            indels[~is_del].head(3).assign(alt=lambda df: "N" + df["alt"].str[1:]),
+            indels[is_del].head(3).assign(alt="N"),
+        ]
+    )
+    assert (classify_indels(complex_indels, fasta) == -1).all()
+
+    counts = count_indels(indels, genome=fasta)
+    expected = indels["channel"].value_counts().reindex(ID83_LABELS, fill_value=0)
+    assert (counts["count"] == expected).all()
+
+
+def test_count_indels_positional_genome_version(monkeypatch):
+    calls = []
+
+    def fake_sigprofiler(df, genome_version="GRCh37"):
+        calls.append(genome_version)
+        return pd.DataFrame(0, index=ID83_LABELS, columns=["count"])
+
+    monkeypatch.setattr(process, "count_indels_sigprofiler", fake_sigprofiler)
+    indels = pd.DataFrame({"chrom": ["1"], "pos": [10], "ref": ["AT"], "alt": ["A"]})
+    count_indels(indels, "GRCh38")
+    assert calls == ["GRCh38"]
+
+
+def test_anchor_maf_indels_restores_vcf_alleles():
+    fasta = Fasta(os.path.join(DATA_DIR, "id83_fixture.fa"))
+    indels = pd.read_csv(
+        os.path.join(DATA_DIR, "id83_fixture.tsv"), sep="\t", dtype={"chrom": str}
+    )
+    indels = indels[indels["ref"].str[0] == indels["alt"].str[0]]
+    is_del = indels["ref"].str.len() > indels["alt"].str.len()
+    maf_style = pd.DataFrame(
+        {
+            "chrom": indels["chrom"],
+            "pos": np.where(is_del, indels["pos"] + 1, indels["pos"]),
+            "ref": np.where(is_del, indels["ref"].str[1:], "-"),
+            "alt": np.where(is_del, "-", indels["alt"].str[1:]),
+        }
+    )
+    anchored = anchor_maf_indels(maf_style, fasta)
+    assert (anchored["pos"].to_numpy() == indels["pos"].to_numpy()).all()
+    assert (anchored["ref"].to_numpy() == indels["ref"].str.upper().to_numpy()).all()
+    assert (anchored["alt"].to_numpy() == indels["alt"].str.upper().to_numpy()).all()
+
+
+def random_sv_table(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = 10 ** rng.uniform(0, 8, size=n)
+    lengths[:5] = [0, 1e3, 1e4, np.nan, 1e7]  # bin edges and missing lengths
+    return pd.DataFrame(
+        {
+            "sample": rng.choice(["S1", "S2", "S3"], size=n),
+            "type": rng.choice(["del", "dup", "ins", "inv", "translocation", "x"], n),
+            "length": lengths,
+        }
+    )
+
+
+def test_count_svs_matches_naive():
+    svs = random_sv_table(5000)
+    counts = count_svs(svs)
+    pd.testing.assert_series_equal(counts, count_svs_naive(svs), check_dtype=False)
+    categorical = svs.astype({"type": "category"})
+    pd.testing.assert_series_equal(count_svs(categorical), counts)
+
+
+def test_count_svs_by_sample():
+    svs = random_sv_table(5000)
+    matrix = count_svs(svs, by="sample")
+    assert list(matrix.index) == ["S1", "S2", "S3"]
+    for sample, sample_svs in svs.groupby("sample"):
+        assert (matrix.loc[sample] == count_svs(sample_svs)).all()
+
+
+def test_sv_schema_custom_bins():
+    schema = SvChannelSchema(
+        binned_types=["del"], length_edges=[0, 100, np.inf], length_labels=["s", "l"]
+    )
+    svs = pd.DataFrame(
+        {"type": ["del", "del", "del", "translocation"], "length": [50, 100, 101, 0]}
+    )
+    counts = count_svs(svs, schema=schema)
+    assert counts.to_dict() == {"del:s": 2, "del:l": 1, "translocation": 1}
@@ -0,0 +1,60 @@
+import os
+import pickle
+import pytest
+from pyfaidx import Fasta
+
+from dvartk.process import count_snvs
+from dvartk.reference import ReferenceCache, build_reference_cache
+from tests.conftest import random_snvs, write_fasta
+
+
+@pytest.fixture
+def fasta_path(tmp_path):
+    chroms = {"1": "ACGTNNacgt" * 30, "2": "TTTTGGGGCCCCAAAA" * 7 + "A"}
+    return write_fasta(tmp_path / "small.fa", chroms)
+
+
+def test_build_and_fetch(fasta_path):
+    cache = ReferenceCache(build_reference_cache(fasta_path), fasta_path)
+    fasta = Fasta(fasta_path)
+    assert set(cache.keys()) == {"1", "2"}
+    for chrom in cache.keys():
+        assert cache.length(chrom) == len(fasta[chrom])
+        assert cache.fetch(chrom, 3, 97) == fasta[chrom][3:97].seq.upper()
+    assert cache.n_mask("1", 0, 10).tolist() == [False] * 4 + [True] * 2 + [False] * 4
+
+
+def test_stale_cache_is_refused(fasta_path):
+    cache_path = build_reference_cache(fasta_path)
+    with open(fasta_path, "a") as fasta:
+        fasta.write(">3\nACGT\n")
+    with pytest.raises(ValueError, match="Stale"):
+        ReferenceCache(cache_path, fasta_path)
+
+
+def test_stale_cache_is_refused_by_default(fasta_path):
+    cache_path = build_reference_cache(fasta_path)
+    cache = ReferenceCache(cache_path)
+    assert pickle.loads(pickle.dumps(cache)).fetch("1", 0, 4) == "ACGT"
+    with open(fasta_path, "a") as fasta:
+        fasta.write(">3\nACGT\n")
+    with pytest.raises(ValueError, match="Stale"):
+        ReferenceCache(cache_path)
+    assert ReferenceCache(cache_path, check=False).length("1") == 300
+    os.remove(fasta_path)
+    assert ReferenceCache(cache_path).length("1") == 300
+
+
+def test_duplicate_contigs_are_refused(tmp_path):
+    fasta_path = str(tmp_path / "dup.fa")
+    with open(fasta_path, "w") as fasta:
+        fasta.write(">1\nACGT\n>2\nAAAA\n>1\nCCCC\n")
+    with pytest.raises(ValueError, match="duplicate contig 1"):
+        build_reference_cache(fasta_path)
+    assert os.listdir(tmp_path) == ["dup.fa"]
+
+
+def test_count_snvs_with_cache(genome):
+    cache = ReferenceCache(build_reference_cache(genome.filename))
+    snvs = random_snvs(genome, 500)
+    assert count_snvs(snvs, cache).equals(count_snvs(snvs, genome))
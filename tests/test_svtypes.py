@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from dvartk.channels import SV_SCHEMA
+from dvartk.parser import convert_type_names
+from dvartk.process import count_svs
+from dvartk.svtypes import (
+    SV_TYPE_ALIASES,
+    SV_TYPE_DTYPE,
+    lookup_sv_type,
+    normalize_sv_types,
+    register_sv_type_aliases,
+)
+
+LABELS = {
+    "DEL": "del",
+    "<DEL>": "del",
+    "SVTYPE=BND": "translocation",
+    "Deletion": "del",
+    "insertion": "ins",
+    "DUP:TANDEM": "dup",
+    "<INS:ME:ALU>": "ins",
+    "INV": "inv",
+    "Translocation": "translocation",
+    "TRA": "translocation",
+    "del": "del",
+}
+
+
+def test_normalize_sv_types_aliases():
+    svs = pd.DataFrame({"type": list(LABELS), "length": 500})
+    normalized = normalize_sv_types(svs)
+    assert normalized["type"].dtype == SV_TYPE_DTYPE
+    assert normalized["type"].tolist() == list(LABELS.values())
+    assert svs["type"].tolist() == list(LABELS)  # input left as it was
+    assert normalize_sv_types(normalized) is normalized
+    categorical = svs.astype({"type": "category"})
+    pd.testing.assert_frame_equal(normalize_sv_types(categorical), normalized)
+    pd.testing.assert_frame_equal(convert_type_names(svs), normalized)
+
+
+def test_normalize_sv_types_unmapped():
+    svs = pd.DataFrame(
+        {"type": ["DEL", "CPX", "CPX", None, "foldback"], "length": [500] * 5}
+    )
+    with pytest.warns(
+        UserWarning, match=r"3 SVs of unknown type \(CPX: 2, foldback: 1"
+    ):
+        normalized = normalize_sv_types(svs)
+    assert normalized["type"].isna().tolist() == [False, True, True, True, True]
+    assert count_svs(normalized).sum() == 1
+
+    normalized = normalize_sv_types(svs, aliases={"CPX": "inv", "foldback": "inv"})
+    assert normalized["type"].tolist()[:3] == ["del", "inv", "inv"]
+    assert count_svs(normalized, SV_SCHEMA)["inv:<1kb"] == 3
+    assert "FOLDBACK" not in SV_TYPE_ALIASES
+    with pytest.raises(ValueError):
+        normalize_sv_types(svs, aliases={"CPX": "complex"})
+
+
+def test_register_sv_type_aliases():
+    try:
+        register_sv_type_aliases({"<CPX>": "dup"})
+        assert normalize_sv_types(pd.DataFrame({"type": ["cpx"]}))["type"][0] == "dup"
+    finally:
+        SV_TYPE_ALIASES.pop("CPX", None)
+        lookup_sv_type.cache_clear()
@@ -0,0 +1,235 @@
+import gzip
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+
+from dvartk.parser import SnvFileConfig, SvFileConfig
+from dvartk.process import count_svs
+from dvartk.regions import (
+    filter_snvs,
+    filter_svs,
+    merge_regions,
+    overlaps_regions,
+    parse_region,
+)
+from dvartk.vcf import (
+    TabixIndex,
+    bgzip_and_index,
+    find_index,
+    iter_vcf_text,
+    read_vcf,
+    read_vcf_svs,
+    reg2bins,
+)
+from tests.conftest import DATA_DIR
+
+VCF_HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+
+def write_vcf(path, rows):
+    with open(path, "w") as vcf:
+        vcf.write(VCF_HEADER)
+        for row in rows:
+            vcf.write("\t".join(str(field) for field in row) + "\n")
+    return str(path)
+
+
+def random_vcf(path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for chrom in ["1", "2", "X"]:
+        positions = np.sort(rng.integers(1, 3_000_000, size=n))
+        for ix, pos in enumerate(positions):
+            ref = "".join(rng.choice(list("ACGT"), size=rng.integers(1, 4)))
+            alt = ",".join(
+                rng.choice(["A", "C", "G", "T", "AT"], size=rng.integers(1, 3))
+            )
+            info = f"DP={ix}" if ix % 3 else f"DP={ix};END={pos + 20000}"
+            rows.append((chrom, pos, f"v{chrom}_{ix}", ref, alt, ".", "PASS", info))
+    return write_vcf(path, rows)
+
+
+def test_parse_region():
+    assert parse_region("chr1:1,001-2000") == ("chr1", 1000, 2000)
+    assert parse_region("2") == ("2", 0, 1 << 31)
+    assert parse_region(("X", 5, 10)) == ("X", 5, 10)
+    with pytest.raises(ValueError):
+        parse_region("1:10-5")
+
+
+def test_merge_and_overlap_regions():
+    merged = merge_regions(["1:1-10", "1:5-20", "1:31-40", "2:1-5"])
+    np.testing.assert_array_equal(merged["1"][0], [0, 30])
+    np.testing.assert_array_equal(merged["1"][1], [20, 40])
+    mask = overlaps_regions(
+        ["1", "1", "1", "2", "3"], [19, 20, 25, 4, 0], [21, 30, 31, 6, 10], merged
+    )
+    assert mask.tolist() == [True, False, True, True, False]
+
+
+def test_filter_missing_positions_are_outside_regions():
+    regions = ["1:1-100", "2"]
+    snvs = pd.DataFrame({"chrom": ["1", "1", "2"], "pos": [50, np.nan, 10]})
+    assert filter_snvs(snvs, regions).index.tolist() == [0, 2]
+
+    svs = pd.DataFrame(
+        {
+            "chromosome_1": ["1", "1", "2"],
+            "position_1": [10, 20, 30],
+            "chromosome_2": ["1", "2", "2"],
+            "position_2": pd.array([90, pd.NA, 500], dtype="Int64"),
+        }
+    )
+    assert filter_svs(svs, regions).index.tolist() == [0, 2]
+
+
+def test_reg2bins():
+    assert reg2bins(0, 1) == [0, 1, 9, 73, 585, 4681]
+    assert reg2bins(1 << 14, (1 << 14) + 1) == [0, 1, 9, 73, 585, 4682]
+
+
+def copy_fixture(tmp_path, index_suffix):
+    """regions_fixture.vcf.gz with one of its indexes, and the plain VCF"""
+    # fixture regenerated with tests/data/make_regions_fixture.py
+    gz_path = str(tmp_path / "regions_fixture.vcf.gz")
+    shutil.copy(os.path.join(DATA_DIR, "regions_fixture.vcf.gz"), gz_path)
+    shutil.copy(
+        os.path.join(DATA_DIR, "regions_fixture.vcf.gz" + index_suffix),
+        gz_path + index_suffix,
+    )
+    vcf_path = str(tmp_path / "regions_fixture.vcf")
+    with gzip.open(gz_path, "rb") as gz, open(vcf_path, "wb") as vcf:
+        shutil.copyfileobj(gz, vcf)
+    return vcf_path, gz_path
+
+
+@pytest.mark.parametrize("csi", [False, True])
+def test_region_query_matches_full_read(tmp_path, csi):
+    vcf_path, gz_path = copy_fixture(tmp_path, ".csi" if csi else ".tbi")
+    index_path = find_index(gz_path)
+    assert index_path.endswith(".csi" if csi else ".tbi")
+    assert TabixIndex(index_path).names == ["1", "2", "X"]
+
+    full = read_vcf(vcf_path, info_fields=("END",))
+    assert full.equals(read_vcf(gz_path, info_fields=("END",)))
+    regions = ["1:100000-250000", "X:2,000,000-2,000,100", ("2", 0, 50000), "Y"]
+    queried = read_vcf(gz_path, regions=regions, info_fields=("END",))
+    ends = np.maximum(
+        full["pos"] - 1 + full["ref"].str.len(),
+        pd.to_numeric(full["END"]).fillna(0),
+    )
+    mask = overlaps_regions(
+        full["chrom"], full["pos"] - 1, ends, merge_regions(regions)
+    )
+    expected = full[mask].reset_index(drop=True)
+    assert expected.shape[0] > 0
+    pd.testing.assert_frame_equal(queried, expected)
+
+
+@pytest.mark.parametrize("regions", [None, ["1:1-1,500,000", "X"]])
+def test_vcf_text_streams_whole_lines(tmp_path, regions):
+    vcf_path, gz_path = copy_fixture(tmp_path, ".tbi")
+    chunks = list(iter_vcf_text(gz_path, regions=regions, chunk_size=4096))
+    # a chunk holds at most one decompressed 64 KiB block beyond chunk_size
+    assert len(chunks) > 1
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    assert all(len(chunk) < 4096 + (1 << 16) for chunk in chunks)
+    lines = b"".join(chunks).splitlines()
+    assert not any(line.startswith(b"#") for line in lines)
+    if regions is None:
+        assert len(lines) == 3000
+        plain = list(iter_vcf_text(vcf_path, chunk_size=100))
+        assert all(len(chunk) < 200 for chunk in plain)
+        assert lines == b"".join(plain).splitlines()
+
+
+@pytest.mark.skipif(
+    shutil.which("bgzip") is None or shutil.which("tabix") is None,
+    reason="needs htslib's bgzip and tabix",
+)
+@pytest.mark.parametrize("csi", [False, True])
+def test_bgzip_and_index_round_trip(tmp_path, csi):
+    vcf_path = random_vcf(tmp_path / "random.vcf", 500)
+    gz_path = bgzip_and_index(vcf_path, csi=csi)
+    assert find_index(gz_path).endswith(".csi" if csi else ".tbi")
+    regions = ["1:100000-250000", "X"]
+    expected = read_vcf(vcf_path, regions=regions)
+    pd.testing.assert_frame_equal(read_vcf(gz_path, regions=regions), expected)
+
+
+def test_read_vcf_splits_multiallelic(tmp_path):
+    vcf_path = write_vcf(
+        tmp_path / "multi.vcf",
+        [
+            ("1", 10, "a", "C", "A,T", ".", "PASS", "DP=3;SOMATIC"),
+            ("1", 20, "b", "G", "GA", ".", "PASS", "DP=4"),
+        ],
+    )
+    vcf = read_vcf(vcf_path, info_fields=("DP", "SOMATIC"))
+    assert vcf["alt"].tolist() == ["A", "T", "GA"]
+    assert vcf["id"].tolist() == ["a", "a", "b"]
+    assert vcf["SOMATIC"].tolist() == [True, True, False]
+    assert vcf["DP"].tolist() == ["3", "3", "4"]
+
+    snvs = SnvFileConfig("Chromosome", "Start_Position", "Ref", "Alt").load_vcf(
+        vcf_path
+    )
+    assert snvs.columns.tolist() == ["chrom", "pos", "ref", "alt"]
+    assert snvs["alt"].tolist() == ["A", "T"]
+
+
+def test_read_vcf_svs(tmp_path):
+    vcf_path = write_vcf(
+        tmp_path / "sv.vcf",
+        [
+            ("1", 100, "del1", "N", "<DEL>", ".", "PASS", "SVTYPE=DEL;END=5100"),
+            ("1", 200, "inv1", "N", "<INV>", ".", "PASS", "SVTYPE=INV;END=900"),
+            ("1", 300, "bnd1", "A", "A[2:500[", ".", "PASS", "SVTYPE=BND;MATEID=bnd2"),
+            ("1", 400, "dup1", "N", "<DUP>", ".", "PASS", "SVTYPE=DUP;SVLEN=2e6"),
+            ("2", 500, "bnd2", "T", "]1:300]T", ".", "PASS", "SVTYPE=BND;MATEID=bnd1"),
+            ("2", 600, "bnd3", "G", "[X:10[G", ".", "PASS", "SVTYPE=BND"),
+            # breakends within chromosome 3, the last one without SVTYPE
+            ("3", 100, "bnd4", "A", "A[3:900[", ".", "PASS", "SVTYPE=BND"),
+            ("3", 2000, "bnd5", "C", "]3:1500]C", ".", "PASS", "SVTYPE=BND"),
+            ("3", 3000, "cnv1", "N", "<CNV>", ".", "PASS", "END=4000"),
+            ("3", 5000, "bnd6", "G", "G]3:7000]", ".", "PASS", "."),
+        ],
+    )
+    with pytest.warns(UserWarning, match="skipped 1 SV records without SVTYPE"):
+        svs = read_vcf_svs(vcf_path)
+    assert svs["id"].tolist() == [
+        "del1",
+        "inv1",
+        "bnd1",
+        "dup1",
+        "bnd3",
+        "bnd4",
+        "bnd5",
+        "bnd6",
+    ]
+    assert svs["type"].tolist() == [
+        "del",
+        "inv",
+        "translocation",
+        "dup",
+        "translocation",
+        "del",
+        "dup",
+        "inv",
+    ]
+    assert svs["strand_1"].tolist() == ["+", "+", "+", "-", "-", "+", "-", "+"]
+    assert svs["strand_2"].tolist() == ["-", "+", "-", "+", "-", "-", "+", "+"]
+    assert svs["chromosome_2"].tolist() == ["1", "1", "2", "1", "X", "3", "3", "3"]
+    assert svs["position_2"].tolist() == [5100, 900, 500, 400, 10, 900, 1500, 7000]
+    assert svs["length"].tolist()[:2] == [5000, 700]
+    assert svs["length"].iloc[3] == 2e6
+    assert svs["length"].tolist()[5:] == [800, 500, 2000]
+
+    config = SvFileConfig(*["unused"] * 8)
+    loaded = config.load_vcf(vcf_path, regions=["1:150-450"])
+    assert loaded["id"].tolist() == ["del1", "inv1", "bnd1", "dup1"]
+    with pytest.warns(UserWarning, match="without SVTYPE"):
+        counts = count_svs(config.load_vcf(vcf_path))
+    assert counts.sum() == 8